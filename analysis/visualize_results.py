@@ -2,35 +2,117 @@
 """
 Visualize chaos experiment results
 Creates plots showing attractor basins and Lyapunov exponents
+Figures render headless in a process pool and are cached by a hash of their
+input aggregates, style and plotting code, so unchanged figures are skipped
 """
 
+import hashlib
+import inspect
 import json
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.colors import LinearSegmentedColormap
 from matplotlib.patches import Ellipse
 import matplotlib.patches as mpatches
 
-def load_latest_results():
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+MAX_SCATTER_POINTS = 5000
+SCATTER_BINS = 120
+
+def reduce_points(x, y, max_points=MAX_SCATTER_POINTS, bins=SCATTER_BINS):
+    """
+    Scatter input small enough to pickle and draw: up to max_points are kept
+    as points; beyond that they are binned into a 2-D histogram
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(x) <= max_points:
+        return {"kind": "points", "x": x.round(4).tolist(), "y": y.round(4).tolist()}
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=bins)
+    return {"kind": "bins", "counts": counts.astype(int).tolist(),
+            "extent": [x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]]}
+
+def draw_points(ax, cloud, color):
+    """Draw a reduce_points() cloud as a light scatter or a density image"""
+    if cloud["kind"] == "points":
+        ax.scatter(cloud["x"], cloud["y"], s=6, color=color, alpha=0.25, linewidths=0)
+    else:
+        counts = np.ma.masked_equal(np.asarray(cloud["counts"]).T, 0)
+        ax.imshow(np.log1p(counts), extent=cloud["extent"], origin="lower", aspect="auto",
+                  cmap=LinearSegmentedColormap.from_list("", ["white", color]),
+                  alpha=0.5, interpolation="nearest")
+
+def load_store_results(store_root="../results/store", model=None, since=None, until=None):
+    """
+    Build summary-shaped data straight from the columnar results store,
+    streaming only the columns each metric needs
+    """
+    from results_store import ResultsStore
+    
+    store = ResultsStore(store_root)
+    divergence = store.aggregate("edit_distance", model=model, since=since, until=until)
+    lyapunov = store.aggregate("proxy_lyapunov", model=model, since=since, until=until)
+    
+    # Per-comparison points for the attractor cloud, reduced before plotting
+    points = {}
+    for batch in store.iter_batches("comparison", ["noise_type", "edit_distance", "proxy_lyapunov"],
+                                    model=model, since=since, until=until):
+        for noise_type in np.unique(batch["noise_type"]):
+            mask = batch["noise_type"] == noise_type
+            xs, ys = points.setdefault(str(noise_type), ([], []))
+            xs.append(batch["edit_distance"][mask])
+            ys.append(batch["proxy_lyapunov"][mask])
+    
+    return {
+        noise_type: {
+            "mean_divergence": stats["mean"],
+            "std_divergence": stats["std"],
+            "mean_proxy_lyapunov": lyapunov[noise_type]["mean"],
+            "std_proxy_lyapunov": lyapunov[noise_type]["std"],
+            "num_experiments": stats["count"],
+            "points": reduce_points(np.concatenate(points[noise_type][0]), np.concatenate(points[noise_type][1]))
+        }
+        for noise_type, stats in divergence.items()
+    } or None
+
+def load_latest_results(results_dir="../results"):
     """Load the most recent experiment results"""
-    results_dir = "../results"
     if not os.path.exists(results_dir):
         print("No results directory found")
         return None
     
-    # Find latest summary file
-    files = os.listdir(results_dir)
-    summary_files = [f for f in files if f.startswith("summary_")]
-    
-    if not summary_files:
+    catalog_path = os.path.join(results_dir, "catalog.db")
+    if os.path.isdir(os.path.join(results_dir, "store")) and os.path.exists(catalog_path):
+        # Only the latest run's records: the store holds every model and run
+        from run_catalog import RunCatalog
+        catalog = RunCatalog(catalog_path)
+        try:
+            latest_runs = catalog.runs(limit=1)
+        finally:
+            catalog.close()
+        if latest_runs and latest_runs[0]["started_at"]:
+            run = latest_runs[0]
+            data = load_store_results(os.path.join(results_dir, "store"), model=run["model"],
+                                      since=run["started_at"], until=run["finished_at"])
+            if data:
+                return data
+    
+    # Find latest summary file through the run catalog
+    from run_catalog import resolve_latest
+    latest = resolve_latest("summary", results_dir)
+    
+    if not latest:
         print("No summary files found")
         return None
     
-    latest = sorted(summary_files)[-1]
-    with open(os.path.join(results_dir, latest), 'r') as f:
+    with open(latest, 'r') as f:
         return json.load(f)
 
-def create_attractor_visualization(data):
+def create_attractor_visualization(data, output_path='../results/attractor_visualization.png', dpi=300):
     """Create a visualization of attractor basins"""
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
     
@@ -65,6 +147,10 @@ def create_attractor_visualization(data):
             x = stats['mean_divergence']
             y = stats['mean_proxy_lyapunov']
             
+            # Individual comparisons behind the mean, when the store has them
+            if stats.get('points'):
+                draw_points(ax1, stats['points'], colors.get(noise_type, 'gray'))
+            
             # Plot point with error bars
             ax1.errorbar(x, y, 
                         xerr=stats['std_divergence'],
@@ -120,33 +206,54 @@ def create_attractor_visualization(data):
     plt.tight_layout()
     
     # Save the plot
-    output_path = '../results/attractor_visualization.png'
-    plt.savefig(output_path, dpi=300, bbox_inches='tight')
+    plt.savefig(output_path, dpi=dpi, bbox_inches='tight')
     print(f"✅ Visualization saved to {output_path}")
     
     return fig
 
-def create_trajectory_plot(data):
-    """Create a plot showing response trajectories"""
-    fig, ax = plt.subplots(figsize=(10, 8))
+def load_phase_space(results_dir="../results", results_path=None):
+    """
+    Embedded baseline/noisy responses of results_path (default: the latest
+    results file). The coordinates are cached under results/phase_space, so
+    replotting or clustering the same responses does not recompute the
+    projection.
+    """
+    from phase_space import PhaseSpaceEmbedding, trajectories
+    from run_catalog import resolve_latest
+    
+    latest = results_path or resolve_latest("results", results_dir)
+    if not latest:
+        return None
+    with open(latest, 'r') as f:
+        results = json.load(f)
     
-    ax.set_title('AI Response Trajectories in Phase Space', fontsize=16, fontweight='bold')
-    ax.set_xlabel('Response Complexity', fontsize=12)
-    ax.set_ylabel('Response Divergence', fontsize=12)
-    
-    # Starting point (baseline prompt)
-    start_x, start_y = 0.5, 0.0
-    ax.scatter(start_x, start_y, s=200, c='black', marker='*', 
-              label='Baseline Prompt', zorder=5)
-    
-    # Define endpoints for each noise type
-    endpoints = {
-        'orthographic_noise': (0.3, 0.5),      # Simpler, divergent
-        'temporal_pressure': (0.2, 0.1),       # Minimal, convergent
-        'emotional_leakage': (0.6, 0.7),       # Complex, divergent
-        'complexity_accumulation': (0.8, 0.6), # Very complex, moderately divergent
-        'metacognitive_markers': (0.5, 0.4)    # Moderate complexity, some divergence
-    }
+    blob_store = None
+    if os.path.isdir(os.path.join(results_dir, "blobs")):
+        from blob_store import BlobStore
+        blob_store = BlobStore(os.path.join(results_dir, "blobs"))
+    try:
+        phase = trajectories(results, blob_store, PhaseSpaceEmbedding(os.path.join(results_dir, "phase_space")))
+    finally:
+        if blob_store is not None:
+            blob_store.close()
+    if not phase:
+        return None
+    
+    # Keep the payload small enough to hash and ship to a render worker
+    for entry in phase["noise_types"].values():
+        xy = np.asarray(entry["points"])
+        entry["points"] = reduce_points(xy[:, 0], xy[:, 1])
+    baseline = np.asarray(phase["baseline"])
+    phase["baseline"] = reduce_points(baseline[:, 0], baseline[:, 1])
+    return phase
+
+def create_trajectory_plot(data, output_path='../results/trajectory_plot.png', dpi=300, phase=None):
+    """
+    Plot response trajectories in phase space: each arrow runs from the
+    embedded centroid of a prompt's baseline responses to that of its noisy
+    responses, with the noisy responses and a 2σ basin ellipse behind it
+    """
+    fig, ax = plt.subplots(figsize=(10, 8))
     
     colors = {
         'orthographic_noise': '#10B981',
@@ -156,58 +263,114 @@ def create_trajectory_plot(data):
         'metacognitive_markers': '#8B5CF6'
     }
     
-    # Draw trajectories
-    for noise_type, (end_x, end_y) in endpoints.items():
-        if noise_type in data:
-            # Create curved trajectory
-            t = np.linspace(0, 1, 100)
-            
-            # Add some curvature to make it more interesting
-            control_x = start_x + (end_x - start_x) * 0.5 + np.random.uniform(-0.1, 0.1)
-            control_y = start_y + (end_y - start_y) * 0.7 + np.random.uniform(-0.1, 0.1)
-            
-            # Bezier curve
-            x = (1-t)**2 * start_x + 2*(1-t)*t * control_x + t**2 * end_x
-            y = (1-t)**2 * start_y + 2*(1-t)*t * control_y + t**2 * end_y
-            
-            # Add some noise to simulate chaotic behavior
-            noise_scale = data[noise_type]['mean_proxy_lyapunov'] * 0.02
-            x += np.random.normal(0, noise_scale, len(x))
-            y += np.random.normal(0, noise_scale, len(y))
-            
-            # Plot trajectory
-            ax.plot(x, y, color=colors[noise_type], linewidth=2, alpha=0.7,
-                   label=noise_type.replace('_', ' ').title())
-            
-            # Plot endpoint
-            ax.scatter(end_x, end_y, s=150, c=colors[noise_type], 
-                      edgecolors='black', linewidth=2, zorder=4)
+    ax.set_title('AI Response Trajectories in Phase Space', fontsize=16, fontweight='bold')
+    if not phase:
+        ax.text(0.5, 0.5, 'No response texts available to embed\n(run a sweep first)',
+                ha='center', va='center', fontsize=12, transform=ax.transAxes)
+        ax.set_axis_off()
+    else:
+        ax.set_xlabel('Phase-space component 1', fontsize=12)
+        ax.set_ylabel('Phase-space component 2', fontsize=12)
+        draw_points(ax, phase["baseline"], 'black')
+        
+        for noise_type, entry in phase["noise_types"].items():
+            color = colors.get(noise_type, '#6B7280')
+            draw_points(ax, entry["points"], color)
+            segments = np.asarray(entry["segments"])
+            starts, ends = segments[:, 0], segments[:, 1]
+            ax.quiver(starts[:, 0], starts[:, 1], ends[:, 0] - starts[:, 0], ends[:, 1] - starts[:, 1],
+                      angles='xy', scale_units='xy', scale=1, color=color, alpha=0.7, width=0.003)
+            ax.scatter(ends[:, 0], ends[:, 1], s=40, c=color, edgecolors='black', linewidth=0.5,
+                       zorder=4, label=noise_type.replace('_', ' ').title())
             
-            # Add attractor basin
-            circle = plt.Circle((end_x, end_y), 0.15, 
-                               color=colors[noise_type], alpha=0.2)
-            ax.add_patch(circle)
-    
-    ax.set_xlim(-0.1, 1.1)
-    ax.set_ylim(-0.1, 0.9)
-    ax.grid(True, alpha=0.3)
-    ax.legend(loc='upper left')
-    
-    # Add annotations
-    ax.text(0.1, 0.8, 'High Divergence\n(Chaotic)', fontsize=10, 
-            bbox=dict(boxstyle="round,pad=0.3", facecolor='yellow', alpha=0.3))
-    ax.text(0.1, 0.05, 'Low Divergence\n(Stable)', fontsize=10,
-            bbox=dict(boxstyle="round,pad=0.3", facecolor='lightgreen', alpha=0.3))
+            # Attractor basin: 2σ ellipse of where this noise type's trajectories end
+            if len(ends) > 2:
+                values, vectors = np.linalg.eigh(np.cov(ends.T))
+                angle = np.degrees(np.arctan2(vectors[1, -1], vectors[0, -1]))
+                width, height = 4 * np.sqrt(np.clip(values[::-1], 0, None))
+                ax.add_patch(Ellipse(ends.mean(axis=0), width, height, angle=angle,
+                                     color=color, alpha=0.15))
+        
+        ax.scatter([], [], s=30, c='black', alpha=0.4, label='Baseline responses')
+        ax.grid(True, alpha=0.3)
+        ax.legend(loc='best')
     
     plt.tight_layout()
     
     # Save the plot
-    output_path = '../results/trajectory_plot.png'
-    plt.savefig(output_path, dpi=300, bbox_inches='tight')
+    plt.savefig(output_path, dpi=dpi, bbox_inches='tight')
     print(f"✅ Trajectory plot saved to {output_path}")
     
     return fig
 
+FIGURES = {
+    "attractor_visualization": create_attractor_visualization,
+    "trajectory_plot": create_trajectory_plot
+}
+
+# Extra inputs beyond the summary aggregates, passed as keyword arguments
+FIGURE_EXTRAS = {
+    "trajectory_plot": ("phase",)
+}
+
+def figure_key(name, data, style, extras=None):
+    """Hash of everything that determines a figure's pixels"""
+    payload = {
+        "figure": name,
+        "code": inspect.getsource(FIGURES[name]) + inspect.getsource(draw_points),
+        "data": data,
+        "extras": extras or {},
+        "style": style
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=float).encode("utf-8")).hexdigest()
+
+def _render_job(job):
+    """Worker body: draw one figure headless and close it"""
+    name, data, output_path, style, extras = job
+    plt.switch_backend("Agg")
+    fig = FIGURES[name](data, output_path=output_path, **style, **extras)
+    plt.close(fig)
+    return output_path
+
+def render_all(data, results_dir="../results", dpi=300, workers=None, force=False, phase=None):
+    """
+    Render every figure whose inputs changed since it was last written.
+    Stale figures render in parallel worker processes; returns
+    {figure: "rendered" | "cached"}. The phase-space embedding is loaded
+    from results_dir unless given.
+    """
+    style = {"dpi": dpi}
+    available = {"phase": phase if phase is not None else load_phase_space(results_dir)}
+    cache_path = os.path.join(results_dir, "figure_cache.json")
+    cache = {}
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            cache = json.load(f)
+    
+    status, jobs, keys = {}, [], {}
+    for name in FIGURES:
+        output_path = os.path.join(results_dir, f"{name}.png")
+        extras = {key: available[key] for key in FIGURE_EXTRAS.get(name, ())}
+        keys[name] = figure_key(name, data, style, extras)
+        if not force and cache.get(name) == keys[name] and os.path.exists(output_path):
+            status[name] = "cached"
+            print(f"⏭️  {output_path} unchanged")
+        else:
+            jobs.append((name, data, output_path, style, extras))
+    
+    if len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(jobs))) as pool:
+            list(pool.map(_render_job, jobs))
+    elif jobs:
+        _render_job(jobs[0])
+    
+    for name, *_ in jobs:
+        cache[name] = keys[name]
+        status[name] = "rendered"
+    with open(cache_path, 'w') as f:
+        json.dump(cache, f, indent=2)
+    return status
+
 def main():
     """Main visualization function"""
     print("📊 CHAOS EXPERIMENT VISUALIZER")
@@ -215,6 +378,7 @@ def main():
     
     # Change to script directory
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    show = "--show" in sys.argv
     
     # Load results
     data = load_latest_results()
@@ -229,14 +393,13 @@ def main():
     print("\n🎨 Creating visualizations...")
     
     try:
-        # Create attractor space visualization
-        fig1 = create_attractor_visualization(data)
-        
-        # Create trajectory plot
-        fig2 = create_trajectory_plot(data)
-        
-        # Show plots
-        plt.show()
+        if show:
+            # Interactive windows: draw in this process with the default backend
+            create_attractor_visualization(data)
+            create_trajectory_plot(data, phase=load_phase_space())
+            plt.show()
+        else:
+            render_all(data, force="--force" in sys.argv)
         
         print("\n✅ Visualizations complete!")
         print("Check the results/ directory for saved images")
@@ -6,7 +6,7 @@ Executes all experiments and generates comprehensive analysis
 
 import os
 import sys
-import subprocess
+import importlib.util
 import json
 import time
 from datetime import datetime
@@ -18,21 +18,15 @@ def check_requirements():
     """Check if all requirements are installed"""
     print("📋 Checking requirements...")
     required = ['requests', 'numpy', 'matplotlib']
-    missing = []
-    
-    for module in required:
-        try:
-            __import__(module)
-        except ImportError:
-            missing.append(module)
+    # find_spec locates a module without paying to import it
+    missing = [module for module in required if importlib.util.find_spec(module) is None]
     
     if missing:
         print(f"❌ Missing modules: {', '.join(missing)}")
-        print("Installing required packages...")
-        subprocess.run([sys.executable, "-m", "pip", "install"] + missing)
-    else:
-        print("✅ All requirements satisfied")
+        print(f"Install them with: {sys.executable} -m pip install -r ../requirements.txt")
+        return False
     
+    print("✅ All requirements satisfied")
     return True
 
 def run_ollama_test():
@@ -71,11 +65,13 @@ def run_full_experiment():
     
     try:
         from chaos_experiment import ChaosExperiment
+        from run_catalog import RunCatalog
         
         # Create results directory
         os.makedirs("../results", exist_ok=True)
         
         # Run with default model
+        started_at = time.time()
         experiment = ChaosExperiment(model_name="phi3:mini")
         experiment.run_full_experiment("../experiments/test_cases.json")
         experiment.visualize_results()
@@ -85,13 +81,27 @@ def run_full_experiment():
         results_file = f"chaos_results_phi3_mini.json"
         summary_file = f"chaos_summary_phi3_mini.json"
         
+        files = {}
         if os.path.exists(results_file):
             os.rename(results_file, f"../results/results_{timestamp}.json")
+            files["results"] = f"../results/results_{timestamp}.json"
         if os.path.exists(summary_file):
             os.rename(summary_file, f"../results/summary_{timestamp}.json")
+            files["summary"] = f"../results/summary_{timestamp}.json"
+        
+        # Index the run so reports and plots can find it without scanning
+        comparisons = sum(len(r["divergences"]) for rs in experiment.results.values() for r in rs)
+        catalog = RunCatalog("../results/catalog.db")
+        catalog.register_run(
+            timestamp, experiment.model_name, files,
+            matrix="test_cases.json", started_at=started_at,
+            record_counts={"comparison": comparisons},
+            aggregates=experiment.aggregates
+        )
+        catalog.close()
         
         print(f"\n📊 Results saved to results/ directory with timestamp {timestamp}")
-        return True
+        return files
         
     except Exception as e:
         print(f"❌ Full experiment failed: {e}")
@@ -138,7 +148,7 @@ def run_comedy_experiment():
         traceback.print_exc()
         return False
 
-def generate_report():
+def generate_report(results_dir="../results", output="../EXPERIMENT_REPORT.md"):
     """Generate a comprehensive report"""
     print("\n📝 Generating experiment report...")
     
@@ -150,25 +160,38 @@ def generate_report():
     report.append("")
     
     # Check for results
-    results_dir = "../results"
-    if os.path.exists(results_dir):
-        files = os.listdir(results_dir)
-        summary_files = [f for f in files if f.startswith("summary_")]
-        
-        if summary_files:
-            # Load most recent summary
-            latest_summary = sorted(summary_files)[-1]
-            with open(os.path.join(results_dir, latest_summary), 'r') as f:
-                summary_data = json.load(f)
+    from run_catalog import resolve_latest
+    
+    latest_summary = resolve_latest("summary", results_dir)
+    if latest_summary:
+        # Load most recent summary
+        with open(latest_summary, 'r') as f:
+            summary_data = json.load(f)
             
-            report.append("EXPERIMENTAL RESULTS:")
+        report.append("EXPERIMENTAL RESULTS:")
+        report.append("-"*40)
+        
+        for noise_type, stats in summary_data.items():
+            report.append(f"\n{noise_type}:")
+            report.append(f"  Mean Divergence: {stats['mean_divergence']:.4f}")
+            report.append(f"  Proxy Lyapunov: {stats['mean_proxy_lyapunov']:.4f}")
+            report.append(f"  Attractor Shift: {stats['attractor_shift']:.4f}")
+    
+    # Percentiles across every catalogued run, merged from stored sketches
+    catalog_path = os.path.join(results_dir, "catalog.db")
+    if os.path.exists(catalog_path):
+        from run_catalog import RunCatalog
+        catalog = RunCatalog(catalog_path)
+        try:
+            percentiles = catalog.aggregates(metrics=["edit_distance"]).summary("edit_distance")
+        finally:
+            catalog.close()
+        if percentiles:
+            report.append("\nDIVERGENCE PERCENTILES (all runs):")
             report.append("-"*40)
-            
-            for noise_type, stats in summary_data.items():
-                report.append(f"\n{noise_type}:")
-                report.append(f"  Mean Divergence: {stats['mean_divergence']:.4f}")
-                report.append(f"  Proxy Lyapunov: {stats['mean_proxy_lyapunov']:.4f}")
-                report.append(f"  Attractor Shift: {stats['attractor_shift']:.4f}")
+            for noise_type, stats in percentiles.items():
+                report.append(f"  {noise_type:28} n={stats['count']:<6d} p50 {stats['p50']:.4f}  "
+                              f"p95 {stats['p95']:.4f}  p99 {stats['p99']:.4f}")
     
     report.append("\n" + "="*60)
     report.append("CONCLUSIONS:")
@@ -181,14 +204,103 @@ def generate_report():
     
     report_text = "\n".join(report)
     
-    with open("../EXPERIMENT_REPORT.md", 'w') as f:
+    with open(output, 'w') as f:
         f.write(report_text)
     
     print("\n" + report_text)
-    print("\n✅ Report saved to EXPERIMENT_REPORT.md")
+    print(f"\n✅ Report saved to {os.path.basename(output)}")
     
     return True
 
+PIPELINE_DIR = "../results/pipeline"
+
+# Menu choice -> stages to bring up to date (choice 4 runs the demo analysis directly)
+CHOICE_TARGETS = {
+    "1": ["mini", "report"],
+    "2": ["full", "analysis", "plot", "report"],
+    "3": ["mini", "full", "analysis", "plot", "report"],
+    "4": ["report"],
+    "5": ["comedy", "report"],
+    "6": ["mini", "full", "analysis", "plot", "comedy", "report"]
+}
+
+def pipeline_path(name):
+    return os.path.join(PIPELINE_DIR, name)
+
+def mini_stage():
+    from run_experiment import run_mini_experiment
+    results = run_mini_experiment()
+    if not results:
+        return False
+    with open(pipeline_path("mini_results.json"), 'w') as f:
+        json.dump(results, f, indent=2)
+
+def full_stage():
+    import shutil
+    files = run_full_experiment()
+    if not files or "results" not in files or "summary" not in files:
+        print(f"❌ Full experiment did not write both results and summary (got {sorted(files or {})})")
+        return False
+    # Stable copies, so downstream stages hash the same path every run
+    shutil.copyfile(files["results"], pipeline_path("full_results.json"))
+    shutil.copyfile(files["summary"], pipeline_path("full_summary.json"))
+
+def analysis_stage():
+    from chaos_analyzer import ChaosTheoryAnalyzer
+    with open(pipeline_path("full_results.json")) as f:
+        results = json.load(f)
+    test_results = {
+        noise_type: [{"divergence": r["mean_divergence"], "lyapunov": r["mean_proxy_lyapunov"]} for r in runs]
+        for noise_type, runs in results.items()
+    }
+    report = ChaosTheoryAnalyzer().generate_report(test_results)
+    with open(pipeline_path("analysis.txt"), 'w') as f:
+        f.write(report)
+    print(report)
+
+def plot_stage():
+    import matplotlib
+    matplotlib.use("Agg")
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analysis'))
+    import visualize_results
+    
+    # Plot the pipeline's own copies, the inputs this stage is hashed on,
+    # rather than whatever the store or catalog calls latest
+    with open(pipeline_path("full_summary.json")) as f:
+        data = json.load(f)
+    if not data:
+        return False
+    phase = visualize_results.load_phase_space("../results", pipeline_path("full_results.json"))
+    visualize_results.render_all(data, "../results", phase=phase or {})
+
+def build_pipeline(targets):
+    """Stage DAG for the selected targets; report follows whatever runs before it"""
+    from stage_dag import Stage, StageGraph, module_sources
+    from run_catalog import resolve_latest
+    
+    os.makedirs(PIPELINE_DIR, exist_ok=True)
+    graph = StageGraph(pipeline_path("state.json"))
+    
+    graph.add(Stage("mini", mini_stage, inputs=module_sources("../src/run_experiment.py"),
+                    outputs=[pipeline_path("mini_results.json")]))
+    graph.add(Stage("full", full_stage,
+                    inputs=["test_cases.json"] + module_sources("../src/chaos_experiment.py"),
+                    outputs=[pipeline_path("full_results.json"), pipeline_path("full_summary.json")],
+                    params={"model": "phi3:mini"}))
+    graph.add(Stage("analysis", analysis_stage, inputs=module_sources("../src/chaos_analyzer.py"),
+                    outputs=[pipeline_path("analysis.txt")], deps=["full"]))
+    graph.add(Stage("plot", plot_stage, inputs=module_sources("../analysis/visualize_results.py", ["../src"]),
+                    outputs=["../results/attractor_visualization.png", "../results/trajectory_plot.png"],
+                    deps=["full"]))
+    graph.add(Stage("comedy", run_comedy_experiment,
+                    inputs=["test_cases.json"] + module_sources("../src/chaos_comedy_experiment.py"),
+                    outputs=["../results/COMEDY_REPORT.md", "../results/comedy_gold.json"]))
+    graph.add(Stage("report", generate_report,
+                    inputs=[lambda: resolve_latest("summary", "../results")],
+                    outputs=["../EXPERIMENT_REPORT.md"],
+                    deps=[name for name in ("full", "analysis", "comedy") if name in targets]))
+    return graph
+
 def main():
     """Main execution flow"""
     print("🌀 CHAOS THEORY IN AI - MASTER EXPERIMENT RUNNER")
@@ -215,30 +327,28 @@ def main():
     print("5. 🎭 Run COMEDY CHAOS experiment (NEW!)")
     print("6. Run everything including comedy")
     
-    choice = input("\nEnter choice (1-6) or press Enter for option 3: ").strip()
+    # A choice on the command line (or no terminal, e.g. cron) skips the prompt
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    force = "--force" in sys.argv
+    if args:
+        choice = args[0]
+    elif sys.stdin.isatty():
+        choice = input("\nEnter choice (1-6) or press Enter for option 3: ").strip()
+    else:
+        choice = ""
     
-    if not choice:
+    if choice not in CHOICE_TARGETS:
         choice = "3"
     
-    if choice in ["1", "3"]:
-        run_mini_experiment()
-    
-    if choice in ["2", "3"]:
-        run_full_experiment()
-    
     if choice == "4":
         run_chaos_analysis()
     
-    if choice == "5":
-        run_comedy_experiment()
-    
-    if choice == "6":
-        run_mini_experiment()
-        run_full_experiment()
-        run_comedy_experiment()
-    
-    # Always generate report at the end
-    generate_report()
+    # Stages whose inputs are unchanged since their last run are skipped;
+    # independent stages (e.g. comedy vs. analysis/plot) run in parallel.
+    # The report is always part of the targets.
+    targets = CHOICE_TARGETS[choice]
+    status = build_pipeline(targets).run(targets, force=force)
+    print("\n📋 Stages: " + ", ".join(f"{name} {state}" for name, state in status.items()))
     
     print("\n🎉 Experiment complete!")
     print("\nNext steps:")
@@ -9,10 +9,19 @@ import urllib.request
 import time
 from datetime import datetime
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+from job_queue import submission_headers
+
+# Probes go through the job queue daemon (if CHAOS_OLLAMA_URL points at it)
+# at interactive priority, ahead of any running sweep
+OLLAMA_URL = os.environ.get("CHAOS_OLLAMA_URL", "http://localhost:11434")
+PROBE_HEADERS = submission_headers("interactive", "probe")
 
 def query_ollama(prompt, model="phi3:mini", max_retries=3):
     """Query Ollama with retry logic"""
-    url = "http://localhost:11434/api/generate"
+    url = f"{OLLAMA_URL}/api/generate"
     
     data = {
         "model": model,
@@ -29,7 +38,7 @@ def query_ollama(prompt, model="phi3:mini", max_retries=3):
             req = urllib.request.Request(
                 url,
                 data=json.dumps(data).encode('utf-8'),
-                headers={'Content-Type': 'application/json'}
+                headers={'Content-Type': 'application/json', **PROBE_HEADERS}
             )
             
             with urllib.request.urlopen(req, timeout=45) as response:
@@ -76,7 +85,7 @@ def run_chaos_test():
     # Check Ollama
     print("\n🔍 Checking Ollama...")
     try:
-        url = "http://localhost:11434/api/tags"
+        url = f"{OLLAMA_URL}/api/tags"
         with urllib.request.urlopen(url, timeout=5) as response:
             print("✅ Ollama is running!")
     except:
@@ -4,14 +4,24 @@ Quick test to verify Ollama is working and run a basic chaos experiment
 """
 
 import json
+import os
 import urllib.request
 import time
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+from job_queue import submission_headers
+
+# Probes go through the job queue daemon (if CHAOS_OLLAMA_URL points at it)
+# at interactive priority, ahead of any running sweep
+OLLAMA_URL = os.environ.get("CHAOS_OLLAMA_URL", "http://localhost:11434")
+PROBE_HEADERS = submission_headers("interactive", "probe")
 
 def test_ollama():
     """Test if Ollama is accessible"""
     try:
         # Test with simple prompt
-        url = "http://localhost:11434/api/generate"
+        url = f"{OLLAMA_URL}/api/generate"
         data = {
             "model": "phi3:mini",
             "prompt": "Say hello",
@@ -21,7 +31,7 @@ def test_ollama():
         req = urllib.request.Request(
             url,
             data=json.dumps(data).encode('utf-8'),
-            headers={'Content-Type': 'application/json'}
+            headers={'Content-Type': 'application/json', **PROBE_HEADERS}
         )
         
         print("Testing Ollama connection...")
@@ -51,7 +61,7 @@ def run_quick_chaos_test():
         ("urgent", "I need you to explain quantum computing RIGHT NOW it's urgent")
     ]
     
-    url = "http://localhost:11434/api/generate"
+    url = f"{OLLAMA_URL}/api/generate"
     responses = {}
     
     for label, prompt in tests:
@@ -67,7 +77,7 @@ def run_quick_chaos_test():
         req = urllib.request.Request(
             url,
             data=json.dumps(data).encode('utf-8'),
-            headers={'Content-Type': 'application/json'}
+            headers={'Content-Type': 'application/json', **PROBE_HEADERS}
         )
         
         try:
@@ -7,7 +7,6 @@ This runs the full suite of experiments with proper error handling
 import json
 import os
 import sys
-import time
 from datetime import datetime
 import subprocess
 
@@ -149,9 +148,6 @@ def run_full_experiments():
             except Exception as e:
                 print(f"   ✗ Error: {e}")
                 continue
-            
-            # Be nice to the API
-            time.sleep(2)
     
     # Save final results
     print("\n📊 Saving final results...")
@@ -192,6 +188,9 @@ def run_full_experiments():
     except Exception as e:
         print(f"Analysis error: {e}")
     
+    pacing = experiment.controller.snapshot()
+    print(f"⚙️  Concurrency window: {pacing['window']} (throughput {pacing['throughput_rps']} req/s, "
+          f"{pacing['overloads']} overload signals)")
     print(f"\n✅ Experiments completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"📁 Results saved to: {results_dir}/")
     
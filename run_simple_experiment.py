@@ -7,15 +7,22 @@ No external dependencies required - uses only Python standard library
 import json
 import urllib.request
 import urllib.error
-import time
 import statistics
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import os
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+from concurrency_controller import shared_controller
+from job_queue import client_timeout, submission_headers
+
 class SimpleChaosExperiment:
     def __init__(self, model_name="phi3:mini"):
         self.model_name = model_name
-        self.ollama_url = "http://localhost:11434/api/generate"
+        self.ollama_url = os.environ.get("CHAOS_OLLAMA_URL", "http://localhost:11434") + "/api/generate"
+        self.job_id = f"simple-{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.controller = shared_controller(self.ollama_url)
         self.results = []
         
     def query_ollama(self, prompt, temperature=0.7):
@@ -27,16 +34,20 @@ class SimpleChaosExperiment:
             "stream": False
         }
         
+        req = urllib.request.Request(
+            self.ollama_url,
+            data=json.dumps(data).encode('utf-8'),
+            headers={'Content-Type': 'application/json', **submission_headers("batch", self.job_id)}
+        )
+        
+        def send():
+            with urllib.request.urlopen(req, timeout=client_timeout(self.ollama_url, 30)) as response:
+                return json.loads(response.read().decode('utf-8'))
+        
         try:
-            req = urllib.request.Request(
-                self.ollama_url,
-                data=json.dumps(data).encode('utf-8'),
-                headers={'Content-Type': 'application/json'}
-            )
-            
-            with urllib.request.urlopen(req, timeout=30) as response:
-                result = json.loads(response.read().decode('utf-8'))
-                return result.get('response', '')
+            # The controller paces requests and backs off on timeouts / 5xx
+            result = self.controller.call(send)
+            return result.get('response', '')
                 
         except Exception as e:
             print(f"Error: {e}")
@@ -65,22 +76,13 @@ class SimpleChaosExperiment:
         print(f"   Baseline: '{baseline_prompt[:50]}...'")
         print(f"   Noisy:    '{noisy_prompt[:50]}...'")
         
-        baseline_responses = []
-        noisy_responses = []
-        
-        for i in range(runs):
-            print(f"   Run {i+1}/{runs}...", end="", flush=True)
-            
-            # Get baseline response
-            baseline = self.query_ollama(baseline_prompt)
-            baseline_responses.append(baseline)
-            
-            # Get noisy response
-            noisy = self.query_ollama(noisy_prompt)
-            noisy_responses.append(noisy)
-            
-            print(" ✓")
-            time.sleep(0.5)  # Be nice to the API
+        print(f"   Generating {runs} runs...", end="", flush=True)
+        with ThreadPoolExecutor(max_workers=int(self.controller.max_window)) as pool:
+            baseline_futures = [pool.submit(self.query_ollama, baseline_prompt) for _ in range(runs)]
+            noisy_futures = [pool.submit(self.query_ollama, noisy_prompt) for _ in range(runs)]
+            baseline_responses = [f.result() for f in baseline_futures]
+            noisy_responses = [f.result() for f in noisy_futures]
+        print(f" ✓ (window {self.controller.window:.1f})")
         
         # Calculate divergences
         divergences = []
@@ -195,6 +197,10 @@ class SimpleChaosExperiment:
         most_chaotic = sorted_results[0]
         print(f"\nMost Chaotic: {most_chaotic['noise_type']} ({most_chaotic['divergence']:.1%})")
         
+        pacing = self.controller.snapshot()
+        print(f"\n⚙️  Concurrency window: {pacing['window']} (throughput {pacing['throughput_rps']} req/s, "
+              f"{pacing['overloads']} overload signals)")
+        
         print("\n✅ Experiment complete!")
 
 def main():
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Content-addressed, deduplicating store for full response texts
+Responses are keyed by SHA-256, compressed with a dictionary trained on the
+corpus (zstd when `zstandard` is installed, zlib preset dictionary
+otherwise) and appended to a pack file with a SQLite offset index
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import zstandard
+    HAVE_ZSTD = True
+except ImportError:
+    HAVE_ZSTD = False
+
+ZLIB_MAX_DICT = 32768  # zlib only looks back 32 KiB, so larger presets are wasted
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    id TEXT PRIMARY KEY,
+    offset INTEGER,
+    length INTEGER,
+    raw_length INTEGER,
+    codec TEXT,
+    dict_id TEXT
+);
+CREATE TABLE IF NOT EXISTS dictionaries (
+    dict_id TEXT PRIMARY KEY,
+    codec TEXT,
+    data BLOB
+);
+"""
+
+
+def blob_id(text: str) -> str:
+    """Content address of a response"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def train_zlib_dictionary(samples: List[str], size: int = ZLIB_MAX_DICT) -> bytes:
+    """
+    Build a zlib preset dictionary from the phrases that recur most across
+    samples. zlib favours matches near the end of the dictionary, so the
+    highest-value phrases are placed last.
+    """
+    phrases = Counter()
+    for sample in samples:
+        for phrase in set(re.split(r'(?<=[.!?:\n])\s+', sample)):
+            if 8 <= len(phrase) <= 400:
+                phrases[phrase] += 1
+
+    scored = sorted(((count * len(p), p) for p, count in phrases.items() if count > 1), reverse=True)
+    chosen, total = [], 0
+    for _, phrase in scored:
+        encoded = phrase.encode("utf-8") + b" "
+        if total + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        total += len(encoded)
+
+    if total < size:
+        # Top up with frequent words so short corpora still get a useful
+        # preset; appended last here, so the reversal puts it at the far end
+        words = Counter(w for s in samples for w in s.split())
+        filler = b" ".join(w.encode("utf-8") for w, _ in words.most_common(2000))
+        chosen.append(filler[:size - total])
+
+    return b"".join(reversed(chosen))
+
+
+class BlobStore:
+    """
+    Deduplicating response store with random-access reads.
+
+    put() returns the blob id; identical texts are stored once. Once
+    `train_after` blobs exist without a dictionary, one is trained from them
+    and used for every later blob (each blob records the dictionary it needs).
+    """
+
+    def __init__(self, root: str = "../results/blobs", train_after: int = 64,
+                 dict_size: int = 64 * 1024, level: int = 9):
+        self.root = root
+        self.train_after = train_after
+        self.dict_size = dict_size
+        self.level = level
+        self.codec = "zstd" if HAVE_ZSTD else "zlib"
+        self._lock = threading.Lock()
+        self._dicts = {}
+
+        os.makedirs(root, exist_ok=True)
+        self.pack_path = os.path.join(root, "blobs.pack")
+        open(self.pack_path, "ab").close()
+        self.conn = sqlite3.connect(os.path.join(root, "index.db"), check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+
+        row = self.conn.execute(
+            "SELECT dict_id FROM dictionaries WHERE codec = ? ORDER BY rowid DESC LIMIT 1",
+            (self.codec,)).fetchone()
+        self.active_dict = row[0] if row else None
+        self.dedup_hits = 0
+
+    # ---- compression ---------------------------------------------------
+
+    def _dictionary(self, dict_id: Optional[str]) -> Optional[bytes]:
+        if dict_id is None:
+            return None
+        if dict_id not in self._dicts:
+            row = self.conn.execute("SELECT data FROM dictionaries WHERE dict_id = ?", (dict_id,)).fetchone()
+            self._dicts[dict_id] = row[0]
+        return self._dicts[dict_id]
+
+    def _compress(self, raw: bytes, codec: str, dict_id: Optional[str]) -> bytes:
+        data = self._dictionary(dict_id)
+        if codec == "zstd":
+            dict_data = zstandard.ZstdCompressionDict(data) if data else None
+            return zstandard.ZstdCompressor(level=self.level, dict_data=dict_data).compress(raw)
+        compressor = zlib.compressobj(self.level, zdict=data) if data else zlib.compressobj(self.level)
+        return compressor.compress(raw) + compressor.flush()
+
+    def _decompress(self, blob: bytes, codec: str, dict_id: Optional[str]) -> bytes:
+        data = self._dictionary(dict_id)
+        if codec == "zstd":
+            dict_data = zstandard.ZstdCompressionDict(data) if data else None
+            return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(blob)
+        decompressor = zlib.decompressobj(zdict=data) if data else zlib.decompressobj()
+        return decompressor.decompress(blob) + decompressor.flush()
+
+    def train_dictionary(self, samples: List[str]) -> str:
+        """Train and activate a new dictionary from sample texts"""
+        if self.codec == "zstd":
+            encoded = [s.encode("utf-8") for s in samples if s]
+            data = zstandard.train_dictionary(self.dict_size, encoded).as_bytes()
+        else:
+            data = train_zlib_dictionary(samples, min(self.dict_size, ZLIB_MAX_DICT))
+        dict_id = hashlib.sha256(data).hexdigest()[:16]
+
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO dictionaries VALUES (?, ?, ?)",
+                              (dict_id, self.codec, data))
+        self.active_dict = dict_id
+        return dict_id
+
+    def _maybe_train(self) -> None:
+        if self.active_dict is not None or self.train_after <= 0:
+            return
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM blobs").fetchone()
+        if count >= self.train_after:
+            ids = [r[0] for r in self.conn.execute("SELECT id FROM blobs LIMIT 2000")]
+            try:
+                self.train_dictionary(self.get_many(ids))
+            except Exception as e:
+                # zstd refuses to train on tiny corpora; keep storing without a dictionary
+                print(f"Dictionary training skipped: {e}")
+                self.train_after *= 2
+
+    # ---- writing / reading ---------------------------------------------
+
+    def put(self, text: str) -> str:
+        return self.put_many([text])[0]
+
+    def put_many(self, texts: Iterable[str]) -> List[str]:
+        """Store texts (deduplicated by content) and return their ids in order"""
+        ids = []
+        with self._lock:
+            self._maybe_train()
+            with self.conn, open(self.pack_path, "ab") as pack:
+                for text in texts:
+                    key = blob_id(text)
+                    ids.append(key)
+                    if self.conn.execute("SELECT 1 FROM blobs WHERE id = ?", (key,)).fetchone():
+                        self.dedup_hits += 1
+                        continue
+                    raw = text.encode("utf-8")
+                    blob = self._compress(raw, self.codec, self.active_dict)
+                    offset = pack.tell()
+                    pack.write(blob)
+                    self.conn.execute("INSERT INTO blobs VALUES (?, ?, ?, ?, ?, ?)",
+                                      (key, offset, len(blob), len(raw), self.codec, self.active_dict))
+        return ids
+
+    def get(self, key: str) -> str:
+        """Random-access read of one response by id"""
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: List[str]) -> List[str]:
+        rows = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            for row in self.conn.execute(
+                    f"SELECT id, offset, length, codec, dict_id FROM blobs WHERE id IN ({marks})", chunk):
+                rows[row[0]] = row[1:]
+
+        texts = []
+        with open(self.pack_path, "rb") as pack:
+            for key in keys:
+                if key not in rows:
+                    raise KeyError(key)
+                offset, length, codec, dict_id = rows[key]
+                pack.seek(offset)
+                texts.append(self._decompress(pack.read(length), codec, dict_id).decode("utf-8"))
+        return texts
+
+    def __contains__(self, key: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM blobs WHERE id = ?", (key,)).fetchone() is not None
+
+    def stats(self) -> Dict[str, float]:
+        """Unique blobs, raw vs stored bytes and the overall compression ratio"""
+        count, raw, stored = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(raw_length), 0), COALESCE(SUM(length), 0) FROM blobs").fetchone()
+        return {
+            "unique_blobs": count,
+            "dedup_hits": self.dedup_hits,
+            "raw_bytes": raw,
+            "stored_bytes": stored,
+            "compression_ratio": raw / stored if stored else 0.0,
+            "codec": self.codec
+        }
+
+    def close(self) -> None:
+        self.conn.close()
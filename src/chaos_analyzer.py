@@ -9,11 +9,16 @@ import numpy as np
 from typing import Dict, List, Tuple
 import math
 
+from chaos_stats import ResamplingEngine
+from token_corpus import TokenCorpus
+
 class ChaosTheoryAnalyzer:
     """Analyze AI responses using chaos theory metrics"""
     
     def __init__(self):
         self.results = {}
+        self.stats_engine = ResamplingEngine()
+        self.corpus = TokenCorpus()
         
     def calculate_lyapunov_proxy(self, baseline_response: str, noisy_response: str, 
                                 prompt_distance: float = 0.1) -> float:
@@ -68,13 +73,34 @@ class ChaosTheoryAnalyzer:
         
         return d_ky
     
-    def analyze_attractor_basins(self, responses: List[str]) -> Dict:
+    def analyze_attractor_basins(self, responses: List[str] = None, distances=None) -> Dict:
         """
         Analyze the stability of attractor basins by measuring
         variance in responses to the same prompt type
+        
+        Pass either the responses or a precomputed edit-distance matrix
+        (an array or a TiledDistanceMatrix, which is streamed tile by tile)
         """
         from difflib import SequenceMatcher
         
+        if distances is not None:
+            if hasattr(distances, "off_diagonal_moments"):
+                moments = distances.off_diagonal_moments()
+            else:
+                upper = np.asarray(distances, dtype=float)[np.triu_indices(len(distances), k=1)]
+                moments = {"count": upper.size, "mean": upper.mean() if upper.size else 0.0,
+                           "variance": upper.var() if upper.size else 0.0}
+            if moments["count"] == 0:
+                return {"stability": 1.0, "variance": 0.0}
+            # Similarity is 1 - distance: same variance, mirrored mean
+            mean_similarity = 1 - moments["mean"]
+            variance = moments["variance"]
+            return {
+                "stability": mean_similarity,
+                "variance": variance,
+                "attractor_strength": 1 - variance
+            }
+        
         if len(responses) < 2:
             return {"stability": 1.0, "variance": 0.0}
         
@@ -99,28 +125,8 @@ class ChaosTheoryAnalyzer:
         Measure various complexity metrics of a response
         Related to the Kaplan-Yorke dimension concept
         """
-        words = response.split()
-        sentences = response.split('.')
-        
-        # Vocabulary diversity (unique words / total words)
-        vocab_diversity = len(set(words)) / len(words) if words else 0
-        
-        # Sentence complexity (words per sentence)
-        avg_sentence_length = len(words) / len(sentences) if sentences else 0
-        
-        # Information density (characters per word)
-        avg_word_length = len(response) / len(words) if words else 0
-        
-        # Punctuation complexity
-        punctuation_density = sum(1 for c in response if c in '.,!?;:()[]{}') / len(response) if response else 0
-        
-        return {
-            "vocab_diversity": vocab_diversity,
-            "avg_sentence_length": avg_sentence_length,
-            "avg_word_length": avg_word_length,
-            "punctuation_density": punctuation_density,
-            "complexity_score": vocab_diversity * avg_sentence_length * 0.1  # Combined metric
-        }
+        # Tokenized once per distinct response; the metrics are array reductions
+        return self.corpus.complexity(self.corpus.add(response))
     
     def analyze_noise_effects(self, test_results: Dict) -> Dict:
         """
@@ -128,20 +134,32 @@ class ChaosTheoryAnalyzer:
         """
         analysis = {}
         
-        for noise_type, results in test_results.items():
-            if not results:
-                continue
-                
-            # Extract metrics
-            divergences = [r.get('divergence', 0) for r in results]
-            lyapunovs = [r.get('lyapunov', 0) for r in results]
-            complexities = [r.get('complexity', {}).get('complexity_score', 0) for r in results]
+        # Extract metrics
+        metrics = {
+            noise_type: {
+                "divergence": [r.get('divergence', 0) for r in results],
+                "lyapunov": [r.get('lyapunov', 0) for r in results],
+                "complexity": [r.get('complexity', {}).get('complexity_score', 0) for r in results]
+            }
+            for noise_type, results in test_results.items() if results
+        }
+        intervals = self.stats_engine.summarize(metrics)
+        
+        for noise_type, values in metrics.items():
+            divergences = values["divergence"]
+            lyapunovs = values["lyapunov"]
+            
+            # Does this noise type diverge differently from all the others?
+            others = [d for other, v in metrics.items() if other != noise_type for d in v["divergence"]]
             
             analysis[noise_type] = {
                 "mean_divergence": np.mean(divergences),
                 "std_divergence": np.std(divergences),
+                "divergence_ci": list(intervals[noise_type]["divergence_ci"]),
+                "divergence_p_value": self.stats_engine.permutation_test(divergences, others),
                 "mean_lyapunov": np.mean(lyapunovs),
-                "mean_complexity": np.mean(complexities),
+                "lyapunov_ci": list(intervals[noise_type]["lyapunov_ci"]),
+                "mean_complexity": np.mean(values["complexity"]),
                 "chaos_classification": self._classify_chaos_level(np.mean(lyapunovs))
             }
         
@@ -180,6 +198,8 @@ class ChaosTheoryAnalyzer:
             report.append(f"  Chaos Classification: {metrics['chaos_classification']}")
             report.append(f"  Mean Lyapunov Exponent: {metrics['mean_lyapunov']:.3f}")
             report.append(f"  Mean Divergence: {metrics['mean_divergence']:.3f} (±{metrics['std_divergence']:.3f})")
+            lo, hi = metrics['divergence_ci']
+            report.append(f"  Divergence 95% CI: [{lo:.3f}, {hi:.3f}] (p = {metrics['divergence_p_value']:.3f} vs other noise types)")
             report.append(f"  Mean Complexity: {metrics['mean_complexity']:.3f}")
         
         # Visual representation
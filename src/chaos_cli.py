@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Single entry point for the chaos experiments
+Each subcommand imports its heavy modules (numpy, matplotlib, the runners)
+only when it runs, so `chaos probe` starts in tens of milliseconds and can
+sit in tight loops or cron; every option can come from flags or a JSON spec
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_RESULTS = os.path.join(ROOT, "results")
+DEFAULT_TEST_CASES = os.path.join(ROOT, "experiments", "test_cases.json")
+
+
+def ollama_url(args) -> str:
+    return args.url or os.environ.get("CHAOS_OLLAMA_URL", "http://localhost:11434")
+
+
+def load_results(path, results_dir: str = DEFAULT_RESULTS):
+    """Experiment results file, or the latest one in the catalog"""
+    from run_catalog import resolve_latest
+    path = path or resolve_latest("results", results_dir)
+    if not path:
+        raise SystemExit("❌ No results found; run `chaos sweep` first")
+    with open(path) as f:
+        return path, json.load(f)
+
+
+# ---- subcommands -------------------------------------------------------
+
+def cmd_probe(args) -> int:
+    """One interactive-priority request; exit status says whether Ollama answered"""
+    import urllib.request
+    from job_queue import submission_headers
+
+    payload = json.dumps({"model": args.model, "prompt": args.prompt, "stream": False,
+                          "options": {"num_predict": args.max_tokens}}).encode("utf-8")
+    request = urllib.request.Request(
+        f"{ollama_url(args)}/api/generate", data=payload,
+        headers={"Content-Type": "application/json", **submission_headers("interactive", "probe")})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=args.timeout) as response:
+            text = json.loads(response.read().decode("utf-8")).get("response", "")
+    except Exception as e:
+        print(f"✗ {args.model}: {e}")
+        return 1
+    elapsed = time.perf_counter() - start
+    if args.json:
+        print(json.dumps({"model": args.model, "latency_s": round(elapsed, 3), "response": text}))
+    else:
+        print(f"✓ {args.model} answered in {elapsed:.2f}s: {text.strip()[:120]}")
+    return 0
+
+
+def cmd_sweep(args) -> int:
+    """Run a sweep locally (or on the experiment service) and index it in the catalog"""
+    spec = {"model": args.model, "num_runs": args.num_runs, "noise_types": args.noise_types,
+            "test_cases": args.test_cases, "metrics": args.metrics}
+
+    if args.service:
+        import urllib.request
+        from experiment_service import watch
+        request = urllib.request.Request(f"{args.service}/runs", data=json.dumps(spec).encode("utf-8"),
+                                         method="POST", headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=10) as response:
+            run_id = json.loads(response.read())["run_id"]
+        print(f"✅ Submitted run {run_id} to {args.service}")
+        if not args.detach:
+            watch(args.service, run_id)
+        return 0
+
+    from blob_store import BlobStore
+    from chaos_experiment import ChaosExperiment
+    from results_store import ResultsStore
+    from run_catalog import RunCatalog
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    started_at = time.time()
+    experiment = ChaosExperiment(model_name=args.model, ollama_url=ollama_url(args),
+                                 store=ResultsStore(os.path.join(args.results_dir, "store")),
+                                 blob_store=BlobStore(os.path.join(args.results_dir, "blobs")),
+                                 output_dir=args.results_dir, divergence_metrics=args.metrics)
+    experiment.run_full_experiment(args.test_cases, noise_types=args.noise_types, num_runs=args.num_runs)
+
+    files = {}
+    for kind in ("results", "summary"):
+        if not os.path.exists(experiment.output_path(kind)):
+            continue
+        path = os.path.join(args.results_dir, f"{kind}_{experiment.run_id}.json")
+        os.replace(experiment.output_path(kind), path)
+        files[kind] = path
+    if "results" not in files:
+        print("❌ The sweep produced no results (no matching noise types?)")
+        return 1
+    comparisons = sum(len(r["divergences"]) for rs in experiment.results.values() for r in rs)
+    catalog = RunCatalog(os.path.join(args.results_dir, "catalog.db"))
+    catalog.register_run(experiment.run_id, args.model, files, matrix=os.path.basename(args.test_cases),
+                         started_at=started_at, record_counts={"comparison": comparisons},
+                         aggregates=experiment.aggregates)
+    catalog.close()
+    print(f"\n📊 Results saved to {files['results']}")
+    return 0
+
+
+def cmd_analyze(args) -> int:
+    """Chaos-theory report over the per-pair results of a sweep"""
+    from chaos_analyzer import ChaosTheoryAnalyzer
+
+    path, results = load_results(args.results, args.results_dir)
+    test_results = {
+        noise_type: [{"divergence": r["mean_divergence"], "lyapunov": r["mean_proxy_lyapunov"]}
+                     for r in runs]
+        for noise_type, runs in results.items()
+    }
+    print(f"📈 Analyzing {path}")
+    print(ChaosTheoryAnalyzer().generate_report(test_results))
+    return 0
+
+
+def cmd_critic(args) -> int:
+    """Validate a sweep's measurements with the critic model"""
+    from blob_store import BlobStore
+    from chaos_critic import DEFAULT_BATCH_SIZE, ChaosCritic
+    from verdict_cache import VerdictCache
+
+    path, results = load_results(args.results, args.results_dir)
+    blob_dir = os.path.join(args.results_dir, "blobs")
+    critic = ChaosCritic(critic_model=args.critic_model, ollama_url=ollama_url(args),
+                         verdict_cache=VerdictCache(os.path.join(blob_dir, "verdicts.db")),
+                         blob_store=BlobStore(blob_dir) if os.path.isdir(blob_dir) else None)
+    cascade = None
+    if args.cascade:
+        from critic_cascade import CriticCascade
+        cascade = CriticCascade(critic)
+
+    batch_size = args.batch_size if args.batch_size is not None else DEFAULT_BATCH_SIZE
+    validation = critic.validate_chaos_measurements(results, batch_size=batch_size, cascade=cascade)
+    out = args.out or os.path.join(args.results_dir, f"validation_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(out, "w") as f:
+        json.dump(validation, f, indent=2)
+
+    for noise_type, summary in validation.items():
+        print(f"  {noise_type:25} agreement {summary['agreement_rate']:.0%}, "
+              f"pattern {'confirmed' if summary['pattern_confirmed'] else 'not confirmed'}")
+    if args.meta:
+        print("\n" + critic.meta_critique(validation))
+    print(f"\n✅ Validation of {path} saved to {out}")
+    return 0
+
+
+def cmd_report(args) -> int:
+    """Write EXPERIMENT_REPORT.md from the latest summary"""
+    sys.path.insert(0, os.path.join(ROOT, "experiments"))
+    from run_all import generate_report
+    generate_report(args.results_dir, args.out)
+    return 0
+
+
+def cmd_plot(args) -> int:
+    """Render the attractor and trajectory figures (cached, headless) or show them"""
+    import matplotlib
+    if not args.show:
+        matplotlib.use("Agg")
+    sys.path.insert(0, os.path.join(ROOT, "analysis"))
+    import visualize_results
+
+    data = visualize_results.load_latest_results(args.results_dir)
+    if not data:
+        print("❌ No results found to visualize")
+        return 1
+    if args.show:
+        visualize_results.create_attractor_visualization(data, os.path.join(args.results_dir, "attractor_visualization.png"))
+        visualize_results.create_trajectory_plot(data, os.path.join(args.results_dir, "trajectory_plot.png"),
+                                                 phase=visualize_results.load_phase_space(args.results_dir))
+        visualize_results.plt.show()
+    else:
+        visualize_results.render_all(data, args.results_dir, dpi=args.dpi, force=args.force)
+    return 0
+
+
+# ---- argument parsing --------------------------------------------------
+
+def build_parser() -> argparse.ArgumentParser:
+    # Options every subcommand accepts, after the subcommand name
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--spec", help="JSON file of option defaults (flags override it)")
+    common.add_argument("--url", default=None, help="Ollama or job queue URL (default $CHAOS_OLLAMA_URL)")
+    common.add_argument("--results-dir", default=DEFAULT_RESULTS)
+
+    parser = argparse.ArgumentParser(prog="chaos", description="Chaos theory in AI experiments")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    probe = sub.add_parser("probe", parents=[common], help="check that a model answers")
+    probe.add_argument("--model", default="phi3:mini")
+    probe.add_argument("--prompt", default="Say hello")
+    probe.add_argument("--max-tokens", type=int, default=16)
+    probe.add_argument("--timeout", type=float, default=30)
+    probe.add_argument("--json", action="store_true", help="machine-readable output")
+    probe.set_defaults(func=cmd_probe)
+
+    sweep = sub.add_parser("sweep", parents=[common], help="run a noise sweep")
+    sweep.add_argument("--model", default="phi3:mini")
+    sweep.add_argument("--num-runs", type=int, default=3)
+    sweep.add_argument("--noise-types", nargs="*", default=None)
+    sweep.add_argument("--test-cases", default=DEFAULT_TEST_CASES)
+    sweep.add_argument("--metrics", nargs="+", default=["edit_distance"],
+                       help="text divergences per comparison: edit_distance (always included), tfidf_cosine")
+    sweep.add_argument("--service", help="submit to an experiment service URL instead of running here")
+    sweep.add_argument("--detach", action="store_true", help="with --service, do not wait for the run")
+    sweep.set_defaults(func=cmd_sweep)
+
+    analyze = sub.add_parser("analyze", parents=[common], help="chaos-theory analysis of a sweep")
+    analyze.add_argument("--results", help="results file (default: latest)")
+    analyze.set_defaults(func=cmd_analyze)
+
+    critic = sub.add_parser("critic", parents=[common], help="validate a sweep with the critic model")
+    critic.add_argument("--results", help="results file (default: latest)")
+    critic.add_argument("--critic-model", default="gemma:2b")
+    critic.add_argument("--batch-size", type=int,
+                        help="pairs per critic request (default 4; 1 makes one call per pair)")
+    critic.add_argument("--cascade", action="store_true", help="resolve easy pairs locally first")
+    critic.add_argument("--meta", action="store_true", help="also print the meta-critique")
+    critic.add_argument("--out", help="validation output path")
+    critic.set_defaults(func=cmd_critic)
+
+    report = sub.add_parser("report", parents=[common], help="write EXPERIMENT_REPORT.md")
+    report.add_argument("--out", default=os.path.join(ROOT, "EXPERIMENT_REPORT.md"))
+    report.set_defaults(func=cmd_report)
+
+    plot = sub.add_parser("plot", parents=[common], help="render result figures")
+    plot.add_argument("--show", action="store_true", help="open interactive windows")
+    plot.add_argument("--dpi", type=int, default=300)
+    plot.add_argument("--force", action="store_true", help="re-render even if unchanged")
+    plot.set_defaults(func=cmd_plot)
+
+    parser.commands = sub.choices
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.spec:
+        # Spec keys become defaults for the chosen subcommand; explicit flags still win
+        with open(args.spec) as f:
+            spec = {key.replace("-", "_"): value for key, value in json.load(f).items()}
+        parser.commands[args.command].set_defaults(**spec)
+        args = parser.parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,160 +5,236 @@ Now with 100% more amusement and smaller models for maximum chaos
 """
 
 import json
-import requests
 import numpy as np
 from typing import List, Dict, Tuple, Optional
-import time
 from datetime import datetime
 import re
 from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+
+from ollama_client import DEFAULT_OLLAMA_URL, generate, model_digest
+from concurrency_controller import shared_controller
+from verdict_cache import VerdictCache
+from excerpt_selector import ExcerptSelector
 
 class ChaosExperimentWithCritic:
     """
     The original experiment but now with comedy critic validation
     """
     
-    def __init__(self, model_name: str = "phi3:mini", critic_model: str = "gemma:2b"):
+    def __init__(self, model_name: str = "phi3:mini", critic_model: str = "gemma:2b",
+                 verdict_cache: Optional[VerdictCache] = None,
+                 subject_concurrency: int = 1, critic_concurrency: int = 1):
         self.model_name = model_name
         self.critic_model = critic_model
-        self.ollama_url = "http://localhost:11434"
+        # Separate in-flight limits per model for the pipelined runner
+        self.subject_concurrency = subject_concurrency
+        self.critic_concurrency = critic_concurrency
+        self.ollama_url = DEFAULT_OLLAMA_URL
+        self.job_id = f"comedy-{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.controller = shared_controller(self.ollama_url)
         self.results = defaultdict(list)
         self.comedy_gold = []  # Store the funniest moments
-        
-    def run_experiment_with_commentary(self):
-        """
-        Run the chaos experiment with live comedy commentary
-        """
-        print("🎭 CHAOS EXPERIMENT: COMEDY EDITION")
-        print(f"Starring: {self.model_name} (our chaos subject)")
-        print(f"With special guest critic: {self.critic_model}")
-        print("="*50)
-        
-        # Load test cases
-        with open("../experiments/test_cases.json", 'r') as f:
-            test_cases = json.load(f)
-        
-        for noise_type, data in test_cases.items():
-            if noise_type == "baseline":
-                continue
-                
-            print(f"\n🎬 SCENE: {noise_type.replace('_', ' ').upper()}")
-            print("-" * 40)
-            
-            baseline_prompts = test_cases["baseline"]["prompts"]
-            noisy_prompts = data["prompts"]
-            
-            for i, (baseline, noisy) in enumerate(zip(baseline_prompts, noisy_prompts)):
-                print(f"\n🎯 Test {i+1}: {baseline[:30]}...")
-                
-                # Get responses
-                baseline_resp = self.query_model(baseline, self.model_name)
-                noisy_resp = self.query_model(noisy, self.model_name)
-                
-                # Get critic's hot take
-                critic_commentary = self.get_critic_commentary(
-                    baseline, noisy, baseline_resp, noisy_resp, noise_type
-                )
-                
-                print(f"🤖 Baseline length: {len(baseline_resp)} chars")
-                print(f"🤪 Noisy length: {len(noisy_resp)} chars")
-                print(f"🎭 Critic says: {critic_commentary}")
-                
-                # Store funny moments
-                if "LOL" in critic_commentary or "😂" in critic_commentary:
-                    self.comedy_gold.append({
-                        "noise_type": noise_type,
-                        "prompt": noisy,
-                        "response_preview": noisy_resp[:100] + "...",
-                        "critic_comment": critic_commentary
-                    })
-                
-                time.sleep(0.5)  # Dramatic pause
-        
-        # Generate the comedy report
-        self.generate_comedy_report()
-    
-    def get_critic_commentary(self, baseline_prompt: str, noisy_prompt: str,
-                            baseline_resp: str, noisy_resp: str, 
-                            noise_type: str) -> str:
-        """
-        Get the critic's comedic take on the responses
-        """
-        prompts = {
-            "orthographic_noise": f"""
+        self.verdict_cache = verdict_cache
+        self._critic_digest = None
+        self.excerpts = ExcerptSelector(token_budget=48)
+        self.commentary_prompts = {
+            "orthographic_noise": """
                 The human typed: "{noisy_prompt}"
                 
-                The AI responded with: "{noisy_resp[:200]}..."
+                The AI responded with: "{noisy_resp}..."
                 
-                Compared to the clean version which said: "{baseline_resp[:200]}..."
+                Compared to the clean version which said: "{baseline_resp}..."
                 
                 Rate the chaos (1-10) and give your funniest observation in one sentence.
                 Use emojis if appropriate. Be honest if it's hilariously bad.
             """,
             
-            "temporal_pressure": f"""
+            "temporal_pressure": """
                 Human said URGENTLY: "{noisy_prompt}"
                 
-                AI's "quick" response: "{noisy_resp[:200]}..."
+                AI's "quick" response: "{noisy_resp}..."
                 
-                VS the leisurely version: "{baseline_resp[:200]}..."
+                VS the leisurely version: "{baseline_resp}..."
                 
                 Did the AI actually hurry? Give a sarcastic review with chaos rating (1-10).
             """,
             
-            "emotional_leakage": f"""
+            "emotional_leakage": """
                 Emotional human: "{noisy_prompt}"
                 
-                AI's response: "{noisy_resp[:200]}..."
+                AI's response: "{noisy_resp}..."
                 
-                VS emotionless version: "{baseline_resp[:200]}..."
+                VS emotionless version: "{baseline_resp}..."
                 
                 Rate the emotional intelligence fail/win (1-10) and roast or praise accordingly.
             """,
             
-            "complexity_accumulation": f"""
+            "complexity_accumulation": """
                 Human's kitchen sink prompt: "{noisy_prompt}"
                 
-                AI tried to answer with: "{noisy_resp[:200]}..."
+                AI tried to answer with: "{noisy_resp}..."
                 
-                Single topic version said: "{baseline_resp[:200]}..."
+                Single topic version said: "{baseline_resp}..."
                 
                 Did the AI have a stroke? Rate the chaos (1-10) and comment on the word salad.
             """,
             
-            "metacognitive_markers": f"""
+            "metacognitive_markers": """
                 Human with special instructions: "{noisy_prompt}"
                 
-                AI's attempt: "{noisy_resp[:200]}..."
+                AI's attempt: "{noisy_resp}..."
                 
-                Normal version: "{baseline_resp[:200]}..."
+                Normal version: "{baseline_resp}..."
                 
                 Did the AI follow instructions or rebel? Chaos rating (1-10) + sassy comment.
             """
         }
         
-        critic_prompt = prompts.get(noise_type, "Just roast this response.")
+    def run_experiment_with_commentary(self):
+        """
+        Run the chaos experiment with live comedy commentary
+        """
+        print("🎭 CHAOS EXPERIMENT: COMEDY EDITION")
+        print(f"Starring: {self.model_name} (our chaos subject)")
+        print(f"With special guest critic: {self.critic_model}")
+        print("="*50)
+        
+        # Load test cases
+        with open("../experiments/test_cases.json", 'r') as f:
+            test_cases = json.load(f)
+        
+        # Flatten the matrix into ordered jobs so generation can run ahead of the critic
+        jobs = []
+        for noise_type, data in test_cases.items():
+            if noise_type == "baseline":
+                continue
+            
+            baseline_prompts = test_cases["baseline"]["prompts"]
+            noisy_prompts = data["prompts"]
+            
+            for i, (baseline, noisy) in enumerate(zip(baseline_prompts, noisy_prompts)):
+                jobs.append((noise_type, i, baseline, noisy))
+        
+        current_scene = None
+        for (noise_type, i, baseline, noisy), (baseline_resp, noisy_resp, critic_commentary) in self.run_pipeline(jobs):
+            if noise_type != current_scene:
+                current_scene = noise_type
+                print(f"\n🎬 SCENE: {noise_type.replace('_', ' ').upper()}")
+                print("-" * 40)
+            
+            print(f"\n🎯 Test {i+1}: {baseline[:30]}...")
+            print(f"🤖 Baseline length: {len(baseline_resp)} chars")
+            print(f"🤪 Noisy length: {len(noisy_resp)} chars")
+            print(f"🎭 Critic says: {critic_commentary}")
+            
+            self.results[noise_type].append({
+                "baseline_prompt": baseline,
+                "noisy_prompt": noisy,
+                "baseline_length": len(baseline_resp),
+                "noisy_length": len(noisy_resp),
+                "critic_comment": critic_commentary
+            })
+            
+            # Store funny moments
+            if "LOL" in critic_commentary or "😂" in critic_commentary:
+                self.comedy_gold.append({
+                    "noise_type": noise_type,
+                    "prompt": noisy,
+                    "response_preview": noisy_resp[:100] + "...",
+                    "critic_comment": critic_commentary
+                })
+        
+        # Generate the comedy report
+        self.generate_comedy_report()
+    
+    def run_pipeline(self, jobs: List[Tuple[str, int, str, str]]):
+        """
+        Yield (job, (baseline_resp, noisy_resp, commentary)) in job order while
+        subject generation for later pairs overlaps with critic calls for
+        earlier ones. Each model gets its own worker pool, so concurrency is
+        limited per model rather than globally.
+        """
+        outputs = [Future() for _ in jobs]
+        
+        def generate_pair(job):
+            _, _, baseline, noisy = job
+            return (self.query_model(baseline, self.model_name),
+                    self.query_model(noisy, self.model_name))
+        
+        def critique(job, responses, output):
+            noise_type, _, baseline, noisy = job
+            try:
+                commentary = self.get_critic_commentary(baseline, noisy, *responses, noise_type)
+                output.set_result((*responses, commentary))
+            except Exception as e:
+                output.set_exception(e)
+        
+        def hand_to_critic(critic_pool, job, output, subject_future):
+            if subject_future.exception() is not None:
+                output.set_exception(subject_future.exception())
+            else:
+                critic_pool.submit(critique, job, subject_future.result(), output)
+        
+        with ThreadPoolExecutor(max_workers=self.critic_concurrency) as critic_pool, \
+                ThreadPoolExecutor(max_workers=self.subject_concurrency) as subject_pool:
+            for job, output in zip(jobs, outputs):
+                subject_pool.submit(generate_pair, job).add_done_callback(
+                    partial(hand_to_critic, critic_pool, job, output)
+                )
+            
+            for job, output in zip(jobs, outputs):
+                yield job, output.result()
+    
+    def get_critic_commentary(self, baseline_prompt: str, noisy_prompt: str,
+                            baseline_resp: str, noisy_resp: str, 
+                            noise_type: str) -> str:
+        """
+        Get the critic's comedic take on the responses
+        """
+        template = self.commentary_prompts.get(noise_type, "Just roast this response.")
+        baseline_excerpt, noisy_excerpt = self.excerpts.select_pair(baseline_resp, noisy_resp)
+        critic_prompt = template.format(
+            noisy_prompt=noisy_prompt,
+            noisy_resp=noisy_excerpt,
+            baseline_resp=baseline_excerpt
+        )
+        
+        key = None
+        if self.verdict_cache is not None:
+            if self._critic_digest is None:
+                self._critic_digest = model_digest(self.critic_model, self.ollama_url)
+            key = VerdictCache.make_key(
+                self._critic_digest,
+                self.verdict_cache.register_template(f"comedy:{noise_type}", template),
+                baseline_resp, noisy_prompt + "\n" + noisy_resp,
+                {"temperature": 0.8, "excerpt_tokens": self.excerpts.token_budget}
+            )
+            cached = self.verdict_cache.get(key)
+            if cached is not None:
+                return cached["commentary"]
         
         try:
             response = self.query_model(critic_prompt, self.critic_model)
-            return response[:200]  # Keep it snappy
         except:
             return "🤷 Critic.exe has stopped working"
+        
+        commentary = response[:200]  # Keep it snappy
+        if key is not None and response and not response.startswith("[Model had"):
+            self.verdict_cache.put(key, f"comedy:{noise_type}", {"commentary": commentary})
+        return commentary
     
     def query_model(self, prompt: str, model: str) -> str:
         """Query any model"""
         try:
-            response = requests.post(
-                f"{self.ollama_url}/api/generate",
-                json={
-                    "model": model,
-                    "prompt": prompt,
-                    "temperature": 0.8,  # Higher temp for more chaos
-                    "stream": False
-                },
-                timeout=30
+            # Both pools share one window, since they hit the same server
+            payload = self.controller.call(
+                generate, prompt, model, ollama_url=self.ollama_url,
+                temperature=0.8,  # Higher temp for more chaos
+                priority="batch", job=self.job_id
             )
-            return response.json().get("response", "")
+            return payload.get("response", "")
         except:
             return "[Model had an existential crisis and refused to answer]"
     
@@ -197,6 +273,7 @@ class ChaosExperimentWithCritic:
             f"Total experiments run: {len(self.results)}",
             f"Comedy gold moments: {len(self.comedy_gold)}",
             f"Critic breakdowns: {sum(1 for m in self.comedy_gold if '🤷' in m.get('critic_comment', ''))}",
+            f"Final concurrency window: {self.controller.snapshot()['window']}",
             "",
             "📊 SCIENTIFIC CONCLUSION:",
             "The smaller the model, the bigger the chaos.",
@@ -226,7 +303,8 @@ if __name__ == "__main__":
     
     experiment = ChaosExperimentWithCritic(
         model_name="phi3:mini",  # Small model = Big chaos
-        critic_model="gemma:2b"  # Another small model critiquing!
+        critic_model="gemma:2b",  # Another small model critiquing!
+        verdict_cache=VerdictCache("../results/blobs/verdicts.db")
     )
     
     experiment.run_experiment_with_commentary()
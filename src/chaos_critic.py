@@ -6,15 +6,54 @@ the predicted behavioral modes
 """
 
 import json
+import re
 from typing import Dict, List, Tuple
 
+from ollama_client import DEFAULT_OLLAMA_URL, generate, model_digest
+from prompt_scheduler import PrefixAffinityScheduler, print_cache_report
+from verdict_cache import VerdictCache
+from excerpt_selector import ExcerptSelector
+from text_features import estimate_tokens
+
+# Pairs per structured-JSON critic request; 1 makes one call per pair
+DEFAULT_BATCH_SIZE = 4
+
 class ChaosCritic:
     """
     Uses an LLM to validate whether responses match predicted attractor basins
     """
     
-    def __init__(self, critic_model: str = "gemma:2b"):
+    # Several pairs of one noise type per call; {criteria} comes from the
+    # noise type's single-pair template
+    BATCH_PROMPT = (
+        "You are grading pairs of AI responses for a chaos theory experiment.\n"
+        "For each pair, does Response 2 show these changes compared to Response 1?\n"
+        "{criteria}\n\n"
+        "Classify each pair as YES (clear shift), NO (no change), PARTIAL (some shift) "
+        "or BIFURCATED (mixed).\n"
+        "Reply with JSON only, in the form "
+        '{{"verdicts": [{{"pair": 1, "classification": "YES", "reasoning": "one sentence"}}]}}\n\n'
+        "{blocks}"
+    )
+    
+    def __init__(self, critic_model: str = "gemma:2b", ollama_url: str = DEFAULT_OLLAMA_URL,
+                 scheduler: PrefixAffinityScheduler = None, verdict_cache: VerdictCache = None,
+                 blob_store=None):
         self.critic_model = critic_model
+        self.ollama_url = ollama_url
+        # Full response texts of runs that recorded response ids; without it
+        # the results' 200-char sample responses are all there is to judge
+        self.blob_store = blob_store
+        # Critic prompts repeat the same instruction block before {baseline},
+        # so route them with prefix affinity to hit the server's prompt cache
+        self.scheduler = scheduler or PrefixAffinityScheduler()
+        self.cache_stats = {}
+        self.batch_stats = {}
+        self.verdict_cache = verdict_cache
+        # Responses are cut to their most contrasting windows, not their first 500 chars
+        self.excerpts = ExcerptSelector(token_budget=96)
+        self.critic_options = {"temperature": 0.1, "excerpt_tokens": self.excerpts.token_budget}
+        self._model_digest = None
         self.evaluation_prompts = {
             "orthographic_noise": """
                 Analyze these two AI responses. Does the second response appear to be:
@@ -69,6 +108,51 @@ class ChaosCritic:
             """
         }
     
+        # Single-response mode labels, used to train the local mode classifier
+        self.mode_prompt = """
+                Read this AI response and name the mode it is written in:
+                - ANALYTICAL: neutral, informational explanation
+                - COMFORTING: reassures or encourages the reader
+                - THERAPEUTIC: de-escalates, validates feelings, counsels
+                - OTHER: none of the above
+                
+                Response: {response}
+                
+                Answer with one word: ANALYTICAL, COMFORTING, THERAPEUTIC or OTHER.
+            """
+    
+    def label_response_modes(self, responses: List[str]) -> List[str]:
+        """
+        Critic mode label ("analytical", "comforting", "therapeutic", "other")
+        for each response; labels are cached so they accumulate into a
+        training set for mode_classifier
+        """
+        labels = [None] * len(responses)
+        keys = [None] * len(responses)
+        if self.verdict_cache is not None:
+            if self._model_digest is None:
+                self._model_digest = model_digest(self.critic_model, self.ollama_url)
+            template_hash = self.verdict_cache.register_template("response_mode", self.mode_prompt)
+            for i, response in enumerate(responses):
+                keys[i] = VerdictCache.make_key(self._model_digest, template_hash, "", response,
+                                                self.critic_options)
+                cached = self.verdict_cache.get(keys[i])
+                if cached is not None:
+                    labels[i] = cached["mode"]
+        
+        missing = [i for i, label in enumerate(labels) if label is None]
+        prompts = [self.mode_prompt.format(response=self.excerpts.select(responses[i])) for i in missing]
+        scheduled = self.scheduler.run(prompts, self.query_model_full) if prompts else {"responses": []}
+        
+        for i, payload in zip(missing, scheduled["responses"]):
+            match = re.search(r'\b(ANALYTICAL|COMFORTING|THERAPEUTIC|OTHER)\b',
+                              payload.get("response", "").upper())
+            labels[i] = match.group(1).lower() if match else "other"
+            if match and keys[i] is not None:
+                self.verdict_cache.put(keys[i], "response_mode", {"mode": labels[i]})
+        
+        return labels
+    
     def evaluate_response_pair(self, baseline: str, noisy: str, 
                              noise_type: str) -> Dict[str, any]:
         """
@@ -77,10 +161,7 @@ class ChaosCritic:
         if noise_type not in self.evaluation_prompts:
             return {"error": "Unknown noise type"}
         
-        prompt = self.evaluation_prompts[noise_type].format(
-            baseline=baseline[:500],  # Truncate for context limits
-            noisy=noisy[:500]
-        )
+        prompt = self.build_evaluation_prompt(baseline, noisy, noise_type)
         
         # Query the critic model
         critic_response = self.query_model(prompt)
@@ -88,32 +169,253 @@ class ChaosCritic:
         # Parse the response
         return self.parse_critic_response(critic_response, noise_type)
     
-    def validate_chaos_measurements(self, experiment_results: Dict) -> Dict:
+    def build_evaluation_prompt(self, baseline: str, noisy: str, noise_type: str) -> str:
+        """Fill the noise-type template for one (baseline, noisy) pair"""
+        baseline, noisy = self.excerpts.select_pair(baseline, noisy)
+        return self.evaluation_prompts[noise_type].format(
+            baseline=baseline,
+            noisy=noisy
+        )
+    
+    def query_model_full(self, prompt: str, format: str = None) -> Dict:
+        """Query the critic model and return the raw Ollama payload"""
+        return generate(prompt, self.critic_model, ollama_url=self.ollama_url,
+                        temperature=0.1, format=format)
+    
+    def query_model(self, prompt: str) -> str:
+        """Query the critic model and return its text"""
+        try:
+            return self.query_model_full(prompt).get("response", "")
+        except Exception as e:
+            print(f"Error querying critic: {e}")
+            return ""
+    
+    def parse_critic_response(self, critic_response: str, noise_type: str) -> Dict[str, any]:
+        """
+        Pull the YES/NO/PARTIAL/BIFURCATED verdict and one-line reasoning
+        out of the critic's free text
+        """
+        match = re.search(r'\b(YES|NO|PARTIAL|BIFURCATED)\b', critic_response.upper())
+        classification = match.group(1) if match else "UNCLEAR"
+        
+        reasoning = critic_response.strip()
+        if match:
+            reasoning = critic_response[match.end():].strip(" .:-\n")
+        
+        return {
+            "noise_type": noise_type,
+            "classification": classification,
+            "reasoning": reasoning.split("\n")[0][:300],
+            "raw_response": critic_response
+        }
+    
+    def criteria_for(self, noise_type: str) -> str:
+        """The bullet list of predicted changes from a noise type's template"""
+        lines = self.evaluation_prompts[noise_type].splitlines()
+        return "\n".join(line.strip() for line in lines if line.strip().startswith("-"))
+    
+    def build_batch_prompt(self, pairs: List[Tuple[str, str]], noise_type: str) -> str:
+        """Pack several (baseline, noisy) pairs of one noise type into one prompt"""
+        blocks = []
+        for i, (baseline, noisy) in enumerate(pairs, 1):
+            baseline, noisy = self.excerpts.select_pair(baseline, noisy)
+            blocks.append(f"Pair {i}\nResponse 1 (baseline): {baseline}\n"
+                          f"Response 2 ({noise_type.replace('_', ' ')}): {noisy}")
+        
+        return self.BATCH_PROMPT.format(criteria=self.criteria_for(noise_type), blocks="\n\n".join(blocks))
+    
+    def parse_batch_response(self, critic_response: str, num_pairs: int,
+                             noise_type: str) -> List[Dict]:
+        """
+        Per-pair verdicts from a batched JSON reply; None for every pair the
+        critic skipped or answered with an unusable verdict
+        """
+        verdicts = [None] * num_pairs
+        
+        try:
+            data = json.loads(critic_response)
+        except ValueError:
+            # Small models sometimes wrap the JSON in prose; take the outermost object
+            match = re.search(r'[\[{].*[\]}]', critic_response, re.DOTALL)
+            try:
+                data = json.loads(match.group(0)) if match else None
+            except ValueError:
+                data = None
+        
+        if isinstance(data, dict):
+            data = next((v for v in data.values() if isinstance(v, list)), [data])
+        if not isinstance(data, list):
+            return verdicts
+        
+        for position, item in enumerate(data):
+            if not isinstance(item, dict):
+                continue
+            try:
+                index = int(item.get("pair", position + 1)) - 1
+            except (TypeError, ValueError):
+                index = position
+            verdict = str(item.get("classification") or item.get("verdict") or "").upper()
+            match = re.search(r'\b(YES|NO|PARTIAL|BIFURCATED)\b', verdict)
+            if 0 <= index < num_pairs and match and verdicts[index] is None:
+                verdicts[index] = {
+                    "noise_type": noise_type,
+                    "classification": match.group(1),
+                    "reasoning": str(item.get("reasoning", ""))[:300],
+                    "raw_response": json.dumps(item)
+                }
+        
+        return verdicts
+    
+    def verdict_template(self, noise_type: str, batch_size: int = 1) -> Tuple[str, str]:
+        """(name, text) of the template a verdict is produced with, single-pair or batched"""
+        if batch_size <= 1:
+            return noise_type, self.evaluation_prompts[noise_type]
+        return f"{noise_type}:batch", self.BATCH_PROMPT.replace("{criteria}", self.criteria_for(noise_type))
+    
+    def verdict_key(self, baseline: str, noisy: str, noise_type: str, batch_size: int = 1) -> Dict[str, str]:
+        """
+        Cache key for one pair under the current critic model and the prompt
+        that produces its verdict: the single-pair template, or the batch
+        template plus the batch size (other pairs in the prompt shift the verdict)
+        """
+        if self._model_digest is None:
+            self._model_digest = model_digest(self.critic_model, self.ollama_url)
+        name, template = self.verdict_template(noise_type, batch_size)
+        template_hash = self.verdict_cache.register_template(name, template)
+        options = self.critic_options if batch_size <= 1 else {**self.critic_options, "batch_size": batch_size}
+        return VerdictCache.make_key(self._model_digest, template_hash, baseline, noisy, options)
+    
+    def evaluate_pairs(self, pairs: List[Tuple[str, str, str]],
+                       batch_size: int = DEFAULT_BATCH_SIZE) -> List[Dict]:
+        """
+        Critic verdicts for (baseline, noisy, noise_type) triples, in order.
+        
+        Pairs already in the verdict cache are answered without a call. With
+        batch_size > 1, the rest are packed into structured-JSON requests per
+        noise type; only pairs whose verdict failed to parse fall back to one
+        call each. Each verdict is cached under the key of the prompt that
+        produced it; batch mode also accepts an earlier single-pair verdict.
+        """
+        if self.verdict_cache is None:
+            return self._evaluate_uncached(pairs, batch_size)[0]
+        
+        single_keys = [self.verdict_key(*pair) for pair in pairs]
+        batch_keys = [self.verdict_key(*pair, batch_size=batch_size) for pair in pairs] if batch_size > 1 else single_keys
+        validations = [self.verdict_cache.get(key) for key in batch_keys]
+        if batch_size > 1:
+            validations = [v if v is not None else self.verdict_cache.get(key)
+                           for v, key in zip(validations, single_keys)]
+        missing = [i for i, v in enumerate(validations) if v is None]
+        print(f"🗃️  Verdict cache: {len(pairs) - len(missing)} hits, {len(missing)} misses")
+        
+        fresh, batched = self._evaluate_uncached([pairs[i] for i in missing], batch_size) if missing else ([], [])
+        for i, verdict, from_batch in zip(missing, fresh, batched):
+            validations[i] = verdict
+            if verdict.get("classification") != "UNCLEAR":
+                name = self.verdict_template(pairs[i][2], batch_size if from_batch else 1)[0]
+                self.verdict_cache.put(batch_keys[i] if from_batch else single_keys[i], name, verdict)
+        
+        return validations
+    
+    def _evaluate_uncached(self, pairs: List[Tuple[str, str, str]],
+                           batch_size: int) -> Tuple[List[Dict], List[bool]]:
+        """
+        Ask the critic about every pair (batched or one call per pair);
+        also returns, per pair, whether its verdict came from a batched call
+        """
+        if batch_size <= 1:
+            return self._evaluate_single(pairs, list(range(len(pairs))), [None] * len(pairs)), [False] * len(pairs)
+        
+        by_type = {}
+        for i, (_, _, noise_type) in enumerate(pairs):
+            by_type.setdefault(noise_type, []).append(i)
+        chunks = [(noise_type, indices[start:start + batch_size])
+                  for noise_type, indices in by_type.items()
+                  for start in range(0, len(indices), batch_size)]
+        
+        prompts = [self.build_batch_prompt([pairs[i][:2] for i in chunk], noise_type)
+                   for noise_type, chunk in chunks]
+        scheduled = self.scheduler.run(prompts, lambda p: self.query_model_full(p, format="json"))
+        
+        validations = [None] * len(pairs)
+        for (noise_type, chunk), payload in zip(chunks, scheduled["responses"]):
+            verdicts = self.parse_batch_response(payload.get("response", ""), len(chunk), noise_type)
+            for i, verdict in zip(chunk, verdicts):
+                validations[i] = verdict
+        
+        failed = [i for i, v in enumerate(validations) if v is None]
+        self.batch_stats = {
+            "pairs": len(pairs),
+            "batched_calls": len(chunks),
+            "fallback_calls": len(failed)
+        }
+        print(f"🧮 Critic batching: {len(pairs)} pairs in {len(chunks)} batched calls, "
+              f"{len(failed)} single-pair fallbacks")
+        
+        batched = [v is not None for v in validations]
+        return self._evaluate_single(pairs, failed, validations), batched
+    
+    def _evaluate_single(self, pairs: List[Tuple[str, str, str]], indices: List[int],
+                         validations: List[Dict]) -> List[Dict]:
+        """Fill validations[i] for each index with one scheduled critic call per pair"""
+        if indices:
+            prompts = [self.build_evaluation_prompt(*pairs[i]) for i in indices]
+            scheduled = self.scheduler.run(prompts, self.query_model_full)
+            self.cache_stats = scheduled["stats"]
+            print_cache_report(self.cache_stats)
+            for i, payload in zip(indices, scheduled["responses"]):
+                validations[i] = self.parse_critic_response(payload.get("response", ""), pairs[i][2])
+        return validations
+    
+    def full_response(self, result: Dict, role: str) -> str:
+        """
+        The first run's full response for role ("baseline"/"noisy") from the
+        blob store, or the stored sample preview when it cannot be resolved
+        """
+        ids = result.get(f"{role}_response_ids") or []
+        if ids and ids[0] and self.blob_store is not None and ids[0] in self.blob_store:
+            return self.blob_store.get(ids[0])
+        return result.get(f"sample_{role}_response", "")
+    
+    def validate_chaos_measurements(self, experiment_results: Dict, batch_size: int = DEFAULT_BATCH_SIZE,
+                                    cascade=None) -> Dict:
         """
         Validate all experimental results using LLM critic
+        
+        Pass a CriticCascade to resolve easy pairs locally and send only the
+        uncertain ones to the critic model.
         """
         validation_results = {}
         
+        # Collect every evaluable pair up front so they can be batched and scheduled
+        jobs = []
         for noise_type, results in experiment_results.items():
-            validations = []
-            
+            if noise_type not in self.evaluation_prompts:
+                continue
             for result in results:
-                baseline_resp = result.get('sample_baseline_response', '')
-                noisy_resp = result.get('sample_noisy_response', '')
+                baseline_resp = self.full_response(result, 'baseline')
+                noisy_resp = self.full_response(result, 'noisy')
                 
                 if baseline_resp and noisy_resp:
-                    validation = self.evaluate_response_pair(
-                        baseline_resp, noisy_resp, noise_type
-                    )
-                    
-                    # Compare with mathematical metrics
-                    validation['mathematical_divergence'] = result.get('mean_divergence', 0)
-                    validation['agrees_with_math'] = self.check_agreement(
-                        validation, result
-                    )
-                    
-                    validations.append(validation)
+                    jobs.append((noise_type, result, (baseline_resp, noisy_resp, noise_type)))
+        
+        pairs = [pair for _, _, pair in jobs]
+        if cascade is not None:
+            verdicts = cascade.evaluate(pairs, batch_size)
+        else:
+            verdicts = self.evaluate_pairs(pairs, batch_size)
+        
+        validations_by_type = {noise_type: [] for noise_type in experiment_results}
+        for (noise_type, result, _), validation in zip(jobs, verdicts):
+            # Compare with mathematical metrics
+            validation['mathematical_divergence'] = result.get('mean_divergence', 0)
+            validation['agrees_with_math'] = self.check_agreement(
+                validation, result
+            )
             
+            validations_by_type[noise_type].append(validation)
+        
+        for noise_type, validations in validations_by_type.items():
             validation_results[noise_type] = {
                 'validations': validations,
                 'agreement_rate': self.calculate_agreement_rate(validations),
@@ -131,15 +433,119 @@ class ChaosCritic:
         
         return llm_says_different == math_says_different
     
-    def meta_critique(self, validation_results: Dict) -> str:
+    def calculate_agreement_rate(self, validations: List[Dict]) -> float:
+        """Fraction of validations where the critic agrees with the math"""
+        if not validations:
+            return 0.0
+        return sum(1 for v in validations if v.get('agrees_with_math')) / len(validations)
+    
+    def check_pattern_confirmation(self, validations: List[Dict]) -> bool:
+        """A pattern is confirmed when most critic verdicts see the predicted shift"""
+        if not validations:
+            return False
+        confirmed = sum(1 for v in validations if v.get('classification') in ['YES', 'BIFURCATED', 'PARTIAL'])
+        return confirmed / len(validations) > 0.5
+    
+    def compact_validations(self, validation_results: Dict) -> List[str]:
+        """
+        One dense line per validation (plus a header per noise type) instead
+        of indented JSON, so the critic's context goes on content, not whitespace
+        """
+        lines = []
+        for noise_type, result in validation_results.items():
+            lines.append(f"## {noise_type}: agreement={result.get('agreement_rate', 0):.2f} "
+                         f"confirmed={'Y' if result.get('pattern_confirmed') else 'N'}")
+            for v in result.get('validations', []):
+                reasoning = " ".join(str(v.get('reasoning', '')).split())[:120]
+                lines.append(f"{noise_type}|{v.get('classification', '?')}|"
+                             f"div={v.get('mathematical_divergence', 0):.2f}|"
+                             f"agree={'Y' if v.get('agrees_with_math') else 'N'}|{reasoning}")
+        return lines
+    
+    def chunk_lines(self, lines: List[str], token_budget: int) -> List[str]:
+        """Greedily pack lines into chunks that each fit the token budget"""
+        chunks, current, used = [], [], 0
+        for line in lines:
+            cost = estimate_tokens(line)
+            if current and used + cost > token_budget:
+                chunks.append("\n".join(current))
+                current, used = [], 0
+            current.append(line)
+            used += cost
+        if current:
+            chunks.append("\n".join(current))
+        return chunks
+    
+    def fit_to_budget(self, notes: List[str], token_budget: int, min_share: int = 40) -> str:
+        """
+        Join notes into one text within token_budget: each keeps an equal
+        share of the budget (its head), and when shares would drop below
+        min_share tokens an evenly spaced sample of the notes is kept instead
+        """
+        keep = max(1, min(len(notes), token_budget // min_share))
+        picked = [notes[round(i * (len(notes) - 1) / max(keep - 1, 1))] for i in range(keep)] \
+            if keep < len(notes) else notes
+        # estimate_tokens counts len // 4 + 1; one more char per note for the newline
+        chars = max(0, (token_budget // len(picked) - 1) * 4 - 1)
+        return "\n".join(note[:chars] for note in picked)
+    
+    def _run_stage(self, name: str, prompts: List[str], usage: List[Dict]) -> List[str]:
+        """Run one map/reduce stage in parallel and record its token usage"""
+        scheduled = self.scheduler.run(prompts, self.query_model_full)
+        payloads = scheduled["responses"]
+        usage.append({
+            "stage": name,
+            "calls": len(prompts),
+            "prompt_tokens": sum(p.get("prompt_eval_count", 0) for p in payloads),
+            "completion_tokens": sum(p.get("eval_count", 0) for p in payloads)
+        })
+        return [p.get("response", "").strip() for p in payloads]
+    
+    def meta_critique(self, validation_results: Dict, chunk_tokens: int = 1200,
+                      max_stages: int = 6) -> str:
         """
         Generate a meta-analysis of the validation results
+        
+        Validations are compacted into token-budgeted chunks and summarised
+        in parallel (map), the summaries are merged until they fit one budget
+        (reduce), and the final assessment is written from the merged notes.
+        Validations that already fit one chunk go straight to the final call.
+        Reduction stops after max_stages, or as soon as a stage no longer
+        cuts the number of chunks, and the remaining notes are cut down to
+        one budget (fit_to_budget).
+        Per-stage token usage is kept in self.meta_critique_usage.
         """
+        usage = []
+        notes = self.chunk_lines(self.compact_validations(validation_results), chunk_tokens)
+        
+        stage = 0
+        while len(notes) > 1 and stage < max_stages:
+            stage += 1
+            name = "map" if stage == 1 else f"reduce-{stage - 1}"
+            instruction = ("Summarise these chaos-experiment critic validations "
+                           "(format: noise_type|verdict|math divergence|agrees with math|reason). "
+                           if stage == 1 else
+                           "Merge these partial summaries of chaos-experiment validations. ")
+            prompts = [
+                instruction + "Keep per-noise-type agreement, confirmed patterns and anything "
+                "surprising. Answer in at most 5 short bullets.\n\n" + chunk
+                for chunk in notes
+            ]
+            summaries = self._run_stage(name, prompts, usage)
+            merged = self.chunk_lines(summaries, chunk_tokens)
+            if len(merged) >= len(notes):
+                # Summaries are not shrinking; another stage would just repeat the calls
+                notes = summaries
+                break
+            notes = merged
+        if len(notes) > 1:
+            notes = [self.fit_to_budget(notes, chunk_tokens)]
+        
         critique_prompt = f"""
         As a scientific reviewer, analyze these validation results for a chaos theory
         experiment on AI responses:
         
-        {json.dumps(validation_results, indent=2)}
+        {notes[0] if notes else "(no validations)"}
         
         Consider:
         1. Do the LLM evaluations support the mathematical metrics?
@@ -150,4 +556,11 @@ class ChaosCritic:
         Provide a brief scientific assessment.
         """
         
-        return self.query_model(critique_prompt)
+        critique = self._run_stage("final", [critique_prompt], usage)[0]
+        
+        self.meta_critique_usage = usage
+        for entry in usage:
+            print(f"🧾 {entry['stage']:10} {entry['calls']:3d} calls, "
+                  f"{entry['prompt_tokens']} prompt + {entry['completion_tokens']} completion tokens")
+        
+        return critique
@@ -5,37 +5,76 @@ Based on "The Butterfly Effect in AI" paper concepts
 """
 
 import json
-import requests
+import os
 import numpy as np
-from typing import List, Dict, Tuple, Optional
-import time
+from typing import Callable, Iterable, List, Dict, Tuple, Optional
 from datetime import datetime
 import hashlib
 from difflib import SequenceMatcher
-import re
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from chaos_stats import ResamplingEngine
+from set_divergence import SetDivergence, pairwise_distance_matrix
+from results_store import ResultsStore, comparison_records
+from records import GenerationRecord, RecordBatch
+from blob_store import BlobStore
+from ollama_client import DEFAULT_OLLAMA_URL, generate
+from concurrency_controller import AIMDController, shared_controller
+from streaming_stats import AggregateSet
+from token_corpus import TokenCorpus
+from tfidf_divergence import TfidfCosine
+
+# Text divergences calculate_divergence can report; edit distance is always
+# computed because the proxy Lyapunov exponent is defined on it
+DIVERGENCE_METRICS = ("edit_distance", "tfidf_cosine")
 
 class ChaosExperiment:
-    def __init__(self, model_name: str = "phi3:mini", ollama_url: str = "http://localhost:11434"):
+    def __init__(self, model_name: str = "phi3:mini", ollama_url: str = DEFAULT_OLLAMA_URL,
+                 store: Optional[ResultsStore] = None, blob_store: Optional[BlobStore] = None,
+                 controller: Optional[AIMDController] = None,
+                 stats_engine: Optional[ResamplingEngine] = None, output_dir: str = ".",
+                 divergence_metrics: Iterable[str] = ("edit_distance",)):
         self.model_name = model_name
         self.ollama_url = ollama_url
+        self.controller = controller or shared_controller(ollama_url)
         self.results = defaultdict(list)
+        # Optional columnar store; records are buffered and flushed per noise type
+        self.store = store
+        self.run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.pending_records = self._new_record_batches()
+        # Full response texts live in the blob store; results reference them by id
+        self.blob_store = blob_store
+        self.stats_engine = stats_engine or ResamplingEngine()
+        # Where the per-model results/summary JSON files are written
+        self.output_dir = output_dir
+        self.set_divergence = SetDivergence()
+        # Streaming per-(model, noise type, metric) moments and quantile
+        # sketches, updated as records arrive and stored in the run catalog
+        self.aggregates = AggregateSet()
+        # Every response is tokenized once, when it arrives; word-level
+        # metrics then read token-id arrays instead of re-splitting text
+        self.corpus = TokenCorpus()
+        unknown = set(divergence_metrics) - set(DIVERGENCE_METRICS)
+        if unknown:
+            raise ValueError(f"Unknown divergence metrics {sorted(unknown)}; choose from {DIVERGENCE_METRICS}")
+        self.divergence_metrics = tuple(divergence_metrics)
+        # Hashed n-gram TF-IDF over the same corpus. Comparisons are scored
+        # in one pass once every response is in (score_tfidf), so all pairs
+        # share the IDF of the whole sweep
+        self.tfidf = TfidfCosine(self.corpus)
+        self.pending_tfidf = []
         
     def query_ollama(self, prompt: str, temperature: float = 0.7) -> str:
         """Query Ollama API and return response"""
         try:
-            response = requests.post(
-                f"{self.ollama_url}/api/generate",
-                json={
-                    "model": self.model_name,
-                    "prompt": prompt,
-                    "temperature": temperature,
-                    "stream": False
-                },
-                timeout=30
+            # The controller paces requests and backs off when the server struggles
+            payload = self.controller.call(
+                generate, prompt, self.model_name,
+                ollama_url=self.ollama_url, temperature=temperature,
+                priority="batch", job=f"sweep-{self.run_id}"
             )
-            response.raise_for_status()
-            return response.json()["response"]
+            return payload["response"]
         except Exception as e:
             print(f"Error querying Ollama: {e}")
             return ""
@@ -46,19 +85,18 @@ class ChaosExperiment:
     
     def extract_features(self, response: str) -> Dict[str, float]:
         """Extract features from a response for comparison"""
-        features = {
-            "length": len(response),
-            "word_count": len(response.split()),
-            "sentence_count": len(re.split(r'[.!?]+', response)),
-            "avg_word_length": np.mean([len(w) for w in response.split()]) if response else 0,
-            "complexity_score": len(set(response.split())) / len(response.split()) if response else 0,  # Vocabulary diversity
-            "punctuation_ratio": sum(1 for c in response if c in '.,!?;:') / len(response) if response else 0,
-            "uppercase_ratio": sum(1 for c in response if c.isupper()) / len(response) if response else 0,
-        }
-        return features
+        # add() returns the existing document for a response already ingested
+        return self.corpus.features(self.corpus.add(response))
     
-    def calculate_divergence(self, response1: str, response2: str) -> Dict[str, float]:
-        """Calculate various divergence metrics between two responses"""
+    def calculate_divergence(self, response1: str, response2: str,
+                             metrics: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """
+        Calculate various divergence metrics between two responses.
+        tfidf_cosine here is weighted by the IDF of the responses seen so
+        far; sweeps score it with score_tfidf once every response is in.
+        """
+        metrics = self.divergence_metrics if metrics is None else tuple(metrics)
+        
         # Text similarity
         edit_distance = self.calculate_edit_distance(response1, response2)
         
@@ -76,12 +114,16 @@ class ChaosExperiment:
         # For identical prompts, we use a small epsilon to avoid division by zero
         proxy_lyapunov = np.log(edit_distance + 0.001) / np.log(0.001)
         
-        return {
+        divergence = {
             "edit_distance": edit_distance,
             "proxy_lyapunov": proxy_lyapunov,
             "feature_divergence": feature_divergence,
             "mean_feature_divergence": np.mean(list(feature_divergence.values()))
         }
+        if "tfidf_cosine" in metrics:
+            # Lexical n-gram overlap: 1 - cosine of the hashed TF-IDF vectors
+            divergence["tfidf_cosine"] = self.tfidf.divergence(response1, response2)
+        return divergence
     
     def run_single_experiment(self, baseline_prompt: str, noisy_prompt: str, 
                             noise_type: str, num_runs: int = 3) -> Dict:
@@ -90,38 +132,41 @@ class ChaosExperiment:
         print(f"Baseline: '{baseline_prompt}'")
         print(f"Noisy: '{noisy_prompt}'")
         
-        baseline_responses = []
-        noisy_responses = []
-        
-        # Generate multiple responses for statistical validity
-        for i in range(num_runs):
-            print(f"  Run {i+1}/{num_runs}...", end="", flush=True)
-            baseline_responses.append(self.query_ollama(baseline_prompt))
-            noisy_responses.append(self.query_ollama(noisy_prompt))
-            print(" ✓")
-            time.sleep(0.5)  # Be nice to the API
+        # Generate multiple responses for statistical validity; the shared
+        # controller decides how many of them are actually in flight
+        print(f"  Generating {num_runs} runs (window {self.controller.window:.1f})...", end="", flush=True)
+        with ThreadPoolExecutor(max_workers=int(self.controller.max_window)) as pool:
+            baseline_futures = [pool.submit(self.query_ollama, baseline_prompt) for _ in range(num_runs)]
+            noisy_futures = [pool.submit(self.query_ollama, noisy_prompt) for _ in range(num_runs)]
+            baseline_responses = [f.result() for f in baseline_futures]
+            noisy_responses = [f.result() for f in noisy_futures]
+        self.corpus.add_many(baseline_responses + noisy_responses)
+        print(f" ✓ ({self.controller.throughput():.2f} req/s)")
         
-        # Calculate divergences
+        # Calculate divergences; TF-IDF waits for the sweep's full IDF
+        per_pair = tuple(m for m in self.divergence_metrics if m != "tfidf_cosine")
         divergences = []
         for br, nr in zip(baseline_responses, noisy_responses):
             if br and nr:  # Only if both responses are valid
-                div = self.calculate_divergence(br, nr)
+                div = self.calculate_divergence(br, nr, metrics=per_pair)
                 divergences.append(div)
         
+        # One distance matrix over every valid response serves both the
+        # attractor basin stability and the set-level divergence tests
+        valid_baseline = [r for r in baseline_responses if r]
+        valid_noisy = [r for r in noisy_responses if r]
+        n_b = len(valid_baseline)
+        distances = pairwise_distance_matrix(valid_baseline + valid_noisy, self.calculate_edit_distance)
+        
         # Calculate attractor basin stability (variance within same prompt type)
-        baseline_stability = []
-        noisy_stability = []
-        
-        for i in range(len(baseline_responses)):
-            for j in range(i+1, len(baseline_responses)):
-                if baseline_responses[i] and baseline_responses[j]:
-                    baseline_stability.append(
-                        self.calculate_edit_distance(baseline_responses[i], baseline_responses[j])
-                    )
-                if noisy_responses[i] and noisy_responses[j]:
-                    noisy_stability.append(
-                        self.calculate_edit_distance(noisy_responses[i], noisy_responses[j])
-                    )
+        upper_b = np.triu_indices(n_b, k=1)
+        upper_n = np.triu_indices(len(valid_noisy), k=1)
+        baseline_stability = distances[:n_b, :n_b][upper_b]
+        noisy_stability = distances[n_b:, n_b:][upper_n]
+        
+        # Compare the sets as distributions, using all k² cross pairs
+        energy = self.set_divergence.test(distances, n_b, method="energy")
+        mmd = self.set_divergence.test(distances, n_b, method="mmd")
         
         result = {
             "baseline_prompt": baseline_prompt,
@@ -130,67 +175,197 @@ class ChaosExperiment:
             "divergences": divergences,
             "mean_divergence": np.mean([d["edit_distance"] for d in divergences]) if divergences else 0,
             "mean_proxy_lyapunov": np.mean([d["proxy_lyapunov"] for d in divergences]) if divergences else 0,
-            "baseline_stability": np.mean(baseline_stability) if baseline_stability else 0,
-            "noisy_stability": np.mean(noisy_stability) if noisy_stability else 0,
+            "baseline_stability": np.mean(baseline_stability) if len(baseline_stability) else 0,
+            "noisy_stability": np.mean(noisy_stability) if len(noisy_stability) else 0,
+            "energy_distance": energy["statistic"],
+            "energy_p_value": energy["p_value"],
+            "mmd": mmd["statistic"],
+            "mmd_p_value": mmd["p_value"],
             "sample_baseline_response": baseline_responses[0][:200] + "..." if baseline_responses[0] else "",
             "sample_noisy_response": noisy_responses[0][:200] + "..." if noisy_responses[0] else "",
             "timestamp": datetime.now().isoformat()
         }
+        if "tfidf_cosine" in self.divergence_metrics:
+            self.pending_tfidf.append((result, [
+                (self.corpus.add(br), self.corpus.add(nr)) for br, nr in zip(baseline_responses, noisy_responses)
+                if br and nr
+            ]))
+        
+        for div in divergences:
+            self.aggregates.update(self.model_name, noise_type, {
+                "edit_distance": div["edit_distance"],
+                "proxy_lyapunov": div["proxy_lyapunov"],
+                "mean_feature_divergence": div["mean_feature_divergence"]
+            })
+        self.aggregates.update(self.model_name, noise_type, {
+            "pair_divergence": result["mean_divergence"],
+            "pair_proxy_lyapunov": result["mean_proxy_lyapunov"],
+            "baseline_stability": result["baseline_stability"],
+            "noisy_stability": result["noisy_stability"],
+            "energy_distance": result["energy_distance"]
+        })
+        
+        baseline_ids = noisy_ids = [""] * num_runs
+        if self.blob_store is not None:
+            baseline_ids = self.blob_store.put_many(baseline_responses)
+            noisy_ids = self.blob_store.put_many(noisy_responses)
+            result["baseline_response_ids"] = baseline_ids
+            result["noisy_response_ids"] = noisy_ids
+        
+        if self.store is not None:
+            if "tfidf_cosine" not in self.divergence_metrics:
+                # Otherwise score_tfidf buffers them once the score is in
+                self.pending_records["comparison"].extend(
+                    comparison_records(result, self.model_name, self.run_id)
+                )
+            timestamp = datetime.fromisoformat(result["timestamp"]).timestamp()
+            for role, prompt, responses, ids in (("baseline", baseline_prompt, baseline_responses, baseline_ids),
+                                                 ("noisy", noisy_prompt, noisy_responses, noisy_ids)):
+                for i, (response, response_id) in enumerate(zip(responses, ids)):
+                    self.pending_records["generation"].append(GenerationRecord(
+                        self.run_id, self.model_name, noise_type, timestamp, role, prompt, i,
+                        len(response), response_id,
+                        # Inline text only when there is no blob store to hold it
+                        "" if response_id else response
+                    ))
         
         return result
     
-    def run_full_experiment(self, test_cases_file: str = "test_cases.json") -> None:
-        """Run the full experiment across all noise types"""
+    def score_tfidf(self) -> None:
+        """
+        TF-IDF divergence of every comparison not yet scored, with one IDF
+        over all responses so far and one row-wise product for all pairs
+        """
+        if not self.pending_tfidf:
+            return
+        rows = [pair for _, pairs in self.pending_tfidf for pair in pairs]
+        scores = iter(self.tfidf.paired([b for b, _ in rows], [n for _, n in rows]).tolist())
+        for result, _ in self.pending_tfidf:
+            for div in result["divergences"]:
+                div["tfidf_cosine"] = next(scores)
+                self.aggregates.update(self.model_name, result["noise_type"], {"tfidf_cosine": div["tfidf_cosine"]})
+            result["mean_tfidf_divergence"] = (np.mean([d["tfidf_cosine"] for d in result["divergences"]])
+                                               if result["divergences"] else 0)
+            if self.store is not None:
+                self.pending_records["comparison"].extend(
+                    comparison_records(result, self.model_name, self.run_id)
+                )
+        self.pending_tfidf = []
+    
+    @staticmethod
+    def _new_record_batches() -> Dict[str, RecordBatch]:
+        return {"comparison": RecordBatch("comparison"), "generation": RecordBatch("generation")}
+    
+    def flush_records(self) -> None:
+        """
+        Write buffered generation/comparison records to the results store.
+        Comparisons awaiting TF-IDF are buffered only once score_tfidf has
+        run, so call it first to include them.
+        """
+        if self.store is None:
+            return
+        for kind, records in self.pending_records.items():
+            self.store.write(kind, records)
+        self.pending_records = self._new_record_batches()
+    
+    def run_full_experiment(self, test_cases_file: str = "test_cases.json",
+                            test_cases: Optional[Dict] = None, noise_types: Optional[List[str]] = None,
+                            num_runs: int = 3, progress: Optional[Callable[[Dict], None]] = None) -> None:
+        """
+        Run the full experiment across all noise types.
+        test_cases may be passed inline instead of a file; progress is called
+        with an event dict after every prompt pair.
+        """
         # Load test cases
-        with open(test_cases_file, 'r') as f:
-            test_cases = json.load(f)
+        if test_cases is None:
+            with open(test_cases_file, 'r') as f:
+                test_cases = json.load(f)
         
         baseline_prompts = test_cases["baseline"]["prompts"]
+        selected = [name for name in test_cases
+                    if name != "baseline" and (not noise_types or name in noise_types)]
+        total = sum(min(len(baseline_prompts), len(test_cases[name]["prompts"])) for name in selected)
+        done = 0
         
         # Run experiments for each noise type
-        for noise_type, noise_data in test_cases.items():
-            if noise_type == "baseline":
-                continue
-                
-            noise_prompts = noise_data["prompts"]
+        for noise_type in selected:
+            noise_prompts = test_cases[noise_type]["prompts"]
             
             for baseline_prompt, noisy_prompt in zip(baseline_prompts, noise_prompts):
                 result = self.run_single_experiment(
-                    baseline_prompt, noisy_prompt, noise_type, num_runs=3
+                    baseline_prompt, noisy_prompt, noise_type, num_runs=num_runs
                 )
                 self.results[noise_type].append(result)
                 
                 # Save intermediate results
-                self.save_results(f"chaos_results_{self.model_name.replace(':', '_')}.json")
+                self.save_results(self.output_path("results"))
+                done += 1
+                if progress is not None:
+                    progress({"event": "pair", "noise_type": noise_type, "done": done, "total": total,
+                              "mean_divergence": float(result["mean_divergence"])})
+            
+            self.flush_records()
+        
+        if self.pending_tfidf:
+            self.score_tfidf()
+            self.save_results(self.output_path("results"))
+            self.flush_records()
         
         # Calculate summary statistics
         self.calculate_summary_stats()
     
     def calculate_summary_stats(self) -> None:
         """Calculate summary statistics across all experiments"""
+        self.score_tfidf()
         summary = {}
         
+        # Uncertainty for every noise type, computed in one batched pass
+        intervals = self.stats_engine.summarize(
+            {
+                noise_type: {
+                    "divergence": [exp["mean_divergence"] for exp in experiments],
+                    "proxy_lyapunov": [exp["mean_proxy_lyapunov"] for exp in experiments],
+                    "baseline_stability": [exp["baseline_stability"] for exp in experiments],
+                    "noisy_stability": [exp["noisy_stability"] for exp in experiments]
+                }
+                for noise_type, experiments in self.results.items()
+            },
+            paired={"attractor_shift": ("baseline_stability", "noisy_stability")}
+        )
+        
         for noise_type, experiments in self.results.items():
-            divergences = [exp["mean_divergence"] for exp in experiments]
-            lyapunovs = [exp["mean_proxy_lyapunov"] for exp in experiments]
-            baseline_stabilities = [exp["baseline_stability"] for exp in experiments]
-            noisy_stabilities = [exp["noisy_stability"] for exp in experiments]
+            # Moments and percentiles come from the streaming aggregates
+            # rather than another pass over the experiment dicts
+            stream = lambda metric: self.aggregates.get(self.model_name, noise_type, metric)
+            divergence = stream("pair_divergence").moments
+            lyapunov = stream("pair_proxy_lyapunov").moments
+            per_comparison = stream("edit_distance").summary()
             
             summary[noise_type] = {
-                "mean_divergence": np.mean(divergences),
-                "std_divergence": np.std(divergences),
-                "mean_proxy_lyapunov": np.mean(lyapunovs),
-                "std_proxy_lyapunov": np.std(lyapunovs),
-                "mean_baseline_stability": np.mean(baseline_stabilities),
-                "mean_noisy_stability": np.mean(noisy_stabilities),
-                "attractor_shift": np.mean(noisy_stabilities) - np.mean(baseline_stabilities),
+                "mean_divergence": divergence.mean,
+                "std_divergence": divergence.std,
+                "mean_proxy_lyapunov": lyapunov.mean,
+                "std_proxy_lyapunov": lyapunov.std,
+                "mean_baseline_stability": stream("baseline_stability").moments.mean,
+                "mean_noisy_stability": stream("noisy_stability").moments.mean,
+                "attractor_shift": stream("noisy_stability").moments.mean - stream("baseline_stability").moments.mean,
+                "mean_energy_distance": stream("energy_distance").moments.mean,
+                "divergence_p50": per_comparison["p50"],
+                "divergence_p95": per_comparison["p95"],
+                "divergence_p99": per_comparison["p99"],
+                "divergence_ci": list(intervals[noise_type]["divergence_ci"]),
+                "proxy_lyapunov_ci": list(intervals[noise_type]["proxy_lyapunov_ci"]),
+                "attractor_shift_ci": list(intervals[noise_type]["attractor_shift_ci"]),
+                "attractor_shift_p_value": intervals[noise_type]["attractor_shift_p_value"],
                 "num_experiments": len(experiments)
             }
+            if "tfidf_cosine" in self.divergence_metrics:
+                summary[noise_type]["mean_tfidf_divergence"] = stream("tfidf_cosine").moments.mean
         
         self.summary = summary
         
         # Save summary
-        with open(f"chaos_summary_{self.model_name.replace(':', '_')}.json", 'w') as f:
+        with open(self.output_path("summary"), 'w') as f:
             json.dump(summary, f, indent=2)
         
         # Print summary
@@ -205,11 +380,27 @@ class ChaosExperiment:
             print(f"  Baseline Stability: {stats['mean_baseline_stability']:.4f}")
             print(f"  Noisy Stability: {stats['mean_noisy_stability']:.4f}")
             print(f"  Attractor Shift: {stats['attractor_shift']:.4f}")
+            print(f"  Energy Distance: {stats['mean_energy_distance']:.4f}")
+            if "mean_tfidf_divergence" in stats:
+                print(f"  TF-IDF Divergence: {stats['mean_tfidf_divergence']:.4f}")
+            lo, hi = stats['divergence_ci']
+            print(f"  Divergence 95% CI: [{lo:.4f}, {hi:.4f}]")
+            if stats['divergence_p50'] is not None:
+                print(f"  Divergence p50/p95/p99: {stats['divergence_p50']:.4f} / "
+                      f"{stats['divergence_p95']:.4f} / {stats['divergence_p99']:.4f}")
+            lo, hi = stats['attractor_shift_ci']
+            print(f"  Attractor Shift 95% CI: [{lo:.4f}, {hi:.4f}] (p = {stats['attractor_shift_p_value']:.4f})")
+    
+    def output_path(self, kind: str) -> str:
+        """Path of the chaos_<kind>_<model>.json file for this experiment"""
+        return os.path.join(self.output_dir, f"chaos_{kind}_{self.model_name.replace(':', '_')}.json")
     
     def save_results(self, filename: str) -> None:
         """Save results to JSON file"""
+        # Called after every pair: compact json.dumps runs on the C encoder,
+        # while json.dump or indent= fall back to the pure-Python one
         with open(filename, 'w') as f:
-            json.dump(dict(self.results), f, indent=2)
+            f.write(json.dumps(dict(self.results), separators=(",", ":")))
     
     def visualize_results(self) -> None:
         """Create a simple text visualization of results"""
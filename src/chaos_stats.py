@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Resampling statistics for chaos experiment summaries
+Bootstrap confidence intervals and permutation-test p-values, computed as
+batched resample-weight matrices: every metric of the same length, across
+all groups, shares one set of draws, so 10k resamples of a whole summary
+cost a few matrix products per batch
+"""
+
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Hashable, List, Optional, Tuple
+
+# Statistics that can be evaluated along axis=1 of a resample matrix
+STATISTICS = {
+    "mean": np.mean,
+    "median": np.median,
+    "std": np.std
+}
+
+
+class ResamplingEngine:
+    """
+    Bootstrap and permutation tests with bounded memory.
+
+    Resamples are drawn in batches of rows whose working arrays stay under
+    `max_batch_bytes`, so memory is flat no matter how many resamples are
+    requested. Each batch has its own seed drawn up front, so results do
+    not depend on whether batches run in-process or fan out to a process
+    pool (used for large inputs, or whenever a long-lived executor is given).
+    """
+
+    def __init__(self, n_resamples: int = 10000, confidence: float = 0.95,
+                 seed: Optional[int] = None, max_batch_bytes: int = 64 * 1024 * 1024,
+                 workers: Optional[int] = None, parallel_threshold: int = 200000,
+                 executor: Optional[ProcessPoolExecutor] = None):
+        self.n_resamples = n_resamples
+        self.confidence = confidence
+        self.seed = seed
+        self.max_batch_bytes = max_batch_bytes
+        self.workers = workers or os.cpu_count() or 1
+        # Observations × metrics above which batches go to processes
+        self.parallel_threshold = parallel_threshold
+        # A long-lived pool (e.g. the experiment service's) skips process start-up
+        self.executor = executor
+
+    def __getstate__(self):
+        # Workers receive the engine itself; the pool stays in the parent
+        state = dict(self.__dict__)
+        state["executor"] = None
+        return state
+
+    def _batch_rows(self, n: int, bytes_per_value: int = 8) -> int:
+        """Resample rows per batch so one batch's working arrays stay under budget"""
+        return max(1, min(self.n_resamples, self.max_batch_bytes // (bytes_per_value * max(n, 1))))
+
+    def _run_batches(self, fn, values: np.ndarray, rows: int, rng: np.random.Generator,
+                     *args) -> List[np.ndarray]:
+        """fn(values, count, seed, *args) over every resample batch, in order"""
+        counts = [min(rows, self.n_resamples - start) for start in range(0, self.n_resamples, rows)]
+        seeds = rng.integers(0, 2 ** 63, size=len(counts))
+        tasks = [(fn, values, count, seed, args) for count, seed in zip(counts, seeds)]
+        if len(tasks) > 1 and self.executor is not None:
+            return list(self.executor.map(_run_batch, tasks))
+        if len(tasks) > 1 and values.size >= self.parallel_threshold and self.workers > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks))) as pool:
+                return list(pool.map(_run_batch, tasks))
+        return [_run_batch(task) for task in tasks]
+
+    # ---- bootstrap -----------------------------------------------------
+
+    def bootstrap_ci(self, values, statistic: str = "mean",
+                     rng: Optional[np.random.Generator] = None) -> Tuple[float, float]:
+        """Percentile bootstrap confidence interval of statistic(values)"""
+        return self.bootstrap_cis({"values": values}, statistic, rng)["values"]
+
+    def bootstrap_cis(self, columns: Dict[Hashable, List[float]], statistic: str = "mean",
+                      rng: Optional[np.random.Generator] = None) -> Dict[Hashable, Tuple[float, float]]:
+        """
+        Percentile bootstrap CIs for many columns at once. Columns of the
+        same length share each batch of resample draws: a (resamples × n)
+        count matrix times the (n × columns) values gives every column's
+        resampled means in one product.
+        """
+        if statistic not in STATISTICS:
+            raise ValueError(f"Unknown statistic {statistic!r}; choose from {list(STATISTICS)}")
+        rng = rng or np.random.default_rng(self.seed)
+        cis = {}
+        by_length = {}
+        for key, values in columns.items():
+            values = np.asarray(values, dtype=float)
+            if len(values) == 0:
+                cis[key] = (0.0, 0.0)
+            elif len(values) == 1:
+                cis[key] = (float(values[0]), float(values[0]))
+            else:
+                by_length.setdefault(len(values), []).append((key, values))
+
+        alpha = (1 - self.confidence) / 2
+        for n, keyed in sorted(by_length.items()):
+            values = np.column_stack([v for _, v in keyed])
+            # int32 draws, int64 flat indices, bincount and float64 counts
+            rows = self._batch_rows(n, bytes_per_value=28 if statistic != "median" else 4 + 8 * values.shape[1])
+            estimates = np.concatenate(self._run_batches(_bootstrap_batch, values, rows, rng, statistic))
+            low, high = np.quantile(estimates, [alpha, 1 - alpha], axis=0)
+            for k, (key, _) in enumerate(keyed):
+                cis[key] = (float(low[k]), float(high[k]))
+        return cis
+
+    # ---- permutation tests ---------------------------------------------
+
+    def permutation_test(self, a, b, rng: Optional[np.random.Generator] = None) -> float:
+        """
+        Two-sided p-value for a difference in means between samples a and b,
+        by shuffling group labels
+        """
+        a = np.asarray(a, dtype=float)
+        b = np.asarray(b, dtype=float)
+        if len(a) == 0 or len(b) == 0:
+            return 1.0
+
+        rng = rng or np.random.default_rng(self.seed)
+        pooled = np.concatenate([a, b])
+        observed = abs(a.mean() - b.mean())
+        # float64 keys, their argpartition and the float64 label matrix
+        rows = self._batch_rows(len(pooled), bytes_per_value=24)
+        extreme = sum(self._run_batches(_label_shuffle_batch, pooled, rows, rng, len(a), observed))
+        return (extreme + 1) / (self.n_resamples + 1)
+
+    def paired_permutation_test(self, differences,
+                                rng: Optional[np.random.Generator] = None) -> float:
+        """Two-sided sign-flip p-value that the mean paired difference is zero"""
+        return self.paired_permutation_tests({"values": differences}, rng)["values"]
+
+    def paired_permutation_tests(self, columns: Dict[Hashable, List[float]],
+                                 rng: Optional[np.random.Generator] = None) -> Dict[Hashable, float]:
+        """Sign-flip p-values for many columns; columns of the same length share the flips"""
+        rng = rng or np.random.default_rng(self.seed)
+        p_values = {}
+        by_length = {}
+        for key, values in columns.items():
+            values = np.asarray(values, dtype=float)
+            if len(values) == 0:
+                p_values[key] = 1.0
+            else:
+                by_length.setdefault(len(values), []).append((key, values))
+
+        for n, keyed in sorted(by_length.items()):
+            d = np.column_stack([v for _, v in keyed])
+            rows = self._batch_rows(n, bytes_per_value=4)
+            extreme = sum(self._run_batches(_sign_flip_batch, d, rows, rng))
+            for k, (key, _) in enumerate(keyed):
+                p_values[key] = float((extreme[k] + 1) / (self.n_resamples + 1))
+        return p_values
+
+    # ---- summaries -----------------------------------------------------
+
+    def summarize(self, groups: Dict[str, Dict[str, List[float]]],
+                  paired: Optional[Dict[str, Tuple[str, str]]] = None) -> Dict[str, Dict]:
+        """
+        Bootstrap CIs for every metric of every group, plus paired permutation
+        p-values for the (before, after) metric pairs named in `paired`.
+
+        groups: {group: {metric: values}}
+        paired: {result_name: (before_metric, after_metric)}
+        Returns {group: {"<metric>_ci": (lo, hi), "<result_name>_p_value": p}}
+
+        All groups are resampled together (common random numbers): each
+        group's interval is a valid bootstrap on its own, and the draws are
+        paid for once rather than once per group.
+        """
+        paired = paired or {}
+        rng = np.random.default_rng(self.seed)
+        columns = {}
+        differences = {}
+        for group, metrics in groups.items():
+            for metric, values in metrics.items():
+                columns[(group, metric)] = values
+            for name, (before, after) in paired.items():
+                if before in metrics and after in metrics:
+                    diffs = np.asarray(metrics[after], dtype=float) - np.asarray(metrics[before], dtype=float)
+                    columns[(group, name)] = differences[(group, name)] = diffs
+
+        summary = {group: {} for group in groups}
+        for (group, name), ci in self.bootstrap_cis(columns, rng=rng).items():
+            summary[group][f"{name}_ci"] = ci
+        for (group, name), p_value in self.paired_permutation_tests(differences, rng=rng).items():
+            summary[group][f"{name}_p_value"] = p_value
+        return summary
+
+
+# ---- batch bodies (module-level so they pickle to worker processes) ------
+
+def _run_batch(task):
+    fn, values, count, seed, args = task
+    return fn(values, count, np.random.default_rng(seed), *args)
+
+
+def _bootstrap_batch(values: np.ndarray, count: int, rng: np.random.Generator,
+                     statistic: str) -> np.ndarray:
+    """(count × columns) bootstrap estimates of statistic for the (n × columns) values"""
+    n = len(values)
+    idx = rng.integers(0, n, size=(count, n), dtype=np.int32)
+    if statistic == "median":
+        return np.median(values[idx], axis=1)
+    # counts[r, i]: how often observation i appears in resample r
+    flat = (idx + (np.arange(count, dtype=np.int64) * n)[:, None]).ravel()
+    counts = np.bincount(flat, minlength=count * n).reshape(count, n).astype(float)
+    means = counts @ values / n
+    if statistic == "std":
+        return np.sqrt(np.maximum(counts @ (values * values) / n - means * means, 0))
+    return means
+
+
+def _label_shuffle_batch(pooled: np.ndarray, count: int, rng: np.random.Generator,
+                         n_a: int, observed: float) -> int:
+    """Resamples whose label shuffle gives a mean difference at least as large as observed"""
+    n = len(pooled)
+    # The positions of the n_a smallest of n uniform keys per row are a
+    # uniformly random subset of exactly n_a observations
+    keys = rng.random((count, n))
+    chosen = np.argpartition(keys, n_a - 1, axis=1)[:, :n_a]
+    sum_a = pooled[chosen].sum(axis=1)
+    total = pooled.sum()
+    diffs = np.abs(sum_a / n_a - (total - sum_a) / (n - n_a))
+    return int(np.count_nonzero(diffs >= observed - 1e-12 * max(1.0, observed)))
+
+
+def _sign_flip_batch(d: np.ndarray, count: int, rng: np.random.Generator) -> np.ndarray:
+    """Per column: sign-flip resamples whose |mean| is at least the observed |mean|"""
+    n = len(d)
+    # One random bit per sign: flipped sum = 2 * bits·d - sum(d)
+    bits = np.unpackbits(rng.integers(0, 256, size=(count, (n + 7) // 8), dtype=np.uint8), axis=1)[:, :n]
+    flipped = np.abs(2 * (bits.astype(float) @ d) - d.sum(axis=0)) / n
+    observed = np.abs(d.mean(axis=0))
+    return np.count_nonzero(flipped >= observed - 1e-12, axis=0)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+AIMD concurrency control for Ollama requests
+Replaces fixed time.sleep() pacing: the number of in-flight requests grows
+additively while requests succeed and is cut multiplicatively on timeouts,
+5xx/429 responses or a blow-up of the server's per-token generation time
+Standard library only, so the urllib-based runners can use it too
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+
+def is_overload(error: Exception) -> bool:
+    """Timeouts and server-side (5xx / 429) errors mean the server is saturated"""
+    if isinstance(error, TimeoutError) or "Timeout" in type(error).__name__:
+        return True
+    status = getattr(getattr(error, "response", None), "status_code", None)  # requests
+    status = status or getattr(error, "code", None)                           # urllib
+    return isinstance(status, int) and (status >= 500 or status == 429)
+
+
+def token_latency(payload) -> Optional[float]:
+    """
+    Seconds per generated token from an Ollama response's own counters.
+    Unlike wall time this does not grow with answer length or with time
+    spent queued (e.g. in the job queue daemon); None when not reported.
+    """
+    if not isinstance(payload, dict):
+        return None
+    count, duration = payload.get("eval_count"), payload.get("eval_duration")
+    if not count or not duration:
+        return None
+    return duration / count / 1e9
+
+
+class AIMDController:
+    """
+    Congestion window for requests to one server.
+
+    The window grows by `increase / window` per healthy completion (about +1
+    per round of requests) and shrinks by `decrease` on overload or when the
+    per-token latency exceeds `latency_factor` × the best of the last
+    `latency_history` per-token latencies. Wall-clock latency is not a
+    signal: it scales with output length and includes queueing.
+    Callers block in slot() while the window is full.
+    """
+
+    def __init__(self, initial_window: float = 1.0, min_window: float = 1.0,
+                 max_window: float = 8.0, increase: float = 1.0, decrease: float = 0.5,
+                 latency_factor: float = 2.5, latency_history: int = 100,
+                 throughput_horizon: float = 60.0):
+        self.window = initial_window
+        self.min_window = min_window
+        self.max_window = max_window
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.throughput_horizon = throughput_horizon
+
+        self.in_flight = 0
+        self.base_latency = None
+        self.latencies = deque(maxlen=latency_history)
+        self.completions = deque()
+        self.errors = 0
+        self.overloads = 0
+        self._last_cut = 0.0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        """Hold one in-flight slot for the duration of a request"""
+        with self._cond:
+            while self.in_flight >= int(self.window):
+                self._cond.wait()
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    def record(self, duration: float, ok: bool = True, overload: bool = False,
+               latency: Optional[float] = None) -> None:
+        """
+        Feed back one completed request: its wall-clock duration and, when
+        the server reported it, its per-token latency (token_latency)
+        """
+        now = time.monotonic()
+        with self._cond:
+            if ok:
+                self.completions.append(now)
+            else:
+                self.errors += 1
+            if ok and latency is not None:
+                # Minimum over recent requests, so a model swap can re-baseline
+                self.latencies.append(latency)
+                self.base_latency = min(self.latencies)
+
+            slow = latency is not None and self.base_latency is not None \
+                and latency > self.latency_factor * self.base_latency
+            if overload or slow:
+                self.overloads += 1
+                # At most one cut per request round trip, like TCP's one cut per RTT
+                if now - self._last_cut > duration:
+                    self.window = max(self.min_window, self.window * self.decrease)
+                    self._last_cut = now
+            elif ok:
+                self.window = min(self.max_window, self.window + self.increase / self.window)
+
+            while self.completions and now - self.completions[0] > self.throughput_horizon:
+                self.completions.popleft()
+            self._cond.notify_all()
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """Run fn inside a slot, timing it and classifying any failure"""
+        with self.slot():
+            start = time.monotonic()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                self.record(time.monotonic() - start, ok=False, overload=is_overload(e))
+                raise
+            self.record(time.monotonic() - start, latency=token_latency(result))
+            return result
+
+    def throughput(self) -> float:
+        """Completed requests per second over the recent horizon"""
+        with self._cond:
+            if len(self.completions) < 2:
+                return 0.0
+            span = max(time.monotonic() - self.completions[0], 1e-6)
+            return len(self.completions) / span
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "window": round(self.window, 2),
+            "in_flight": self.in_flight,
+            "throughput_rps": round(self.throughput(), 3),
+            "base_token_latency_s": round(self.base_latency or 0.0, 4),
+            "errors": self.errors,
+            "overloads": self.overloads
+        }
+
+
+_controllers = {}
+_registry_lock = threading.Lock()
+
+
+def shared_controller(server_url: str, **kwargs) -> AIMDController:
+    """
+    One controller per server, so runners in the same process share a window.
+    Keyed by the base URL: ".../api/generate" and "..." are the same server.
+    """
+    key = server_url.split("/api/", 1)[0].rstrip("/")
+    with _registry_lock:
+        if key not in _controllers:
+            _controllers[key] = AIMDController(**kwargs)
+        return _controllers[key]
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Two-stage critic cascade
+A local scorer (edit divergence, feature deltas, marker counts) labels the
+easy pairs immediately; only pairs in its uncertain band, plus a small audit
+sample of confident ones, are escalated to the LLM critic
+"""
+
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from chaos_critic import DEFAULT_BATCH_SIZE
+from text_features import (CONNECTIVE_MARKERS, EMPATHY_MARKERS, URGENCY_MARKERS,
+                           edit_distance, marker_density, text_features)
+
+
+# ChaosExperiment's sample_*_response previews: the first 200 chars plus "..."
+PREVIEW_CHARS = 200
+
+
+def _is_preview(text: str) -> bool:
+    return len(text) == PREVIEW_CHARS + 3 and text.endswith("...")
+
+
+def _squash(x: float, scale: float) -> float:
+    """Map a signed evidence value to a (0, 1) score"""
+    return float(1.0 / (1.0 + np.exp(-x / scale)))
+
+
+class CriticCascade:
+    """
+    Resolve critic verdicts locally where possible.
+
+    score_pair() returns the probability-like score that the noisy response
+    shows the predicted shift. Scores >= `high` become YES, <= `low` become NO,
+    and everything in between goes to the LLM critic, as does any pair whose
+    texts are both truncated previews (equal lengths say nothing about the
+    full responses). `audit_rate` of the locally resolved pairs are also sent
+    to the critic to measure agreement.
+    """
+
+    def __init__(self, critic, low: float = 0.25, high: float = 0.75,
+                 audit_rate: float = 0.1, seed: Optional[int] = None):
+        self.critic = critic
+        self.low = low
+        self.high = high
+        self.audit_rate = audit_rate
+        self.rng = np.random.default_rng(seed)
+        self.stats = {}
+
+    def score_pair(self, baseline: str, noisy: str, noise_type: str) -> float:
+        """Stage-one score in (0, 1) that the predicted mode shift happened"""
+        f_base = text_features(baseline)
+        f_noisy = text_features(noisy)
+        length_ratio = np.log((f_noisy["length"] + 1) / (f_base["length"] + 1))
+
+        if noise_type == "temporal_pressure":
+            # Predicted: much shorter, stripped-down answer
+            evidence = -length_ratio + 0.3 * (marker_density(noisy, URGENCY_MARKERS)
+                                              - marker_density(baseline, URGENCY_MARKERS))
+            return _squash(evidence - 0.4, 0.25)
+
+        if noise_type == "emotional_leakage":
+            # Predicted: empathetic / therapeutic register
+            evidence = marker_density(noisy, EMPATHY_MARKERS) - marker_density(baseline, EMPATHY_MARKERS)
+            return _squash(evidence - 0.8, 0.4)
+
+        if noise_type == "orthographic_noise":
+            # Predicted: simpler vocabulary and shorter explanations
+            simpler = (f_base["avg_word_length"] - f_noisy["avg_word_length"]) \
+                + (f_base["complexity_score"] - f_noisy["complexity_score"]) * 5 \
+                - 0.5 * length_ratio
+            return _squash(simpler - 0.2, 0.2)
+
+        if noise_type == "complexity_accumulation":
+            # Predicted: longer, multi-topic "professor mode"
+            evidence = length_ratio + 0.3 * (marker_density(noisy, CONNECTIVE_MARKERS)
+                                             - marker_density(baseline, CONNECTIVE_MARKERS))
+            return _squash(evidence - 0.3, 0.25)
+
+        # Unknown prediction: fall back to raw text divergence
+        return _squash(edit_distance(baseline, noisy) - 0.3, 0.1)
+
+    def evaluate(self, pairs: List[Tuple[str, str, str]],
+                 batch_size: int = DEFAULT_BATCH_SIZE) -> List[Dict]:
+        """Verdicts for (baseline, noisy, noise_type) triples, in order"""
+        validations = [None] * len(pairs)
+        escalate, confident = [], []
+
+        for i, (baseline, noisy, noise_type) in enumerate(pairs):
+            if _is_preview(baseline) and _is_preview(noisy):
+                escalate.append(i)
+                continue
+            score = self.score_pair(baseline, noisy, noise_type)
+            if self.low < score < self.high:
+                escalate.append(i)
+                continue
+            confident.append(i)
+            validations[i] = {
+                "noise_type": noise_type,
+                "classification": "YES" if score >= self.high else "NO",
+                "reasoning": f"Resolved locally (score {score:.2f})",
+                "local_score": score,
+                "stage": "local"
+            }
+
+        audit_count = int(round(self.audit_rate * len(confident)))
+        audit = sorted(self.rng.choice(confident, size=audit_count, replace=False).tolist()) if audit_count else []
+
+        to_critic = escalate + audit
+        verdicts = self.critic.evaluate_pairs([pairs[i] for i in to_critic], batch_size) if to_critic else []
+
+        agreements = []
+        for i, verdict in zip(to_critic, verdicts):
+            if validations[i] is None:
+                verdict["stage"] = "llm"
+                validations[i] = verdict
+            else:
+                # Keep the local verdict; the audit only measures it
+                llm_different = verdict.get("classification") in ["YES", "BIFURCATED", "PARTIAL"]
+                local_different = validations[i]["classification"] == "YES"
+                validations[i]["audit_classification"] = verdict.get("classification")
+                agreements.append(llm_different == local_different)
+
+        self.stats = {
+            "pairs": len(pairs),
+            "escalated": len(escalate),
+            "escalation_rate": len(escalate) / len(pairs) if pairs else 0.0,
+            "audited": len(audit),
+            "audit_agreement": float(np.mean(agreements)) if agreements else None
+        }
+        agreement = "n/a" if self.stats["audit_agreement"] is None else f"{self.stats['audit_agreement']:.0%}"
+        print(f"🪜 Critic cascade: {self.stats['escalation_rate']:.0%} escalated to the LLM, "
+              f"audit agreement {agreement} over {len(audit)} pairs")
+        return validations
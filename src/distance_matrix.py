@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Out-of-core pairwise distance matrices
+The upper triangle of a symmetric float32 matrix is stored as square tiles
+in a memory-mapped file, filled tile by tile in worker processes and
+resumable after an interruption; rows, blocks and nearest neighbours are
+read without loading the whole matrix
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from difflib import SequenceMatcher
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+class EditDistanceBlock:
+    """
+    Picklable distance_block over a list of texts: 1 - SequenceMatcher ratio,
+    the same normalised edit distance ChaosExperiment uses. The column text
+    is set as seq2 once per column so its index is reused down the rows.
+    """
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+
+    def __call__(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        out = np.empty((len(rows), len(cols)), dtype=np.float32)
+        matcher = SequenceMatcher(None)
+        for c, j in enumerate(cols):
+            matcher.set_seq2(self.texts[j])
+            for r, i in enumerate(rows):
+                matcher.set_seq1(self.texts[i])
+                out[r, c] = 1 - matcher.ratio()
+        return out
+
+
+# Worker-process state, set once per worker by _init_worker
+_worker = {}
+
+
+def _init_worker(path: str, shape: Tuple[int, int, int], distance_block: Callable) -> None:
+    _worker["data"] = np.memmap(path, dtype=np.float32, mode="r+", shape=shape)
+    _worker["block"] = distance_block
+
+
+def _fill_tile(index: int, rows: np.ndarray, cols: np.ndarray) -> int:
+    data = _worker["data"]
+    values = _worker["block"](rows, cols)
+    if rows[0] == cols[0]:
+        # Diagonal tile: keep the i < j entries and mirror them, as
+        # pairwise_distance_matrix does (edit distance is not exactly symmetric)
+        values = np.triu(values, 1) + np.triu(values, 1).T
+    data[index, :len(rows), :len(cols)] = values
+    data.flush()
+    return index
+
+
+class TiledDistanceMatrix:
+    """
+    Symmetric n × n distance matrix on disk.
+
+    Tile (I, J) with I <= J covers rows I*t:(I+1)*t and columns J*t:(J+1)*t;
+    only those tiles are stored, so 50k responses take ~5 GB of float32
+    rather than 10 GB (or ~20 GB as float64 in RAM). A one-byte-per-tile
+    done map next to the data makes compute() resumable. The matrix supports
+    `Z @ M` (streamed tile by tile), so SetDivergence's block sums work on it
+    unchanged.
+    """
+
+    # Let numpy defer to __rmatmul__ for ndarray @ TiledDistanceMatrix
+    __array_ufunc__ = None
+
+    def __init__(self, path: str, n: Optional[int] = None, tile_size: int = 1024,
+                 ids: Optional[List[str]] = None):
+        self.path = path
+        self.meta_path = f"{path}.json"
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            if n is not None and n != meta["n"]:
+                raise ValueError(f"{path} holds a {meta['n']}-item matrix, not {n}")
+            if ids is not None and meta.get("ids") != list(ids):
+                raise ValueError(f"{path} holds distances between other responses; "
+                                 f"delete it or choose another path")
+        else:
+            if n is None:
+                raise ValueError(f"{path} does not exist; pass n to create it")
+            meta = {"n": n, "tile_size": tile_size, "ids": list(ids) if ids is not None else None}
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(self.meta_path, "w") as f:
+                json.dump(meta, f)
+
+        self.n = meta["n"]
+        self.tile_size = meta["tile_size"]
+        self.ids = meta.get("ids")
+        self.n_tile_rows = -(-self.n // self.tile_size)
+        self.n_tiles = self.n_tile_rows * (self.n_tile_rows + 1) // 2
+        self._shape = (self.n_tiles, self.tile_size, self.tile_size)
+
+        mode = "r+" if os.path.exists(path) else "w+"
+        self.data = np.memmap(path, dtype=np.float32, mode=mode, shape=self._shape)
+        done_mode = "r+" if os.path.exists(f"{path}.done") else "w+"
+        self.done = np.memmap(f"{path}.done", dtype=np.uint8, mode=done_mode, shape=(self.n_tiles,))
+
+    # ---- layout --------------------------------------------------------
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return (self.n, self.n)
+
+    def __len__(self) -> int:
+        return self.n
+
+    def tile_index(self, I: int, J: int) -> int:
+        """Position of upper-triangle tile (I, J), I <= J, in the file"""
+        return I * self.n_tile_rows - I * (I - 1) // 2 + (J - I)
+
+    @property
+    def fingerprint(self) -> str:
+        """Short hash of the size, tiling and item ids, for naming derived files"""
+        key = json.dumps([self.n, self.tile_size, self.ids])
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()[:12]
+
+    def span(self, I: int) -> np.ndarray:
+        return np.arange(I * self.tile_size, min((I + 1) * self.tile_size, self.n))
+
+    def tiles(self) -> Iterator[Tuple[int, int, int]]:
+        for I in range(self.n_tile_rows):
+            for J in range(I, self.n_tile_rows):
+                yield self.tile_index(I, J), I, J
+
+    def tile(self, I: int, J: int) -> np.ndarray:
+        """Tile (I, J) of the full matrix, trimmed to the real rows/columns"""
+        if I > J:
+            return self.tile(J, I).T
+        return self.data[self.tile_index(I, J), :len(self.span(I)), :len(self.span(J))]
+
+    # ---- computation ---------------------------------------------------
+
+    @property
+    def complete(self) -> bool:
+        return bool(self.done.all())
+
+    def compute(self, distance_block: Callable[[np.ndarray, np.ndarray], np.ndarray],
+                workers: Optional[int] = None, progress_every: float = 10.0) -> int:
+        """
+        Fill every tile not yet marked done; returns how many were computed.
+
+        distance_block(rows, cols) returns the distances between the items at
+        those indices (EditDistanceBlock for texts). It must be picklable when
+        workers > 1. A tile is marked done only after its data is flushed, so
+        an interrupted run picks up where it stopped.
+        """
+        pending = [(index, self.span(I), self.span(J)) for index, I, J in self.tiles()
+                   if not self.done[index]]
+        if not pending:
+            return 0
+        workers = workers or os.cpu_count() or 1
+        start = last_report = time.time()
+
+        def mark(index: int, finished: int) -> None:
+            nonlocal last_report
+            self.done[index] = 1
+            self.done.flush()
+            if time.time() - last_report >= progress_every:
+                last_report = time.time()
+                remaining = (len(pending) - finished) * (last_report - start) / finished
+                print(f"  {finished}/{len(pending)} tiles, ~{remaining:.0f}s left")
+
+        if workers == 1:
+            _init_worker(self.path, self._shape, distance_block)
+            for finished, task in enumerate(pending, 1):
+                mark(_fill_tile(*task), finished)
+        else:
+            self.data.flush()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(self.path, self._shape, distance_block)) as pool:
+                futures = [pool.submit(_fill_tile, *task) for task in pending]
+                for finished, future in enumerate(as_completed(futures), 1):
+                    mark(future.result(), finished)
+        return len(pending)
+
+    # ---- queries -------------------------------------------------------
+
+    def block(self, rows, cols) -> np.ndarray:
+        """Distances between the items at `rows` and at `cols` (a distance_block)"""
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        out = np.empty((len(rows), len(cols)), dtype=np.float32)
+        row_tiles = rows // self.tile_size
+        col_tiles = cols // self.tile_size
+        for I in np.unique(row_tiles):
+            row_mask = row_tiles == I
+            for J in np.unique(col_tiles):
+                col_mask = col_tiles == J
+                tile = self.tile(int(I), int(J))
+                out[np.ix_(row_mask, col_mask)] = tile[np.ix_(rows[row_mask] - I * self.tile_size,
+                                                              cols[col_mask] - J * self.tile_size)]
+        return out
+
+    def row(self, i: int) -> np.ndarray:
+        return self.block([i], np.arange(self.n))[0]
+
+    def column(self, j: int) -> np.ndarray:
+        return self.row(j)
+
+    def top_k(self, i: int, k: int = 10, largest: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """The k nearest (or farthest) items to item i, excluding itself: (indices, distances)"""
+        distances = self.row(i).astype(float)
+        distances[i] = -np.inf if largest else np.inf
+        k = min(k, self.n - 1)
+        keyed = -distances if largest else distances
+        nearest = np.argpartition(keyed, k - 1)[:k] if k > 0 else np.array([], dtype=int)
+        nearest = nearest[np.argsort(keyed[nearest], kind="stable")]
+        return nearest, distances[nearest]
+
+    def __rmatmul__(self, Z) -> np.ndarray:
+        """Z @ M for Z of shape (n,) or (B, n), one tile in memory at a time"""
+        Z = np.asarray(Z, dtype=float)
+        vector = Z.ndim == 1
+        Z = np.atleast_2d(Z)
+        out = np.zeros((len(Z), self.n))
+        for _, I, J in self.tiles():
+            rows, cols = self.span(I), self.span(J)
+            tile = self.tile(I, J).astype(float)
+            out[:, cols] += Z[:, rows] @ tile
+            if I != J:
+                out[:, rows] += Z[:, cols] @ tile.T
+        return out[0] if vector else out
+
+    def __matmul__(self, Z) -> np.ndarray:
+        # M is symmetric, so M @ Z = (Zᵀ @ M)ᵀ
+        return self.__rmatmul__(np.asarray(Z).T).T
+
+    def off_diagonal_moments(self) -> Dict[str, float]:
+        """Count, mean and variance of the distinct off-diagonal entries"""
+        count, total, total_sq = 0, 0.0, 0.0
+        for _, I, J in self.tiles():
+            tile = self.tile(I, J).astype(float)
+            if I == J:
+                tile = tile[np.triu_indices(len(tile), k=1)]
+            count += tile.size
+            total += tile.sum()
+            total_sq += (tile ** 2).sum()
+        mean = total / count if count else 0.0
+        return {"count": count, "mean": mean, "variance": max(total_sq / count - mean ** 2, 0.0) if count else 0.0}
+
+    def sample(self, size: int = 100000, seed: Optional[int] = 0) -> np.ndarray:
+        """Random off-diagonal entries, e.g. for a median bandwidth"""
+        rng = np.random.default_rng(seed)
+        i = rng.integers(0, self.n, size)
+        j = rng.integers(0, self.n, size)
+        keep = i != j
+        i, j = np.minimum(i[keep], j[keep]), np.maximum(i[keep], j[keep])
+        I, J = i // self.tile_size, j // self.tile_size
+        index = I * self.n_tile_rows - I * (I - 1) // 2 + (J - I)
+        order = np.argsort(index, kind="stable")  # read tile by tile
+        return np.asarray(self.data[index[order], i[order] % self.tile_size, j[order] % self.tile_size])
+
+    def map(self, fn: Callable[[np.ndarray], np.ndarray], path: str) -> "TiledDistanceMatrix":
+        """
+        New matrix at path with fn applied elementwise (e.g. a kernel).
+
+        Only tiles computed here are mapped and marked done, so calling map
+        again after compute() has filled more of this matrix catches up.
+        """
+        result = TiledDistanceMatrix(path, self.n, self.tile_size, self.ids)
+        for index, _, _ in self.tiles():
+            if self.done[index] and not result.done[index]:
+                result.data[index] = fn(self.data[index].astype(float))
+                result.done[index] = 1
+        result.data.flush()
+        result.done.flush()
+        return result
+
+    def to_array(self) -> np.ndarray:
+        """The full matrix in memory; only for matrices that fit"""
+        everything = np.arange(self.n)
+        return self.block(everything, everything)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Out-of-core response distance matrices")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="compute (or resume) the matrix over a results file's responses")
+    build.add_argument("path", help="matrix file, e.g. ../results/distances/latest.f32")
+    build.add_argument("--results", help="results file (default: latest in the catalog)")
+    build.add_argument("--results-dir", default="../results")
+    build.add_argument("--tile-size", type=int, default=1024)
+    build.add_argument("--workers", type=int, default=None)
+    build.add_argument("--metric", choices=["edit", "tfidf"], default="edit",
+                       help="normalised edit distance or hashed n-gram TF-IDF cosine divergence")
+
+    neighbors = sub.add_parser("neighbors", help="nearest responses to one response")
+    neighbors.add_argument("path")
+    neighbors.add_argument("index", type=int)
+    neighbors.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        from blob_store import BlobStore, blob_id
+        from phase_space import collect_responses
+        from run_catalog import resolve_latest
+
+        results_path = args.results or resolve_latest("results", args.results_dir)
+        with open(results_path) as f:
+            results = json.load(f)
+        blob_dir = os.path.join(args.results_dir, "blobs")
+        blob_store = BlobStore(blob_dir) if os.path.isdir(blob_dir) else None
+        texts = [text for pair in collect_responses(results, blob_store)
+                 for role in ("baseline", "noisy") for text in pair[role]]
+        matrix = TiledDistanceMatrix(args.path, len(texts), args.tile_size, [blob_id(t) for t in texts])
+        print(f"📐 {len(texts)} responses, {matrix.n_tiles} tiles ({int(matrix.done.sum())} already done)")
+        if args.metric == "tfidf":
+            from tfidf_divergence import TfidfCosine
+            distance_block = TfidfCosine()
+            distance_block.fit(texts)
+            distance_block.matrix  # weighted once here rather than in every worker
+        else:
+            distance_block = EditDistanceBlock(texts)
+        computed = matrix.compute(distance_block, workers=args.workers)
+        print(f"✅ Computed {computed} tiles into {args.path}")
+    else:
+        matrix = TiledDistanceMatrix(args.path)
+        if not matrix.complete:
+            print("⚠️  Matrix is only partially computed; missing tiles read as 0")
+        for j, distance in zip(*matrix.top_k(args.index, args.k)):
+            print(f"  {j:8d}  {distance:.4f}  {matrix.ids[j] if matrix.ids else ''}")
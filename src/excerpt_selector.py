@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Salient-excerpt selection for critic prompts
+Instead of the first N characters, keep the sentence windows of each
+response that differ most from the other response or carry the most mode
+markers, within a token budget
+"""
+
+import re
+from typing import List, Set, Tuple
+
+from text_features import ALL_MARKERS, estimate_tokens, marker_density
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+|\n+')
+
+
+def shingles(text: str, n: int = 2) -> Set[Tuple[str, ...]]:
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    return {tuple(words[i:i + n]) for i in range(max(len(words) - n + 1, 0))}
+
+
+class ExcerptSelector:
+    """
+    Pick the most informative windows of a response under a token budget.
+
+    A window is `window_sentences` consecutive sentences. Its score is the
+    share of its word bigrams absent from the other response (where the two
+    responses diverge) plus a weighted marker density (where a mode shift
+    shows). Windows are taken greedily by score and emitted in their
+    original order, joined with an ellipsis.
+    """
+
+    def __init__(self, token_budget: int = 96, window_sentences: int = 2,
+                 marker_weight: float = 0.1):
+        self.token_budget = token_budget
+        self.window_sentences = window_sentences
+        self.marker_weight = marker_weight
+
+    def windows(self, text: str) -> List[str]:
+        sentences = [s.strip() for s in SENTENCE_SPLIT.split(text) if s.strip()]
+        step = self.window_sentences
+        return [" ".join(sentences[i:i + step]) for i in range(0, len(sentences), step)]
+
+    def score(self, window: str, other: Set[Tuple[str, ...]]) -> float:
+        own = shingles(window)
+        novelty = len(own - other) / len(own) if own else 0.0
+        return novelty + self.marker_weight * marker_density(window, ALL_MARKERS)
+
+    def select(self, text: str, other_text: str = "", token_budget: int = None) -> str:
+        """Excerpt of text that contrasts most with other_text"""
+        budget = token_budget or self.token_budget
+        text = " ".join(text.split("\n\n"))
+        if estimate_tokens(text) <= budget:
+            return text
+
+        windows = self.windows(text)
+        other = shingles(other_text)
+        ranked = sorted(range(len(windows)), key=lambda i: self.score(windows[i], other), reverse=True)
+
+        chosen, used = [], 0
+        for i in ranked:
+            cost = estimate_tokens(windows[i])
+            if used + cost > budget:
+                continue
+            chosen.append(i)
+            used += cost
+
+        if not chosen:
+            # Every window is over budget on its own: trim the best one
+            best = windows[ranked[0]]
+            return best[:budget * 4].rsplit(" ", 1)[0] + "..."
+
+        # Mark every gap (including a skipped preamble or tail) with an ellipsis
+        parts, previous = [], -1
+        for i in sorted(chosen):
+            if i != previous + 1:
+                parts.append("...")
+            parts.append(windows[i])
+            previous = i
+        if previous < len(windows) - 1:
+            parts.append("...")
+        return " ".join(parts)
+
+    def select_pair(self, baseline: str, noisy: str, token_budget: int = None) -> Tuple[str, str]:
+        """Contrasting excerpts of both responses of a pair"""
+        return (self.select(baseline, noisy, token_budget),
+                self.select(noisy, baseline, token_budget))
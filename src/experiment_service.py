@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Long-running local experiment service
+Accepts sweep specs over HTTP and runs them against warm state: numpy and
+the analysis modules are imported once, and Ollama pacing, the blob and
+results stores and the resampling process pool stay alive between runs, so
+submitting a small sweep costs an HTTP round trip instead of a cold start
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import traceback
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from blob_store import BlobStore
+from chaos_experiment import DIVERGENCE_METRICS, ChaosExperiment
+from chaos_stats import ResamplingEngine
+from ollama_client import DEFAULT_OLLAMA_URL
+from results_store import ResultsStore
+from run_catalog import RunCatalog
+
+DEFAULT_PORT = 11436
+DEFAULT_TEST_CASES = os.path.join(os.path.dirname(__file__), "..", "experiments", "test_cases.json")
+# Spec field -> accepted JSON types
+SPEC_FIELDS = {"model": str, "name": str, "num_runs": int, "noise_types": list,
+               "metrics": list, "test_cases": (dict, str)}
+
+
+class RunCancelled(Exception):
+    pass
+
+
+class ServiceRun:
+    """
+    One submitted sweep: its spec, state and an append-only event log that
+    /runs/<id>/events streams to any number of watchers.
+    """
+
+    def __init__(self, run_id: str, spec: Dict):
+        self.run_id = run_id
+        self.spec = spec
+        self.state = "queued"
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.events = []
+        self.summary = None
+        self.files = {}
+        self.error = None
+        self.cancel_requested = False
+        self._cond = threading.Condition()
+
+    def emit(self, event: Dict) -> None:
+        event = dict(event, run_id=self.run_id, at=round(time.time(), 3))
+        with self._cond:
+            self.events.append(event)
+            self._cond.notify_all()
+        if self.cancel_requested and self.state == "running":
+            raise RunCancelled()
+
+    def finish(self, state: str, **fields) -> None:
+        self.finished_at = time.time()
+        self.state = state
+        self.emit(dict(fields, event=state))
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("complete", "failed", "cancelled")
+
+    def events_after(self, index: int, timeout: float = 15.0) -> List[Dict]:
+        """Events from index on, waiting up to timeout for new ones"""
+        with self._cond:
+            if index >= len(self.events) and not self.finished:
+                self._cond.wait(timeout)
+            return self.events[index:]
+
+    def status(self) -> Dict:
+        progress = next((e for e in reversed(self.events) if e.get("event") == "pair"), {})
+        return {
+            "run_id": self.run_id,
+            "state": self.state,
+            "spec": self.spec,
+            "done": progress.get("done", 0),
+            "total": progress.get("total"),
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "files": self.files,
+            "error": self.error
+        }
+
+
+class ExperimentService:
+    """
+    Warm worker state plus a run queue.
+
+    A spec is a JSON object:
+        {"model": "phi3:mini", "num_runs": 3,
+         "noise_types": ["emotional_leakage"],            # optional filter
+         "metrics": ["edit_distance", "tfidf_cosine"],    # optional
+         "test_cases": {...} or "path/to/test_cases.json"}  # optional
+    Runs execute `concurrent_runs` at a time; Ollama pacing is shared
+    through the per-server AIMD controller either way.
+    """
+
+    def __init__(self, results_dir: str = "../results", ollama_url: str = DEFAULT_OLLAMA_URL,
+                 concurrent_runs: int = 1, analysis_workers: Optional[int] = None):
+        self.results_dir = results_dir
+        self.ollama_url = ollama_url
+        self.output_dir = os.path.join(results_dir, "service")
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        # Warm state shared by every run
+        self.store = ResultsStore(os.path.join(results_dir, "store"))
+        self.blob_store = BlobStore(os.path.join(results_dir, "blobs"))
+        self.analysis_pool = ProcessPoolExecutor(max_workers=analysis_workers or os.cpu_count() or 1)
+        self.stats_engine = ResamplingEngine(executor=self.analysis_pool)
+        self.runner = ThreadPoolExecutor(max_workers=concurrent_runs)
+        self.catalog_path = os.path.join(results_dir, "catalog.db")
+
+        self.runs = {}
+        self._lock = threading.Lock()
+        self._test_cases = {}
+
+    def load_test_cases(self, source) -> Dict:
+        """Inline test cases, or a file's (re-read whenever its mtime changes)"""
+        if isinstance(source, dict):
+            return source
+        path = source or DEFAULT_TEST_CASES
+        mtime = os.stat(path).st_mtime_ns
+        cached = self._test_cases.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path) as f:
+                cached = self._test_cases[path] = (mtime, json.load(f))
+        return cached[1]
+
+    @staticmethod
+    def validate_spec(spec) -> None:
+        """Raise ValueError for anything that is not a well-typed spec object"""
+        if not isinstance(spec, dict):
+            raise ValueError("spec must be a JSON object")
+        for field, types in SPEC_FIELDS.items():
+            value = spec.get(field)
+            if value is not None and (not isinstance(value, types) or isinstance(value, bool)):
+                raise ValueError(f"spec field {field!r} has the wrong type")
+        for field in ("noise_types", "metrics"):
+            if not all(isinstance(item, str) for item in spec.get(field) or []):
+                raise ValueError(f"spec field {field!r} must be a list of strings")
+        unknown = set(spec.get("metrics") or []) - set(DIVERGENCE_METRICS)
+        if unknown:
+            raise ValueError(f"unknown metrics {sorted(unknown)}; choose from {list(DIVERGENCE_METRICS)}")
+        if spec.get("num_runs") is not None and spec["num_runs"] < 1:
+            raise ValueError("num_runs must be at least 1")
+
+    def submit(self, spec: Dict) -> ServiceRun:
+        self.validate_spec(spec)
+        test_cases = self.load_test_cases(spec.get("test_cases"))  # fail fast on a bad spec
+        if "baseline" not in test_cases:
+            raise ValueError("test_cases needs a 'baseline' entry")
+
+        with self._lock:
+            run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{len(self.runs):04d}"
+            run = self.runs[run_id] = ServiceRun(run_id, spec)
+        run.emit({"event": "queued"})
+        self.runner.submit(self._execute, run, test_cases)
+        return run
+
+    def cancel(self, run_id: str) -> Optional[ServiceRun]:
+        run = self.runs.get(run_id)
+        if run is None:
+            return None
+        run.cancel_requested = True
+        if run.state == "queued":
+            run.finish("cancelled")
+        return run
+
+    def _execute(self, run: ServiceRun, test_cases: Dict) -> None:
+        if run.cancel_requested:
+            return
+        run.state = "running"
+        run.started_at = time.time()
+        spec = run.spec
+        model = spec.get("model", "phi3:mini")
+        output_dir = os.path.join(self.output_dir, run.run_id)
+        os.makedirs(output_dir, exist_ok=True)
+
+        experiment = ChaosExperiment(model_name=model, ollama_url=self.ollama_url,
+                                     store=self.store, blob_store=self.blob_store,
+                                     stats_engine=self.stats_engine, output_dir=output_dir,
+                                     divergence_metrics=spec.get("metrics") or ("edit_distance",))
+        experiment.run_id = run.run_id
+        try:
+            run.emit({"event": "started", "model": model})
+            experiment.run_full_experiment(test_cases=test_cases, noise_types=spec.get("noise_types"),
+                                           num_runs=int(spec.get("num_runs", 3)), progress=run.emit)
+        except RunCancelled:
+            experiment.score_tfidf()
+            experiment.flush_records()
+            run.finish("cancelled")
+            return
+        except Exception as e:
+            run.error = f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+            run.finish("failed", error=run.error)
+            return
+
+        run.summary = experiment.summary
+        run.files = {"results": experiment.output_path("results"), "summary": experiment.output_path("summary")}
+        comparisons = sum(len(r["divergences"]) for rs in experiment.results.values() for r in rs)
+        catalog = RunCatalog(self.catalog_path)
+        try:
+            catalog.register_run(run.run_id, model, run.files, matrix=spec.get("name", "service"),
+                                 started_at=run.started_at, record_counts={"comparison": comparisons},
+                                 aggregates=experiment.aggregates)
+        finally:
+            catalog.close()
+        run.finish("complete", pacing=experiment.controller.snapshot())
+
+    def results(self, run_id: str) -> Optional[Dict]:
+        run = self.runs.get(run_id)
+        if run is None or not run.files:
+            return None
+        with open(run.files["results"]) as f:
+            return {"run_id": run_id, "summary": run.summary, "results": json.load(f)}
+
+    def shutdown(self) -> None:
+        self.runner.shutdown(wait=False, cancel_futures=True)
+        self.analysis_pool.shutdown(wait=False, cancel_futures=True)
+        self.blob_store.close()
+
+
+def make_handler(service: ExperimentService):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _json(self, status: int, payload) -> None:
+            body = json.dumps(payload, indent=2, default=float).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _parts(self) -> List[str]:
+            return [p for p in self.path.split("?")[0].split("/") if p]
+
+        def do_POST(self):
+            if self._parts() != ["runs"]:
+                return self._json(404, {"error": "not found"})
+            try:
+                spec = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                run = service.submit(spec)
+            except (ValueError, OSError) as e:
+                return self._json(400, {"error": str(e)})
+            self._json(202, {"run_id": run.run_id, "status": f"/runs/{run.run_id}",
+                             "events": f"/runs/{run.run_id}/events"})
+
+        def do_DELETE(self):
+            parts = self._parts()
+            run = service.cancel(parts[1]) if len(parts) == 2 and parts[0] == "runs" else None
+            if run is None:
+                return self._json(404, {"error": "unknown run"})
+            self._json(200, run.status())
+
+        def do_GET(self):
+            parts = self._parts()
+            if parts == ["runs"]:
+                return self._json(200, [run.status() for run in service.runs.values()])
+            if len(parts) < 2 or parts[0] != "runs" or parts[1] not in service.runs:
+                return self._json(404, {"error": "unknown run"})
+
+            run = service.runs[parts[1]]
+            view = parts[2] if len(parts) > 2 else "status"
+            if view == "status":
+                self._json(200, run.status())
+            elif view == "results":
+                results = service.results(run.run_id)
+                if results is None:
+                    return self._json(409, {"error": f"run is {run.state}"})
+                self._json(200, results)
+            elif view == "events":
+                self._stream(run)
+            else:
+                self._json(404, {"error": "not found"})
+
+        def _stream(self, run: ServiceRun) -> None:
+            """Newline-delimited JSON events, chunked, until the run finishes"""
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            index = 0
+            try:
+                while True:
+                    events = run.events_after(index)
+                    index += len(events)
+                    if events:
+                        chunk = "".join(json.dumps(e, default=float) + "\n" for e in events).encode("utf-8")
+                        self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                        self.wfile.flush()
+                    if run.finished and index >= len(run.events):
+                        break
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
+
+
+def watch(url: str, run_id: str) -> None:
+    """Print a run's progress events until it finishes"""
+    with urllib.request.urlopen(f"{url}/runs/{run_id}/events", timeout=3600) as response:
+        for line in response:
+            event = json.loads(line)
+            if event["event"] == "pair":
+                print(f"  [{event['done']}/{event['total']}] {event['noise_type']}: "
+                      f"divergence {event['mean_divergence']:.3f}")
+            else:
+                print(f"  {event['event']}" + (f": {event['error']}" if event.get("error") else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local chaos experiment service")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="run the service")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve.add_argument("--results-dir", default="../results")
+    serve.add_argument("--concurrent-runs", type=int, default=1)
+
+    submit = sub.add_parser("submit", help="submit a sweep spec (JSON file) and watch it")
+    submit.add_argument("spec")
+    submit.add_argument("--url", default=f"http://127.0.0.1:{DEFAULT_PORT}")
+    submit.add_argument("--no-watch", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        service = ExperimentService(args.results_dir, concurrent_runs=args.concurrent_runs)
+        server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+        server.daemon_threads = True
+        print(f"🧪 Experiment service on http://{args.host}:{args.port} (results in {args.results_dir})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            service.shutdown()
+    else:
+        with open(args.spec, "rb") as f:
+            request = urllib.request.Request(f"{args.url}/runs", data=f.read(), method="POST",
+                                             headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=10) as response:
+            run_id = json.loads(response.read())["run_id"]
+        print(f"✅ Submitted run {run_id}")
+        if not args.no_watch:
+            watch(args.url, run_id)
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Priority job queue in front of a shared Ollama instance
+A small proxy daemon: runners point their Ollama URL at it and tag requests
+with a priority class and a job id, so quick probes jump ahead of long
+sweeps, concurrent sweeps share capacity fairly and a sweep can be cancelled
+Standard library only
+"""
+
+import argparse
+import json
+import os
+import select
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+PRIORITY_HEADER = "X-Chaos-Priority"
+JOB_HEADER = "X-Chaos-Job"
+# Lower value is served first
+PRIORITIES = {"interactive": 0, "default": 1, "batch": 2}
+DEFAULT_PORT = 11435
+# Client read timeout through the daemon: time spent queued behind other
+# jobs is not a sign of an overloaded server, so it must not trip a 30 s limit
+QUEUED_READ_TIMEOUT = 3600
+
+_is_queue = {}
+
+
+def submission_headers(priority: Optional[str] = None, job: Optional[str] = None) -> Dict[str, str]:
+    """
+    Headers that tag a request for the daemon; CHAOS_PRIORITY / CHAOS_JOB
+    supply defaults. Ollama ignores them, so they are safe to send directly.
+    """
+    headers = {}
+    priority = priority or os.environ.get("CHAOS_PRIORITY")
+    job = job or os.environ.get("CHAOS_JOB")
+    if priority:
+        headers[PRIORITY_HEADER] = priority
+    if job:
+        headers[JOB_HEADER] = job
+    return headers
+
+
+def is_job_queue(url: str) -> bool:
+    """Whether url is this daemon rather than Ollama itself (checked once per URL)"""
+    url = url.split("/api/", 1)[0].rstrip("/")
+    if url not in _is_queue:
+        try:
+            with urllib.request.urlopen(f"{url}/jobs", timeout=2) as response:
+                _is_queue[url] = "classes" in json.loads(response.read())
+        except Exception:
+            _is_queue[url] = False
+    return _is_queue[url]
+
+
+def client_timeout(url: str, timeout: float) -> float:
+    """Read timeout for a request to url: `timeout` direct, QUEUED_READ_TIMEOUT through the daemon"""
+    return max(timeout, QUEUED_READ_TIMEOUT) if is_job_queue(url) else timeout
+
+
+class Ticket:
+    """One queued upstream request and, once served, its response"""
+
+    def __init__(self, priority: str, job: str, path: str, body: bytes):
+        self.priority = priority
+        self.job = job
+        self.path = path
+        self.body = body
+        self.enqueued_at = time.monotonic()
+        # Set when the client hangs up while queued; workers skip the ticket
+        self.abandoned = False
+        self.done = threading.Event()
+        self.status = None
+        self.response_body = b""
+        self.content_type = "application/json"
+
+    def finish(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+        self.status = status
+        self.response_body = body
+        self.content_type = content_type
+        self.done.set()
+
+
+class JobQueue:
+    """
+    Strict priority between classes, round-robin between jobs within a class.
+
+    Each class keeps an ordered map of job -> pending tickets; take() serves
+    the head of the first job and rotates that job to the back, so a sweep
+    with hundreds of queued prompts cannot starve another job of its class.
+    Cancelled jobs have their queued tickets answered immediately and later
+    submissions refused until the job has been quiet for `cancel_ttl`
+    seconds; after that the name is forgotten and may be reused.
+    """
+
+    def __init__(self, wait_history: int = 500, cancel_ttl: float = 300.0):
+        self.classes = {name: OrderedDict() for name in PRIORITIES}
+        # job -> monotonic time its cancellation expires
+        self.cancelled = {}
+        self.cancel_ttl = cancel_ttl
+        self.waits = {name: deque(maxlen=wait_history) for name in PRIORITIES}
+        self.served = {name: 0 for name in PRIORITIES}
+        self.abandoned = 0
+        self._cond = threading.Condition()
+
+    def _expire_cancelled(self, now: float) -> None:
+        for job in [job for job, expires in self.cancelled.items() if expires <= now]:
+            del self.cancelled[job]
+
+    def submit(self, ticket: Ticket) -> bool:
+        with self._cond:
+            now = time.monotonic()
+            self._expire_cancelled(now)
+            if ticket.job in self.cancelled:
+                # A refused client is still running: keep refusing it
+                self.cancelled[ticket.job] = now + self.cancel_ttl
+                return False
+            self.classes[ticket.priority].setdefault(ticket.job, deque()).append(ticket)
+            self._cond.notify_all()
+            return True
+
+    def _next(self, max_priority: int) -> Optional[Ticket]:
+        for name in sorted(PRIORITIES, key=PRIORITIES.get):
+            if PRIORITIES[name] > max_priority:
+                break
+            jobs = self.classes[name]
+            while jobs:
+                job, pending = next(iter(jobs.items()))
+                ticket = pending.popleft()
+                del jobs[job]
+                if pending:
+                    jobs[job] = pending  # rotate to the back
+                if ticket.abandoned:
+                    self.abandoned += 1
+                    continue
+                return ticket
+        return None
+
+    def take(self, max_priority: int = max(PRIORITIES.values()), timeout: float = 1.0) -> Optional[Ticket]:
+        """Next ticket this worker may serve, or None after timeout"""
+        with self._cond:
+            ticket = self._next(max_priority)
+            if ticket is None and self._cond.wait(timeout):
+                ticket = self._next(max_priority)
+            if ticket is not None:
+                self.waits[ticket.priority].append(time.monotonic() - ticket.enqueued_at)
+                self.served[ticket.priority] += 1
+            return ticket
+
+    def cancel(self, job: str) -> int:
+        """Refuse further work for a job and drop what it has queued"""
+        with self._cond:
+            self.cancelled[job] = time.monotonic() + self.cancel_ttl
+            dropped = []
+            for jobs in self.classes.values():
+                dropped.extend(jobs.pop(job, ()))
+        for ticket in dropped:
+            ticket.finish(409, json.dumps({"error": f"job {job} cancelled"}).encode("utf-8"))
+        return len(dropped)
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            self._expire_cancelled(time.monotonic())
+            classes = {}
+            for name, jobs in self.classes.items():
+                waits = sorted(self.waits[name])
+                classes[name] = {
+                    "queued": sum(len(p) for p in jobs.values()),
+                    "jobs": {job: len(p) for job, p in jobs.items()},
+                    "served": self.served[name],
+                    "wait_p50_s": round(waits[len(waits) // 2], 3) if waits else None,
+                    "wait_max_s": round(waits[-1], 3) if waits else None
+                }
+            return {"classes": classes, "cancelled": sorted(self.cancelled), "abandoned": self.abandoned}
+
+
+class SchedulerDaemon:
+    """
+    HTTP proxy that feeds a fixed number of upstream slots from the JobQueue.
+
+    `reserved` of the slots only serve interactive tickets, so a probe never
+    waits behind a sweep request that is already generating. POSTs under
+    /api/ are queued; other Ollama GETs (tags, version) are passed straight
+    through. Responses are buffered, so clients should use stream=False.
+    """
+
+    def __init__(self, upstream: str = "http://localhost:11434", host: str = "127.0.0.1",
+                 port: int = DEFAULT_PORT, slots: Optional[int] = None, reserved: Optional[int] = None,
+                 timeout: float = 600):
+        self.upstream = upstream.rstrip("/")
+        self.slots = slots or int(os.environ.get("OLLAMA_NUM_PARALLEL", "2"))
+        self.reserved = reserved if reserved is not None else (1 if self.slots > 1 else 0)
+        self.timeout = timeout
+        self.queue = JobQueue()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._stop = threading.Event()
+        self.workers = [threading.Thread(target=self._work, args=(i < self.reserved,), daemon=True)
+                        for i in range(self.slots)]
+
+    def forward(self, method: str, path: str, body: Optional[bytes] = None):
+        """Send one request upstream; returns (status, body, content type)"""
+        request = urllib.request.Request(f"{self.upstream}{path}", data=body, method=method,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.read(), response.headers.get("Content-Type", "application/json")
+        except urllib.error.HTTPError as e:
+            return e.code, e.read(), "application/json"
+        except Exception as e:
+            return 502, json.dumps({"error": f"upstream error: {e}"}).encode("utf-8"), "application/json"
+
+    def _work(self, interactive_only: bool) -> None:
+        max_priority = PRIORITIES["interactive"] if interactive_only else max(PRIORITIES.values())
+        while not self._stop.is_set():
+            ticket = self.queue.take(max_priority)
+            if ticket is not None:
+                ticket.finish(*self.forward("POST", ticket.path, ticket.body))
+
+    def _handler(self):
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body: bytes, content_type: str = "application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _client_gone(self) -> bool:
+                """The client closed its connection (a readable socket with nothing to read)"""
+                try:
+                    readable, _, _ = select.select([self.connection], [], [], 0)
+                    return bool(readable) and self.connection.recv(1, socket.MSG_PEEK) == b""
+                except OSError:
+                    return True
+
+            def _json(self, status: int, payload: Dict):
+                self._reply(status, json.dumps(payload, indent=2).encode("utf-8"))
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/jobs":
+                    self._json(200, daemon.queue.snapshot())
+                else:
+                    self._reply(*daemon.forward("GET", self.path))
+
+            def do_DELETE(self):
+                if not self.path.startswith("/jobs/"):
+                    return self._json(404, {"error": "not found"})
+                job = self.path[len("/jobs/"):]
+                self._json(200, {"job": job, "dropped": daemon.queue.cancel(job)})
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not self.path.startswith("/api/"):
+                    return self._json(404, {"error": "not found"})
+                priority = self.headers.get(PRIORITY_HEADER, "default")
+                if priority not in PRIORITIES:
+                    priority = "default"
+                job = self.headers.get(JOB_HEADER) or f"{self.client_address[0]}:{priority}"
+
+                ticket = Ticket(priority, job, self.path, body)
+                if not daemon.queue.submit(ticket):
+                    return self._json(409, {"error": f"job {job} cancelled"})
+                while not ticket.done.wait(0.5):
+                    if self._client_gone():
+                        # Nobody is waiting for the answer: never send it upstream
+                        ticket.abandoned = True
+                        return
+                self._reply(ticket.status, ticket.response_body, ticket.content_type)
+
+        return Handler
+
+    def serve_forever(self) -> None:
+        for worker in self.workers:
+            worker.start()
+        try:
+            self.server.serve_forever()
+        finally:
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Priority job queue in front of Ollama")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="run the scheduler daemon")
+    serve.add_argument("--upstream", default="http://localhost:11434", help="Ollama URL")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve.add_argument("--slots", type=int, default=None, help="concurrent upstream requests")
+    serve.add_argument("--reserved", type=int, default=None, help="slots kept for interactive requests")
+
+    for name, text in [("jobs", "show queue depths and wait times"), ("cancel", "cancel a job")]:
+        command = sub.add_parser(name, help=text)
+        command.add_argument("--url", default=f"http://localhost:{DEFAULT_PORT}")
+    sub.choices["cancel"].add_argument("job")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        daemon = SchedulerDaemon(args.upstream, args.host, args.port, args.slots, args.reserved)
+        print(f"🚦 Job queue on http://{args.host}:{args.port} -> {daemon.upstream} "
+              f"({daemon.slots} slots, {daemon.reserved} reserved for interactive)")
+        print(f"   Point runners at it with: export CHAOS_OLLAMA_URL=http://{args.host}:{args.port}")
+        daemon.serve_forever()
+    else:
+        method = "GET" if args.command == "jobs" else "DELETE"
+        path = "/jobs" if args.command == "jobs" else f"/jobs/{args.job}"
+        with urllib.request.urlopen(urllib.request.Request(args.url + path, method=method), timeout=5) as r:
+            print(r.read().decode("utf-8"))
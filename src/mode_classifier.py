@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Local response-mode classifier distilled from critic labels
+Hashed word n-gram features and a multinomial logistic regression, so
+millions of responses can be labelled analytical / comforting / therapeutic /
+other on one CPU core instead of one critic call each
+"""
+
+import argparse
+import re
+import zlib
+import numpy as np
+from scipy import sparse
+from typing import Dict, List, Optional, Tuple
+
+MODES = ["analytical", "comforting", "therapeutic", "other"]
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+class ResponseModeClassifier:
+    """
+    Multinomial logistic regression over signed, hashed n-gram counts.
+
+    Tokens are hashed with crc32 (stable across processes, unlike hash()),
+    counts are log-scaled and rows L2-normalised, and the model is trained
+    with mini-batch gradient descent on the sparse matrix.
+    """
+
+    def __init__(self, n_features: int = 2 ** 18, ngram_range: Tuple[int, int] = (1, 2),
+                 epochs: int = 20, learning_rate: float = 2.0, l2: float = 1e-5,
+                 batch_size: int = 256, seed: Optional[int] = 0):
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.batch_size = batch_size
+        self.seed = seed
+        self.modes = list(MODES)
+        self.weights = None
+        self.bias = None
+
+    # ---- features ------------------------------------------------------
+
+    def _hashed(self, text: str) -> Dict[int, float]:
+        words = TOKEN_PATTERN.findall(text.lower())
+        counts = {}
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            for i in range(len(words) - n + 1):
+                h = zlib.crc32(" ".join(words[i:i + n]).encode("utf-8"))
+                index = h % self.n_features
+                sign = 1.0 if (h >> 31) & 1 else -1.0
+                counts[index] = counts.get(index, 0.0) + sign
+        return counts
+
+    def featurize(self, texts: List[str]) -> sparse.csr_matrix:
+        """Sparse (len(texts) × n_features) matrix of normalised hashed counts"""
+        indptr, indices, data = [0], [], []
+        for text in texts:
+            counts = self._hashed(text)
+            indices.extend(counts.keys())
+            data.extend(np.sign(v) * np.log1p(abs(v)) for v in counts.values())
+            indptr.append(len(indices))
+
+        matrix = sparse.csr_matrix((np.asarray(data, dtype=np.float32), indices, indptr),
+                                   shape=(len(texts), self.n_features))
+        norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1
+        norms[norms == 0] = 1.0
+        return sparse.diags(1.0 / norms) @ matrix
+
+    # ---- training / inference ------------------------------------------
+
+    def _softmax(self, logits: np.ndarray) -> np.ndarray:
+        logits = logits - logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def fit(self, texts: List[str], labels: List[str]) -> "ResponseModeClassifier":
+        X = self.featurize(texts).tocsr()
+        y = np.array([self.modes.index(label) for label in labels])
+        n, k = X.shape[0], len(self.modes)
+        Y = np.eye(k, dtype=np.float32)[y]
+
+        rng = np.random.default_rng(self.seed)
+        self.weights = np.zeros((self.n_features, k), dtype=np.float32)
+        self.bias = np.zeros(k, dtype=np.float32)
+
+        for epoch in range(self.epochs):
+            lr = self.learning_rate / (1 + epoch * 0.2)
+            order = rng.permutation(n)
+            for start in range(0, n, self.batch_size):
+                batch = order[start:start + self.batch_size]
+                Xb = X[batch]
+                error = self._softmax(Xb @ self.weights + self.bias) - Y[batch]
+                grad = (Xb.T @ error) / len(batch)
+                self.weights -= lr * (np.asarray(grad) + self.l2 * self.weights)
+                self.bias -= lr * error.mean(axis=0)
+        return self
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        if self.weights is None:
+            raise RuntimeError("Classifier has not been trained or loaded")
+        return self._softmax(self.featurize(texts) @ self.weights + self.bias)
+
+    def classify(self, responses: List[str]) -> List[str]:
+        """Batch-label responses with the most likely mode"""
+        return [self.modes[i] for i in self.predict_proba(responses).argmax(axis=1)]
+
+    def evaluate(self, texts: List[str], labels: List[str]) -> Dict:
+        """Accuracy, per-mode recall and confusion matrix against critic labels"""
+        predicted = self.classify(texts)
+        confusion = np.zeros((len(self.modes), len(self.modes)), dtype=int)
+        for truth, guess in zip(labels, predicted):
+            confusion[self.modes.index(truth), self.modes.index(guess)] += 1
+
+        per_mode = {}
+        for i, mode in enumerate(self.modes):
+            total = confusion[i].sum()
+            per_mode[mode] = float(confusion[i, i] / total) if total else None
+
+        return {
+            "accuracy": float(np.trace(confusion) / max(confusion.sum(), 1)),
+            "recall": per_mode,
+            "confusion": confusion.tolist(),
+            "n": len(labels)
+        }
+
+    # ---- persistence ---------------------------------------------------
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(path, weights=self.weights, bias=self.bias,
+                            modes=np.array(self.modes), n_features=self.n_features,
+                            ngram_range=np.array(self.ngram_range))
+
+    @classmethod
+    def load(cls, path: str) -> "ResponseModeClassifier":
+        with np.load(path) as data:
+            model = cls(n_features=int(data["n_features"]),
+                        ngram_range=tuple(int(v) for v in data["ngram_range"]))
+            model.weights = data["weights"]
+            model.bias = data["bias"]
+            model.modes = [str(m) for m in data["modes"]]
+        return model
+
+
+def training_set_from_cache(verdict_cache, blob_store) -> Tuple[List[str], List[str]]:
+    """
+    Accumulated critic mode labels joined with their response texts.
+    Verdicts are keyed by the same SHA-256 the blob store uses, so labels
+    for responses that were never stored are skipped.
+    """
+    texts, labels = [], []
+    for noisy_hash, verdict in verdict_cache.iter_verdicts("response_mode"):
+        if noisy_hash in blob_store and verdict.get("mode") in MODES:
+            texts.append(blob_store.get(noisy_hash))
+            labels.append(verdict["mode"])
+    return texts, labels
+
+
+def split_holdout(texts: List[str], labels: List[str], holdout: float = 0.2,
+                  seed: int = 0) -> Tuple[List[str], List[str], List[str], List[str]]:
+    order = np.random.default_rng(seed).permutation(len(texts))
+    cut = int(len(texts) * (1 - holdout))
+    train, test = order[:cut], order[cut:]
+    return ([texts[i] for i in train], [labels[i] for i in train],
+            [texts[i] for i in test], [labels[i] for i in test])
+
+
+if __name__ == "__main__":
+    from blob_store import BlobStore
+    from verdict_cache import VerdictCache
+
+    parser = argparse.ArgumentParser(description="Train the response-mode classifier from critic labels")
+    parser.add_argument("--blobs", default="../results/blobs", help="blob store directory")
+    parser.add_argument("--verdicts", default="../results/blobs/verdicts.db", help="verdict cache path")
+    parser.add_argument("--out", default="../results/mode_classifier.npz", help="model output path")
+    parser.add_argument("--holdout", type=float, default=0.2)
+    args = parser.parse_args()
+
+    texts, labels = training_set_from_cache(VerdictCache(args.verdicts), BlobStore(args.blobs))
+    if len(texts) < 10:
+        raise SystemExit(f"Only {len(texts)} labelled responses; label more with ChaosCritic.label_response_modes")
+
+    train_x, train_y, test_x, test_y = split_holdout(texts, labels, args.holdout)
+    model = ResponseModeClassifier().fit(train_x, train_y)
+    report = model.evaluate(test_x, test_y)
+    model.save(args.out)
+
+    print(f"✅ Trained on {len(train_x)} critic labels, held-out accuracy {report['accuracy']:.1%} (n={report['n']})")
+    for mode, recall in report["recall"].items():
+        print(f"  {mode:12} recall: {'n/a' if recall is None else f'{recall:.1%}'}")
+    print(f"Model saved to: {args.out}")
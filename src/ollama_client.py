@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Thin Ollama client shared by the experiment runners
+Returns the full /api/generate payload so callers can read the token
+counters (prompt_eval_count, eval_count) and timings next to the text
+"""
+
+import os
+import requests
+from typing import Dict, Optional
+
+from job_queue import client_timeout, submission_headers
+
+# Point CHAOS_OLLAMA_URL at the job queue daemon to share one Ollama fairly
+DEFAULT_OLLAMA_URL = os.environ.get("CHAOS_OLLAMA_URL", "http://localhost:11434")
+
+
+def generate(prompt: str, model: str, ollama_url: str = DEFAULT_OLLAMA_URL,
+             temperature: float = 0.7, timeout: float = 30,
+             options: Optional[Dict] = None, format: Optional[str] = None,
+             priority: Optional[str] = None, job: Optional[str] = None) -> Dict:
+    """
+    Call /api/generate without streaming and return the decoded JSON body.
+    priority / job tag the request for the job queue daemon, if one is used;
+    through the daemon, `timeout` still bounds connecting but time queued
+    behind other jobs does not count against it.
+    Raises on transport or HTTP errors; callers decide how to degrade.
+    """
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "temperature": temperature,
+        "stream": False
+    }
+    if options:
+        payload["options"] = options
+    if format:
+        payload["format"] = format
+
+    response = requests.post(f"{ollama_url}/api/generate", json=payload,
+                             timeout=(timeout, client_timeout(ollama_url, timeout)),
+                             headers=submission_headers(priority, job))
+    response.raise_for_status()
+    return response.json()
+
+
+def model_digest(model: str, ollama_url: str = DEFAULT_OLLAMA_URL, timeout: float = 5) -> str:
+    """
+    Content digest of a pulled model from /api/tags, so caches notice when a
+    tag is re-pulled with new weights. Falls back to the model name.
+    """
+    try:
+        response = requests.get(f"{ollama_url}/api/tags", timeout=timeout)
+        response.raise_for_status()
+        for entry in response.json().get("models", []):
+            if entry.get("name") == model or entry.get("model") == model:
+                return entry.get("digest") or model
+    except Exception:
+        pass
+    return model
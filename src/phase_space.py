@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Phase-space embedding of responses
+Projects responses to 2-D with randomized PCA on hashed n-gram features or
+with classical / landmark MDS on a distance matrix, and caches the
+coordinates so plots and clustering reuse one projection
+"""
+
+import hashlib
+import os
+import numpy as np
+from typing import Callable, Dict, List, Optional, Sequence
+
+from blob_store import blob_id
+
+
+def randomized_svd(X, k: int = 2, n_oversamples: int = 10, n_iter: int = 4,
+                   center: bool = True, seed: Optional[int] = 0):
+    """
+    Top-k singular triplets of X (dense or scipy.sparse) by randomized range
+    finding with power iterations (Halko et al.). Column centering is applied
+    implicitly, so sparse inputs stay sparse. Returns (U, s, Vt).
+    """
+    rng = np.random.default_rng(seed)
+    n, d = X.shape
+    mean = np.asarray(X.mean(axis=0)).ravel() if center else np.zeros(d)
+
+    def matmul(B):       # (X - 1 mean) @ B
+        return np.asarray(X @ B) - np.outer(np.ones(n), mean @ B)
+
+    def rmatmul(B):      # (X - 1 mean).T @ B
+        return np.asarray(X.T @ B) - np.outer(mean, B.sum(axis=0))
+
+    width = min(k + n_oversamples, n, d)
+    Q, _ = np.linalg.qr(matmul(rng.standard_normal((d, width))))
+    for _ in range(n_iter):
+        Q, _ = np.linalg.qr(rmatmul(Q))
+        Q, _ = np.linalg.qr(matmul(Q))
+
+    small = rmatmul(Q).T
+    U_small, s, Vt = np.linalg.svd(small, full_matrices=False)
+    return (Q @ U_small)[:, :k], s[:k], Vt[:k]
+
+
+def _top_eigen(B: np.ndarray, k: int, seed: Optional[int]):
+    """Largest k eigenpairs of a symmetric matrix (randomized when large)"""
+    if len(B) <= 500:
+        values, vectors = np.linalg.eigh(B)
+        order = np.argsort(values)[::-1][:k]
+        return values[order], vectors[:, order]
+    U, s, Vt = randomized_svd(B, k, center=False, seed=seed)
+    # Singular values of a symmetric matrix are |eigenvalues|; recover the sign
+    signs = np.sign(np.einsum("ij,ji->i", U.T, Vt.T))
+    return s * signs, U
+
+
+def classical_mds(distances: np.ndarray, k: int = 2, seed: Optional[int] = 0) -> np.ndarray:
+    """Torgerson MDS of a full (n × n) distance matrix"""
+    D2 = np.asarray(distances, dtype=float) ** 2
+    # Double centering without materialising J = I - 11ᵀ/n
+    B = -0.5 * (D2 - D2.mean(axis=0) - D2.mean(axis=1)[:, None] + D2.mean())
+    values, vectors = _top_eigen(B, k, seed)
+    return vectors * np.sqrt(np.clip(values, 0, None))
+
+
+def landmark_mds(n: int, distance_block: Callable[[np.ndarray, np.ndarray], np.ndarray],
+                 k: int = 2, n_landmarks: int = 256, seed: Optional[int] = 0,
+                 chunk: int = 4096) -> np.ndarray:
+    """
+    Landmark MDS (de Silva & Tenenbaum): classical MDS on m landmarks, then
+    every point is placed by distance-based triangulation against them, so
+    only n × m distances are ever needed.
+
+    distance_block(rows, cols) must return the (len(rows) × len(cols))
+    distances between the items at those indices.
+    """
+    rng = np.random.default_rng(seed)
+    m = min(n_landmarks, n)
+    landmarks = np.sort(rng.choice(n, size=m, replace=False))
+    L2 = np.asarray(distance_block(landmarks, landmarks), dtype=float) ** 2
+
+    B = -0.5 * (L2 - L2.mean(axis=0) - L2.mean(axis=1)[:, None] + L2.mean())
+    values, vectors = _top_eigen(B, k, seed)
+    keep = values > 1e-12
+    pseudo_inverse = (vectors[:, keep] / np.sqrt(values[keep])).T   # k × m
+    mean_sq = L2.mean(axis=0)
+
+    coords = np.zeros((n, k))
+    for start in range(0, n, chunk):
+        rows = np.arange(start, min(start + chunk, n))
+        delta = np.asarray(distance_block(rows, landmarks), dtype=float) ** 2
+        coords[rows, :keep.sum()] = -0.5 * (delta - mean_sq) @ pseudo_inverse.T
+    return coords
+
+
+class PhaseSpaceEmbedding:
+    """
+    2-D coordinates for a list of responses, cached on disk.
+
+    method="features": randomized PCA of hashed word n-gram features
+    (sparse, linear in the number of responses).
+    method="distances": classical MDS up to `exact_limit` responses, landmark
+    MDS beyond it; needs a distance_fn(text_a, text_b) or a distance_block.
+    The cache key covers the response ids, method and parameters.
+    """
+
+    def __init__(self, cache_dir: str = "../results/phase_space", method: str = "features",
+                 n_components: int = 2, n_features: int = 2 ** 16, n_landmarks: int = 256,
+                 exact_limit: int = 2000, seed: int = 0):
+        self.cache_dir = cache_dir
+        self.method = method
+        self.n_components = n_components
+        self.n_features = n_features
+        self.n_landmarks = n_landmarks
+        self.exact_limit = exact_limit
+        self.seed = seed
+
+    def cache_key(self, ids: Sequence[str]) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{self.method}:{self.n_components}:{self.n_features}:"
+                      f"{self.n_landmarks}:{self.exact_limit}:{self.seed}".encode("utf-8"))
+        for i in ids:
+            digest.update(i.encode("utf-8"))
+        return digest.hexdigest()[:24]
+
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def load(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        path = self._cache_path(key)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as cached:
+            return {"ids": cached["ids"], "coords": cached["coords"]}
+
+    def embed(self, texts: List[str], ids: Optional[List[str]] = None,
+              distance_fn: Optional[Callable[[str, str], float]] = None,
+              distance_block: Optional[Callable[[np.ndarray, np.ndarray], np.ndarray]] = None) -> np.ndarray:
+        """(len(texts) × n_components) coordinates, from the cache when possible"""
+        ids = ids or [blob_id(t) for t in texts]
+        key = self.cache_key(ids)
+        cached = self.load(key)
+        if cached is not None:
+            return cached["coords"]
+
+        if self.method == "features":
+            from mode_classifier import ResponseModeClassifier
+            X = ResponseModeClassifier(n_features=self.n_features).featurize(texts)
+            U, s, _ = randomized_svd(X, self.n_components, seed=self.seed)
+            coords = U * s
+        else:
+            if distance_block is None:
+                if distance_fn is None:
+                    raise ValueError("method='distances' needs distance_fn or distance_block")
+                distance_block = lambda rows, cols: np.array(
+                    [[distance_fn(texts[i], texts[j]) for j in cols] for i in rows])
+            n = len(texts)
+            if n <= self.exact_limit:
+                everything = np.arange(n)
+                coords = classical_mds(distance_block(everything, everything), self.n_components, self.seed)
+            else:
+                coords = landmark_mds(n, distance_block, self.n_components, self.n_landmarks, self.seed)
+
+        # Return what the cache will return, so fresh and cached runs agree exactly
+        coords = coords.astype(np.float32)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        np.savez_compressed(self._cache_path(key), ids=np.array(ids), coords=coords)
+        return coords
+
+
+def collect_responses(results: Dict, blob_store=None) -> List[Dict]:
+    """
+    Baseline/noisy response sets of every prompt pair in a results file.
+    Full texts come from the blob store when the run recorded response ids;
+    otherwise the stored sample responses stand in.
+    """
+    pairs = []
+    for noise_type, runs in results.items():
+        for index, result in enumerate(runs):
+            sets = {}
+            for role in ("baseline", "noisy"):
+                ids = [i for i in result.get(f"{role}_response_ids", []) if i]
+                if ids and blob_store is not None and all(i in blob_store for i in ids):
+                    sets[role] = blob_store.get_many(ids)
+                else:
+                    sample = result.get(f"sample_{role}_response", "")
+                    sets[role] = [sample] if sample else []
+            if sets["baseline"] and sets["noisy"]:
+                pairs.append({"noise_type": noise_type, "index": index, **sets})
+    return pairs
+
+
+def trajectories(results: Dict, blob_store=None, embedding: Optional[PhaseSpaceEmbedding] = None) -> Dict:
+    """
+    Plot-ready phase-space payload: per noise type, the embedded noisy
+    responses and one baseline-centroid → noisy-centroid segment per
+    prompt pair, plus the baseline cloud they start from
+    """
+    embedding = embedding or PhaseSpaceEmbedding()
+    pairs = collect_responses(results, blob_store)
+    if not pairs:
+        return {}
+
+    texts, owners = [], []
+    for p, pair in enumerate(pairs):
+        for role in ("baseline", "noisy"):
+            texts.extend(pair[role])
+            owners.extend([(p, role)] * len(pair[role]))
+    coords = embedding.embed(texts)
+
+    by_pair = {}
+    for (p, role), point in zip(owners, coords):
+        by_pair.setdefault((p, role), []).append(point)
+
+    payload = {"baseline": np.array([c for (p, role), pts in by_pair.items() if role == "baseline"
+                                     for c in pts]).round(4).tolist(),
+               "noise_types": {}}
+    for p, pair in enumerate(pairs):
+        start = np.mean(by_pair[(p, "baseline")], axis=0)
+        end = np.mean(by_pair[(p, "noisy")], axis=0)
+        entry = payload["noise_types"].setdefault(pair["noise_type"], {"segments": [], "points": []})
+        entry["segments"].append([start.round(4).tolist(), end.round(4).tolist()])
+        entry["points"].extend(np.array(by_pair[(p, "noisy")]).round(4).tolist())
+    return payload
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Typed record representation for generations and comparisons
+Single records are slotted dataclasses; bulk records live in a RecordBatch,
+a growable structured NumPy array with strings interned per column, which
+holds a million comparisons in about 120 MB and encodes to JSONL, npz or the
+results store's columns without building a dict per record
+"""
+
+import json
+import numpy as np
+from dataclasses import astuple, dataclass, fields
+from datetime import datetime
+from typing import Dict, IO, Iterable, Iterator, List, Optional, Union
+
+FEATURE_NAMES = [
+    "length", "word_count", "sentence_count", "avg_word_length",
+    "complexity_score", "punctuation_ratio", "uppercase_ratio"
+]
+
+# Column order per record kind; "model", "noise_type" and "timestamp" are
+# required in every kind because iter_records filters on them
+SCHEMAS = {
+    "comparison": {
+        "run_id": str, "model": str, "noise_type": str, "timestamp": float,
+        "baseline_prompt": str, "noisy_prompt": str, "pair_index": int,
+        "edit_distance": float, "proxy_lyapunov": float, "mean_feature_divergence": float,
+        "tfidf_cosine": float,
+        **{f"fd_{name}": float for name in FEATURE_NAMES}
+    },
+    "generation": {
+        "run_id": str, "model": str, "noise_type": str, "timestamp": float,
+        "role": str, "prompt": str, "run_index": int,
+        "response_chars": int, "response_id": str, "response": str
+    }
+}
+
+# In-memory column types: strings become int32 codes into a per-column
+# table; metrics stay float64 so what is persisted is exactly what was computed
+COLUMN_DTYPES = {str: np.int32, float: np.float64, int: np.int32}
+
+
+def json_numbers(values: np.ndarray) -> List[str]:
+    """JSON literals for a numeric column (NaN/Infinity as json.dumps spells them)"""
+    if values.dtype.kind in "iu":
+        return [str(v) for v in values.tolist()]
+    text = [repr(v) for v in values.astype(np.float64).tolist()]
+    if not np.isfinite(values).all():
+        special = {"nan": "NaN", "inf": "Infinity", "-inf": "-Infinity"}
+        text = [special.get(t, t) for t in text]
+    return text
+
+
+def to_epoch(value) -> Optional[float]:
+    """Accept epoch seconds, ISO strings or datetimes; return epoch seconds"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.timestamp()
+
+
+@dataclass(slots=True)
+class ComparisonRecord:
+    """One baseline/noisy response comparison"""
+    run_id: str = ""
+    model: str = ""
+    noise_type: str = ""
+    timestamp: float = 0.0
+    baseline_prompt: str = ""
+    noisy_prompt: str = ""
+    pair_index: int = 0
+    edit_distance: float = 0.0
+    proxy_lyapunov: float = 0.0
+    mean_feature_divergence: float = 0.0
+    tfidf_cosine: float = float("nan")  # NaN when the run did not measure it
+    fd_length: float = 0.0
+    fd_word_count: float = 0.0
+    fd_sentence_count: float = 0.0
+    fd_avg_word_length: float = 0.0
+    fd_complexity_score: float = 0.0
+    fd_punctuation_ratio: float = 0.0
+    fd_uppercase_ratio: float = 0.0
+
+
+@dataclass(slots=True)
+class GenerationRecord:
+    """One generated response (text inline only when no blob store holds it)"""
+    run_id: str = ""
+    model: str = ""
+    noise_type: str = ""
+    timestamp: float = 0.0
+    role: str = ""
+    prompt: str = ""
+    run_index: int = 0
+    response_chars: int = 0
+    response_id: str = ""
+    response: str = ""
+
+
+RECORD_TYPES = {"comparison": ComparisonRecord, "generation": GenerationRecord}
+
+for _kind, _cls in RECORD_TYPES.items():
+    assert [f.name for f in fields(_cls)] == list(SCHEMAS[_kind]), f"{_cls.__name__} out of sync with SCHEMAS"
+
+
+class StringTable:
+    """Interned strings of one column: value <-> int32 code"""
+
+    def __init__(self, values: Iterable[str] = ()):
+        self.values = []
+        self.codes = {}
+        for value in values:
+            self.intern(value)
+
+    def intern(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return np.asarray(self.values, dtype=np.str_)[codes] if self.values else np.array([], dtype=np.str_)
+
+
+Record = Union[Dict, ComparisonRecord, GenerationRecord]
+
+
+class RecordBatch:
+    """
+    Growable structured array of one record kind.
+
+    Rows cost ~120 bytes for comparisons (string columns are int32 codes,
+    metrics float64) instead of a dict with a dozen boxed values. Accepts
+    dicts or dataclass records; missing or None fields take the schema default.
+    """
+
+    def __init__(self, kind: str, capacity: int = 1024):
+        self.kind = kind
+        self.schema = SCHEMAS[kind]
+        self.record_type = RECORD_TYPES[kind]
+        self.dtype = np.dtype([(name, np.float64 if name == "timestamp" else COLUMN_DTYPES[t])
+                               for name, t in self.schema.items()])
+        self.data = np.zeros(capacity, dtype=self.dtype)
+        self.size = 0
+        self.strings = {name: StringTable() for name, t in self.schema.items() if t is str}
+        self._defaults = astuple(self.record_type())
+
+    # ---- building ------------------------------------------------------
+
+    @classmethod
+    def from_records(cls, kind: str, records: Iterable[Record]) -> "RecordBatch":
+        records = list(records)
+        batch = cls(kind, capacity=max(len(records), 1))
+        batch.extend(records)
+        return batch
+
+    @classmethod
+    def from_columns(cls, kind: str, columns: Dict[str, np.ndarray]) -> "RecordBatch":
+        """Vectorised build from {column: array}, e.g. a ResultsStore batch"""
+        n = len(next(iter(columns.values())))
+        batch = cls(kind, capacity=max(n, 1))
+        for name, kind_type in batch.schema.items():
+            if name not in columns:
+                if kind_type is str:
+                    batch.strings[name].intern("")  # code 0, the schema default
+                continue
+            if kind_type is str:
+                values, codes = np.unique(np.asarray(columns[name]).astype(str), return_inverse=True)
+                batch.strings[name] = StringTable(values.tolist())
+                batch.data[name][:n] = codes
+            else:
+                batch.data[name][:n] = columns[name]
+        batch.size = n
+        return batch
+
+    def _reserve(self, extra: int) -> None:
+        if self.size + extra > len(self.data):
+            grown = np.zeros(max(2 * len(self.data), self.size + extra), dtype=self.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+
+    def _row(self, record: Record) -> tuple:
+        if isinstance(record, dict):
+            values = [record.get(name, default) for name, default in zip(self.schema, self._defaults)]
+        else:
+            values = [getattr(record, name) for name in self.schema]
+        for i, (name, kind_type) in enumerate(self.schema.items()):
+            if kind_type is str:
+                values[i] = self.strings[name].intern(values[i] or "")
+            elif name == "timestamp":
+                values[i] = to_epoch(values[i]) or 0.0
+            elif values[i] is None:
+                values[i] = self._defaults[i]
+        return tuple(values)
+
+    def append(self, record: Record) -> None:
+        self._reserve(1)
+        self.data[self.size] = self._row(record)
+        self.size += 1
+
+    def extend(self, records: Iterable[Record]) -> None:
+        rows = [self._row(record) for record in records]
+        self._reserve(len(rows))
+        if rows:
+            self.data[self.size:self.size + len(rows)] = np.array(rows, dtype=self.dtype)
+            self.size += len(rows)
+
+    # ---- access --------------------------------------------------------
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the rows and string tables"""
+        strings = sum(len(v) + 50 for table in self.strings.values() for v in table.values)
+        return self.size * self.dtype.itemsize + strings
+
+    def column(self, name: str) -> np.ndarray:
+        """Decoded column (strings as a NumPy str array)"""
+        values = self.data[name][:self.size]
+        return self.strings[name].decode(values) if name in self.strings else values
+
+    def __getitem__(self, index: int) -> Union[ComparisonRecord, GenerationRecord]:
+        if not -self.size <= index < self.size:
+            raise IndexError(index)
+        row = self.data[index % self.size]
+        values = []
+        for name, kind_type in self.schema.items():
+            if kind_type is str:
+                values.append(self.strings[name].values[row[name]])
+            else:
+                values.append(row[name].item())
+        return self.record_type(*values)
+
+    def __iter__(self) -> Iterator[Union[ComparisonRecord, GenerationRecord]]:
+        for i in range(self.size):
+            yield self[i]
+
+    def to_columns(self) -> Dict[str, np.ndarray]:
+        """{column: array} in the results store's types"""
+        columns = {}
+        for name, kind_type in self.schema.items():
+            values = self.column(name)
+            columns[name] = values.astype({str: np.str_, float: np.float64, int: np.int64}[kind_type])
+        return columns
+
+    # ---- encoders ------------------------------------------------------
+
+    def _encoded_columns(self, start: int, stop: int) -> List[List[str]]:
+        """Rows start:stop of each column as JSON literals; strings are encoded once per distinct value"""
+        encoded = []
+        for name, kind_type in self.schema.items():
+            values = self.data[name][start:stop]
+            if kind_type is str:
+                table = np.asarray([json.dumps(v) for v in self.strings[name].values] or ['""'], dtype=object)
+                encoded.append(table[values].tolist())
+            else:
+                encoded.append(json_numbers(values))
+        return encoded
+
+    def to_jsonl(self, out: Union[str, IO], chunk_size: int = 65536) -> None:
+        """One JSON object per line, written chunk by chunk"""
+        if isinstance(out, str):
+            with open(out, "w") as f:
+                return self.to_jsonl(f, chunk_size)
+        keys = [json.dumps(name) + ":" for name in self.schema]
+        for start in range(0, self.size, chunk_size):
+            columns = self._encoded_columns(start, min(start + chunk_size, self.size))
+            out.write("".join(
+                "{" + ",".join(k + v for k, v in zip(keys, row)) + "}\n" for row in zip(*columns)))
+
+    @classmethod
+    def from_jsonl(cls, kind: str, source: Union[str, IO]) -> "RecordBatch":
+        if isinstance(source, str):
+            with open(source) as f:
+                return cls.from_jsonl(kind, f)
+        batch = cls(kind)
+        batch.extend(json.loads(line) for line in source if line.strip())
+        return batch
+
+    def save(self, path: str) -> None:
+        """Columnar .npz: the structured array plus each string table"""
+        tables = {f"strings_{name}": np.asarray(table.values, dtype=np.str_)
+                  for name, table in self.strings.items()}
+        with open(path, "wb") as f:
+            np.savez_compressed(f, kind=np.str_(self.kind), rows=self.data[:self.size], **tables)
+
+    @classmethod
+    def load(cls, path: str) -> "RecordBatch":
+        with np.load(path) as data:
+            batch = cls(str(data["kind"]), capacity=1)
+            batch.data = data["rows"].copy()
+            batch.size = len(batch.data)
+            for name in batch.strings:
+                batch.strings[name] = StringTable(data[f"strings_{name}"].tolist())
+        return batch
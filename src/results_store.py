@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Columnar results store for generation and comparison records
+Writes one Parquet file (or NumPy .npz when pyarrow is missing) per flushed
+batch, partitioned by record kind and model, and reads back lazily with
+column projection and file/row-group pruning
+"""
+
+import glob
+import json
+import os
+import re
+import numpy as np
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+# Schemas and record types live in records; re-exported here for existing imports
+from records import FEATURE_NAMES, SCHEMAS, ComparisonRecord, RecordBatch, to_epoch
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAVE_ARROW = True
+except ImportError:
+    HAVE_ARROW = False
+
+NUMPY_TYPES = {str: np.str_, float: np.float64, int: np.int64}
+# Fill for a column missing from a part written before the column existed
+MISSING = {str: "", float: np.nan, int: 0}
+
+
+def _safe(name: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', name)
+
+
+class ResultsStore:
+    """
+    Append-only columnar store rooted at a directory.
+
+    Layout: <root>/<kind>/model=<model>/part-<run_id>-<n>.<parquet|npz>
+    Each part also carries its timestamp range and noise types so whole files
+    can be skipped without reading any column data.
+    """
+
+    def __init__(self, root: str = "../results/store", backend: Optional[str] = None):
+        self.root = root
+        self.backend = backend or ("parquet" if HAVE_ARROW else "npz")
+        if self.backend == "parquet" and not HAVE_ARROW:
+            raise ImportError("pyarrow is required for the parquet backend")
+
+    # ---- writing -------------------------------------------------------
+
+    def write(self, kind: str, records: Union[RecordBatch, Iterable]) -> Optional[str]:
+        """
+        Write a batch of records of one kind; one file per (kind, model).
+        records is a RecordBatch or an iterable of dicts / typed records.
+        """
+        if not isinstance(records, RecordBatch):
+            records = RecordBatch.from_records(kind, records)
+        if not len(records):
+            return None
+        all_columns = records.to_columns()
+
+        written = None
+        for model in np.unique(all_columns["model"]):
+            mask = all_columns["model"] == model
+            columns = {name: values[mask] for name, values in all_columns.items()}
+
+            directory = os.path.join(self.root, kind, f"model={_safe(str(model))}")
+            os.makedirs(directory, exist_ok=True)
+            run_id = _safe(str(columns["run_id"][0]) or "run")
+            existing = len(glob.glob(os.path.join(directory, f"part-{run_id}-*")))
+            path = os.path.join(directory, f"part-{run_id}-{existing:04d}.{self.backend}")
+            self._write_file(path, columns)
+            written = path
+        return written
+
+    def _write_file(self, path: str, columns: Dict[str, np.ndarray]) -> None:
+        # Write to a temp name and rename so readers never see a partial part
+        tmp = path + ".tmp"
+        if self.backend == "parquet":
+            table = pa.table({name: pa.array(values.tolist()) for name, values in columns.items()})
+            pq.write_table(table, tmp, row_group_size=65536)
+        else:
+            meta = {
+                "__ts_min": np.float64(columns["timestamp"].min()),
+                "__ts_max": np.float64(columns["timestamp"].max()),
+                "__noise_types": np.unique(columns["noise_type"])
+            }
+            with open(tmp, "wb") as f:
+                np.savez_compressed(f, **columns, **meta)
+        os.replace(tmp, path)
+
+    # ---- reading -------------------------------------------------------
+
+    def _files(self, kind: str, model: Optional[str]) -> List[str]:
+        pattern = f"model={_safe(model)}" if model else "model=*"
+        files = glob.glob(os.path.join(self.root, kind, pattern, "part-*.parquet"))
+        files += glob.glob(os.path.join(self.root, kind, pattern, "part-*.npz"))
+        return sorted(files)
+
+    def iter_batches(self, kind: str = "comparison", columns: Optional[List[str]] = None,
+                     model: Optional[str] = None, noise_type: Optional[str] = None,
+                     since=None, until=None) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Yield {column: array} batches matching the filters.
+
+        Only the requested columns (plus those needed for filtering) are read.
+        Files and Parquet row groups whose timestamp range or noise types rule
+        them out are skipped without decoding. Columns a file predates (e.g.
+        tfidf_cosine) read as NaN, 0 or "".
+        """
+        schema = SCHEMAS[kind]
+        columns = list(columns or schema)
+        needed = list(dict.fromkeys(columns + ["noise_type", "timestamp"]))
+        since, until = to_epoch(since), to_epoch(until)
+
+        for path in self._files(kind, model):
+            if path.endswith(".parquet"):
+                batches = self._read_parquet(path, needed, noise_type, since, until)
+            else:
+                batches = self._read_npz(path, needed, noise_type, since, until)
+
+            for batch in batches:
+                rows = len(batch["timestamp"])
+                for name in needed:
+                    if name not in batch:
+                        batch[name] = np.full(rows, MISSING[schema[name]], dtype=NUMPY_TYPES[schema[name]])
+                mask = np.ones(len(batch["timestamp"]), dtype=bool)
+                if noise_type is not None:
+                    mask &= batch["noise_type"] == noise_type
+                if since is not None:
+                    mask &= batch["timestamp"] >= since
+                if until is not None:
+                    mask &= batch["timestamp"] < until
+                if mask.any():
+                    yield {name: batch[name][mask] for name in columns}
+
+    def _read_npz(self, path, needed, noise_type, since, until):
+        # np.load on an .npz is lazy: each column is decoded only when indexed
+        with np.load(path) as data:
+            if since is not None and data["__ts_max"] < since:
+                return
+            if until is not None and data["__ts_min"] >= until:
+                return
+            if noise_type is not None and noise_type not in data["__noise_types"]:
+                return
+            yield {name: data[name] for name in needed if name in data.files}
+
+    def _read_parquet(self, path, needed, noise_type, since, until):
+        parquet = pq.ParquetFile(path)
+        names = parquet.schema_arrow.names
+        for group in range(parquet.num_row_groups):
+            meta = parquet.metadata.row_group(group)
+            stats = {names[i]: meta.column(i).statistics for i in range(meta.num_columns)}
+            ts = stats.get("timestamp")
+            if ts is not None and ts.has_min_max:
+                if since is not None and ts.max < since:
+                    continue
+                if until is not None and ts.min >= until:
+                    continue
+            nt = stats.get("noise_type")
+            if noise_type is not None and nt is not None and nt.has_min_max:
+                if not (nt.min <= noise_type <= nt.max):
+                    continue
+            present = [name for name in needed if name in names]
+            table = parquet.read_row_group(group, columns=present)
+            yield {name: table.column(name).to_numpy(zero_copy_only=False) for name in present}
+
+    def iter_records(self, kind: str = "comparison", columns: Optional[List[str]] = None,
+                     model: Optional[str] = None, noise_type: Optional[str] = None,
+                     since=None, until=None) -> Iterator[Dict]:
+        """Lazily yield one dict per matching record (see iter_batches)"""
+        for batch in self.iter_batches(kind, columns, model, noise_type, since, until):
+            names = list(batch)
+            for row in zip(*(batch[name].tolist() for name in names)):
+                yield dict(zip(names, row))
+
+    def aggregate(self, metric: str, kind: str = "comparison", by: str = "noise_type",
+                  **filters) -> Dict[str, Dict[str, float]]:
+        """Mean/std/count of one metric per group, streamed batch by batch"""
+        sums = {}
+        for batch in self.iter_batches(kind, [by, metric], **filters):
+            for key in np.unique(batch[by]):
+                values = batch[metric][batch[by] == key].astype(float)
+                n, s, sq = sums.get(key, (0, 0.0, 0.0))
+                sums[key] = (n + len(values), s + values.sum(), sq + (values ** 2).sum())
+
+        result = {}
+        for key, (n, s, sq) in sums.items():
+            mean = float(s / n)
+            result[str(key)] = {
+                "mean": mean,
+                "std": float(np.sqrt(max(sq / n - mean ** 2, 0.0))),
+                "count": n
+            }
+        return result
+
+
+def comparison_records(result: Dict, model: str, run_id: str) -> List[ComparisonRecord]:
+    """Flatten one run_single_experiment result into comparison records"""
+    records = []
+    timestamp = to_epoch(result.get("timestamp")) or 0.0
+    for i, div in enumerate(result.get("divergences", [])):
+        features = div.get("feature_divergence", {})
+        records.append(ComparisonRecord(
+            run_id, model, result["noise_type"], timestamp,
+            result.get("baseline_prompt", ""), result.get("noisy_prompt", ""), i,
+            div["edit_distance"], div["proxy_lyapunov"], div.get("mean_feature_divergence", 0.0),
+            div.get("tfidf_cosine", float("nan")),
+            *(features.get(name, 0.0) for name in FEATURE_NAMES)
+        ))
+    return records
+
+
+def import_legacy_results(path: str, model: str = "phi3:mini") -> List[Dict]:
+    """
+    Normalise a legacy results JSON file into comparison records.
+
+    Handles results_*.json (noise_type -> experiment list), and the
+    simple_chaos_results_* / minimal_chaos_* {"results": [...]} layouts.
+    summary_*.json holds aggregates rather than records and yields nothing;
+    summaries are recomputed from records with ResultsStore.aggregate.
+    """
+    with open(path, 'r') as f:
+        data = json.load(f)
+    run_id = os.path.splitext(os.path.basename(path))[0]
+
+    records = []
+    if isinstance(data, dict) and "results" in data:
+        model = data.get("model") or data.get("metadata", {}).get("model", model)
+        for i, entry in enumerate(data["results"]):
+            if "divergence" not in entry:
+                continue
+            records.append({
+                "run_id": run_id,
+                "model": model,
+                "noise_type": entry.get("noise_type") or entry.get("type") or entry.get("experiment", ""),
+                "timestamp": entry.get("timestamp") or data.get("timestamp"),
+                "baseline_prompt": entry.get("baseline_prompt", ""),
+                "noisy_prompt": entry.get("noisy_prompt", ""),
+                "pair_index": i,
+                "edit_distance": entry["divergence"],
+                "proxy_lyapunov": float(np.log(entry["divergence"] + 0.001) / np.log(0.001))
+            })
+    elif isinstance(data, dict):
+        for experiments in data.values():
+            if not isinstance(experiments, list):
+                return []  # summary_*.json
+            for result in experiments:
+                records.extend(comparison_records(result, model, run_id))
+    return records
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Usage: python results_store.py <store_root> <legacy.json> [...]
+    store = ResultsStore(sys.argv[1])
+    for legacy in sys.argv[2:]:
+        imported = import_legacy_results(legacy)
+        store.write("comparison", imported)
+        print(f"Imported {len(imported)} records from {legacy}")
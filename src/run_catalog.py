@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+SQLite catalog of experiment runs under results/
+Indexes each run's model, test matrix, git revision, timing, record counts
+and output files so the latest summary (or any cross-run slice) is one
+indexed query instead of a directory listing sorted by filename
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import subprocess
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from streaming_stats import AggregateSet, StreamingAggregate
+
+DEFAULT_CATALOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'results', 'catalog.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    model TEXT,
+    matrix TEXT,
+    git_rev TEXT,
+    started_at REAL,
+    finished_at REAL,
+    duration_s REAL,
+    status TEXT,
+    record_count INTEGER DEFAULT 0,
+    comparison_count INTEGER DEFAULT 0,
+    generation_count INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS files (
+    run_id TEXT REFERENCES runs(run_id) ON DELETE CASCADE,
+    kind TEXT,
+    path TEXT,
+    size INTEGER,
+    created_at REAL,
+    PRIMARY KEY (run_id, kind, path)
+);
+CREATE TABLE IF NOT EXISTS aggregates (
+    run_id TEXT REFERENCES runs(run_id) ON DELETE CASCADE,
+    model TEXT,
+    noise_type TEXT,
+    metric TEXT,
+    count INTEGER,
+    state TEXT,
+    PRIMARY KEY (run_id, model, noise_type, metric)
+);
+CREATE INDEX IF NOT EXISTS runs_model_finished ON runs(model, finished_at);
+CREATE INDEX IF NOT EXISTS files_kind_created ON files(kind, created_at);
+"""
+
+# Legacy filename prefixes -> file kind, checked in order. Only results_*
+# files have the per-noise-type layout readers of kind "results" expect;
+# the older scripts' outputs get a kind of their own
+LEGACY_KINDS = [
+    ("simple_chaos_results_", "legacy_results"),
+    ("quick_chaos_test_", "legacy_results"),
+    ("minimal_chaos_", "legacy_results"),
+    ("hate_bifurcation_test_", "legacy_results"),
+    ("results_", "results"),
+    ("summary_", "summary"),
+]
+
+
+def git_revision(cwd: Optional[str] = None) -> str:
+    """Current git HEAD, or "" outside a repository"""
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                             cwd=cwd or os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() if out.returncode == 0 else ""
+    except OSError:
+        return ""
+
+
+class RunCatalog:
+    """Thin wrapper over the catalog database"""
+
+    def __init__(self, path: str = DEFAULT_CATALOG):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def register_run(self, run_id: str, model: str, files: Dict[str, object],
+                     matrix: str = "", started_at: Optional[float] = None,
+                     finished_at: Optional[float] = None, record_counts: Optional[Dict[str, int]] = None,
+                     status: str = "complete", git_rev: Optional[str] = None,
+                     aggregates: Optional[AggregateSet] = None) -> None:
+        """
+        Record a completed run, its output files and its streaming aggregates
+        in one transaction, so a reader sees either the whole run or none of it.
+
+        files maps kind -> path (or list of paths), e.g. {"summary": ".../summary_x.json"}
+        """
+        finished_at = finished_at or time.time()
+        counts = record_counts or {}
+        rev = git_rev if git_rev is not None else git_revision()
+
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, model, matrix, rev, started_at, finished_at,
+                 (finished_at - started_at) if started_at else None, status,
+                 sum(counts.values()), counts.get("comparison", 0), counts.get("generation", 0))
+            )
+            self.conn.execute("DELETE FROM files WHERE run_id = ?", (run_id,))
+            for kind, paths in files.items():
+                for path in ([paths] if isinstance(paths, str) else paths):
+                    path = os.path.abspath(path)
+                    size = os.path.getsize(path) if os.path.exists(path) else None
+                    self.conn.execute("INSERT INTO files VALUES (?, ?, ?, ?, ?)",
+                                      (run_id, kind, path, size, finished_at))
+            if aggregates is not None:
+                self.conn.execute("DELETE FROM aggregates WHERE run_id = ?", (run_id,))
+                self.conn.executemany(
+                    "INSERT INTO aggregates VALUES (?, ?, ?, ?, ?, ?)",
+                    [(run_id, m, noise_type, metric, aggregate.moments.count, json.dumps(aggregate.to_dict()))
+                     for (m, noise_type, metric), aggregate in aggregates.items()])
+
+    def latest_file(self, kind: str, model: Optional[str] = None) -> Optional[str]:
+        """Path of the most recent file of a kind (optionally for one model)"""
+        query = ("SELECT f.path FROM files f JOIN runs r ON r.run_id = f.run_id "
+                 "WHERE f.kind = ?")
+        params = [kind]
+        if model:
+            query += " AND r.model = ?"
+            params.append(model)
+        query += " ORDER BY r.finished_at DESC, f.created_at DESC LIMIT 1"
+        row = self.conn.execute(query, params).fetchone()
+        return row["path"] if row else None
+
+    def runs(self, model: Optional[str] = None, since=None, limit: int = 50) -> List[Dict]:
+        """Most recent runs first, filtered by model and finish time"""
+        query = "SELECT * FROM runs WHERE 1 = 1"
+        params = []
+        if model:
+            query += " AND model = ?"
+            params.append(model)
+        if since is not None:
+            if isinstance(since, str):
+                since = datetime.fromisoformat(since).timestamp()
+            query += " AND finished_at >= ?"
+            params.append(since)
+        query += " ORDER BY finished_at DESC LIMIT ?"
+        params.append(limit)
+        return [dict(row) for row in self.conn.execute(query, params)]
+
+    def aggregates(self, model: Optional[str] = None, since=None,
+                   metrics: Optional[List[str]] = None) -> AggregateSet:
+        """
+        Stored per-run aggregates merged across the matching runs; reading
+        p95 divergence over every run is one query and a few sketch merges
+        """
+        query = ("SELECT a.model, a.noise_type, a.metric, a.state FROM aggregates a "
+                 "JOIN runs r ON r.run_id = a.run_id WHERE 1 = 1")
+        params = []
+        if model:
+            query += " AND a.model = ?"
+            params.append(model)
+        if since is not None:
+            if isinstance(since, str):
+                since = datetime.fromisoformat(since).timestamp()
+            query += " AND r.finished_at >= ?"
+            params.append(since)
+        if metrics:
+            query += f" AND a.metric IN ({', '.join('?' * len(metrics))})"
+            params.extend(metrics)
+
+        merged = AggregateSet()
+        for row in self.conn.execute(query, params):
+            merged.get(row["model"], row["noise_type"], row["metric"]).merge(
+                StreamingAggregate.from_dict(json.loads(row["state"])))
+        return merged
+
+    def files(self, run_id: str) -> List[Dict]:
+        return [dict(row) for row in self.conn.execute(
+            "SELECT kind, path, size FROM files WHERE run_id = ?", (run_id,))]
+
+    def index_directory(self, results_dir: str, default_model: str = "phi3:mini") -> int:
+        """
+        Backfill legacy result files, grouping files that share a timestamp
+        into one run. Returns the number of runs indexed.
+        """
+        grouped = {}
+        for name in sorted(os.listdir(results_dir)):
+            if not name.endswith(".json"):
+                continue
+            kind = next((k for prefix, k in LEGACY_KINDS if name.startswith(prefix)), None)
+            if kind is None:
+                continue
+            stamp = re.search(r'(\d{8})(?:_(\d{6}))?', name)
+            if not stamp:
+                continue
+            run_id = stamp.group(0)
+            grouped.setdefault(run_id, {}).setdefault(kind, []).append(os.path.join(results_dir, name))
+
+        for run_id, files in grouped.items():
+            fmt = "%Y%m%d_%H%M%S" if "_" in run_id else "%Y%m%d"
+            finished = datetime.strptime(run_id, fmt).timestamp()
+            model = default_model
+            for path in files.get("results", []) + files.get("legacy_results", []):
+                try:
+                    with open(path, 'r') as f:
+                        data = json.load(f)
+                    model = data.get("model") or data.get("metadata", {}).get("model") or model
+                except (ValueError, AttributeError):
+                    pass
+            self.register_run(run_id, model, files, finished_at=finished,
+                              status="imported", git_rev="")
+        return len(grouped)
+
+
+def resolve_latest(kind: str, results_dir: str, model: Optional[str] = None,
+                   prefix: Optional[str] = None) -> Optional[str]:
+    """
+    Latest file of a kind via the catalog; falls back to the old filename
+    sort when no catalog exists yet
+    """
+    catalog_path = os.path.join(results_dir, "catalog.db")
+    if os.path.exists(catalog_path):
+        catalog = RunCatalog(catalog_path)
+        try:
+            path = catalog.latest_file(kind, model)
+        finally:
+            catalog.close()
+        if path and os.path.exists(path):
+            return path
+
+    prefix = prefix or f"{kind}_"
+    if not os.path.isdir(results_dir):
+        return None
+    candidates = [f for f in os.listdir(results_dir) if f.startswith(prefix)]
+    return os.path.join(results_dir, sorted(candidates)[-1]) if candidates else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the chaos experiment run catalog")
+    parser.add_argument("--db", default=DEFAULT_CATALOG, help="catalog database path")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    index = sub.add_parser("index", help="backfill legacy files from a results directory")
+    index.add_argument("results_dir")
+
+    latest = sub.add_parser("latest", help="print the latest file of a kind")
+    latest.add_argument("kind")
+    latest.add_argument("--model")
+
+    runs = sub.add_parser("runs", help="list recent runs")
+    runs.add_argument("--model")
+    runs.add_argument("--since", help="ISO timestamp")
+    runs.add_argument("--limit", type=int, default=20)
+
+    stats = sub.add_parser("stats", help="percentiles of a metric across catalogued runs")
+    stats.add_argument("--metric", default="edit_distance")
+    stats.add_argument("--model")
+    stats.add_argument("--since", help="ISO timestamp")
+
+    args = parser.parse_args()
+    catalog = RunCatalog(args.db)
+
+    if args.command == "index":
+        print(f"Indexed {catalog.index_directory(args.results_dir)} runs")
+    elif args.command == "latest":
+        path = catalog.latest_file(args.kind, args.model)
+        if not path:
+            raise SystemExit(f"No {args.kind} files catalogued")
+        print(path)
+    elif args.command == "runs":
+        for run in catalog.runs(args.model, args.since, args.limit):
+            finished = datetime.fromtimestamp(run["finished_at"]).strftime('%Y-%m-%d %H:%M:%S')
+            print(f"{run['run_id']:20} {run['model'] or '':18} {finished}  "
+                  f"{run['record_count']:6d} records  {run['status']}")
+    elif args.command == "stats":
+        summary = catalog.aggregates(args.model, args.since, [args.metric]).summary(args.metric)
+        if not summary:
+            raise SystemExit(f"No aggregates for {args.metric}")
+        print(f"{'noise type':28} {'count':>7} {'mean':>8} {'std':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+        for noise_type, s in summary.items():
+            print(f"{noise_type:28} {s['count']:7d} {s['mean']:8.4f} {s['std']:8.4f} "
+                  f"{s['p50']:8.4f} {s['p95']:8.4f} {s['p99']:8.4f}")
+
+    catalog.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -96,6 +96,8 @@ def run_mini_experiment():
     print("=" * 40)
     for r in results:
         print(f"{r['test']:20} - Divergence: {r['divergence']:.3f}")
+    
+    return results
 
 def query_ollama(prompt, model="phi3:mini"):
     """Query Ollama and return response"""
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Stage DAG with content-hash up-to-date checks
+Stages declare their input and output files; a stage is skipped when the
+hash of its code, parameters and input contents matches the last successful
+run and its outputs are still intact. Independent stages run in parallel
+"""
+
+import ast
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+def module_sources(path: str, search_dirs: Iterable[str] = ()) -> List[str]:
+    """
+    path plus every local module it imports, transitively: the source files
+    a stage running that script really depends on. Modules are looked up
+    next to path and in search_dirs; anything else (stdlib, site-packages)
+    is left out.
+    """
+    dirs = [os.path.dirname(os.path.abspath(path))] + [os.path.abspath(d) for d in search_dirs]
+    seen = []
+    pending = [os.path.abspath(path)]
+    while pending:
+        source = pending.pop()
+        if source in seen or not os.path.exists(source):
+            continue
+        seen.append(source)
+        with open(source) as f:
+            tree = ast.parse(f.read(), source)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                for d in dirs:
+                    candidate = os.path.join(d, name.split(".")[0] + ".py")
+                    if os.path.exists(candidate):
+                        pending.append(candidate)
+                        break
+    return sorted(seen)
+
+
+class Stage:
+    """
+    One unit of work.
+
+    fn is called with no arguments and fails by raising or returning False.
+    inputs/outputs are file or directory paths; an input may also be a
+    callable returning a path (or None), resolved each time the stage is
+    checked. Outputs of the stages in `deps` are added to the inputs
+    automatically. `params` are hashed too, so changing e.g. the model
+    name re-runs the stage.
+    """
+
+    def __init__(self, name: str, fn: Callable, inputs: Iterable[str] = (),
+                 outputs: Iterable[str] = (), deps: Iterable[str] = (), params: Optional[Dict] = None):
+        self.name = name
+        self.fn = fn
+        self.inputs = [p if callable(p) else os.path.abspath(p) for p in inputs]
+        self.outputs = [os.path.abspath(p) for p in outputs]
+        self.deps = list(deps)
+        self.params = params or {}
+
+    def code_hash(self) -> str:
+        try:
+            source = inspect.getsource(self.fn)
+        except (OSError, TypeError):
+            source = getattr(self.fn, "__qualname__", repr(self.fn))
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+class StageGraph:
+    """
+    Runs stages in dependency order on a thread pool.
+
+    State (fingerprints and output hashes of the last successful run of each
+    stage) is kept in a JSON file. File hashes are memoised by (size, mtime)
+    so unchanged inputs are not re-read.
+    """
+
+    def __init__(self, state_path: str, workers: int = 3):
+        self.state_path = state_path
+        self.workers = workers
+        self.stages = {}
+        self.state = {"stages": {}, "files": {}}
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                self.state = json.load(f)
+        self._lock = threading.Lock()
+
+    def add(self, stage: Stage) -> Stage:
+        for dep in stage.deps:
+            if dep not in self.stages:
+                raise ValueError(f"stage {stage.name} depends on unknown stage {dep}")
+        self.stages[stage.name] = stage
+        return stage
+
+    # ---- hashing -------------------------------------------------------
+
+    def file_hash(self, path: str) -> Optional[str]:
+        """Content hash of a file or (recursively) a directory; None if missing"""
+        if os.path.isdir(path):
+            digest = hashlib.sha256()
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    child = os.path.join(root, name)
+                    digest.update(os.path.relpath(child, path).encode("utf-8"))
+                    digest.update((self.file_hash(child) or "").encode("utf-8"))
+            return digest.hexdigest()
+        if not os.path.exists(path):
+            return None
+
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        with self._lock:
+            cached = self.state["files"].get(path)
+        if cached and cached["signature"] == signature:
+            return cached["hash"]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        with self._lock:
+            self.state["files"][path] = {"signature": signature, "hash": digest.hexdigest()}
+        return digest.hexdigest()
+
+    def all_inputs(self, stage: Stage) -> List[str]:
+        inputs = []
+        for path in stage.inputs:
+            path = path() if callable(path) else path
+            if path:
+                inputs.append(os.path.abspath(path))
+        for dep in stage.deps:
+            inputs.extend(self.stages[dep].outputs)
+        return sorted(set(inputs))
+
+    def fingerprint(self, stage: Stage) -> str:
+        parts = {
+            "code": stage.code_hash(),
+            "params": stage.params,
+            "inputs": {path: self.file_hash(path) for path in self.all_inputs(stage)}
+        }
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def up_to_date(self, stage: Stage) -> bool:
+        record = self.state["stages"].get(stage.name)
+        if not record or record["fingerprint"] != self.fingerprint(stage):
+            return False
+        # Outputs must still be exactly what the stage produced
+        return all(self.file_hash(path) == record["outputs"].get(path) for path in stage.outputs)
+
+    # ---- execution -----------------------------------------------------
+
+    def closure(self, targets: Optional[Iterable[str]]) -> List[str]:
+        """Targets plus everything they depend on, in topological order"""
+        order, seen = [], set()
+
+        def visit(name):
+            if name in seen:
+                return
+            seen.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            order.append(name)
+
+        for name in (targets or self.stages):
+            visit(name)
+        return order
+
+    def _run_stage(self, stage: Stage, force: bool) -> str:
+        if not force and self.up_to_date(stage):
+            return "skipped"
+        fingerprint = self.fingerprint(stage)
+        print(f"▶️  {stage.name}")
+        start = time.time()
+        if stage.fn() is False:
+            raise RuntimeError(f"stage {stage.name} reported failure")
+        missing = [path for path in stage.outputs if not os.path.exists(path)]
+        if missing:
+            raise RuntimeError(f"stage {stage.name} did not produce {', '.join(missing)}")
+        outputs = {path: self.file_hash(path) for path in stage.outputs}
+        with self._lock:
+            self.state["stages"][stage.name] = {
+                "fingerprint": fingerprint,
+                "outputs": outputs,
+                "finished_at": time.time(),
+                "duration_s": round(time.time() - start, 3)
+            }
+        return "ran"
+
+    def run(self, targets: Optional[Iterable[str]] = None, force: bool = False,
+            dry_run: bool = False) -> Dict[str, str]:
+        """
+        Bring targets up to date. Returns {stage: ran|skipped|failed|blocked}
+        (or stale|fresh with dry_run). A failed stage blocks its dependents
+        but not unrelated branches.
+        """
+        order = self.closure(targets)
+        if dry_run:
+            return {name: "fresh" if not force and self.up_to_date(self.stages[name]) else "stale"
+                    for name in order}
+
+        status = {}
+        pending = list(order)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while pending or running:
+                for name in list(pending):
+                    deps = self.stages[name].deps
+                    if any(status.get(dep) in ("failed", "blocked") for dep in deps):
+                        status[name] = "blocked"
+                        pending.remove(name)
+                    elif all(status.get(dep) in ("ran", "skipped") for dep in deps):
+                        # A dependency that re-ran invalidates via its outputs' hashes
+                        running[pool.submit(self._run_stage, self.stages[name], force)] = name
+                        pending.remove(name)
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        status[name] = future.result()
+                        print(f"{'⏭️ ' if status[name] == 'skipped' else '✅'} {name} {status[name]}")
+                    except Exception as e:
+                        status[name] = "failed"
+                        print(f"❌ {name} failed: {e}")
+                self.save()
+        return status
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        with self._lock:
+            tmp = f"{self.state_path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.state, f, indent=2)
+            os.replace(tmp, self.state_path)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Streaming, mergeable aggregates
+Welford moments and a KLL quantile sketch per (model, noise_type, metric):
+O(1) amortised per value, mergeable across workers and runs, and small
+enough to persist in the run catalog so reports read p50/p95/p99 without
+rescanning raw records. Standard library only
+"""
+
+import json
+import math
+import random
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class Moments:
+    """Count, mean, variance (Welford), min and max of a stream"""
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0,
+                 minimum: float = math.inf, maximum: float = -math.inf):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.min = minimum
+        self.max = maximum
+
+    def update(self, x: float) -> None:
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+
+    def merge(self, other: "Moments") -> "Moments":
+        """Combine with another stream's moments (Chan et al.)"""
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self) -> float:
+        """Population variance, as np.var"""
+        return self.m2 / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def to_dict(self) -> Dict:
+        return {"count": self.count, "mean": self.mean, "m2": self.m2,
+                "min": self.min if self.count else None, "max": self.max if self.count else None}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Moments":
+        return cls(data["count"], data["mean"], data["m2"],
+                   math.inf if data["min"] is None else data["min"],
+                   -math.inf if data["max"] is None else data["max"])
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch (Karnin, Lang & Liberty 2016).
+
+    Level h holds items of weight 2^h; when the sketch exceeds its budget
+    the first over-full level is sorted and every other item (random offset)
+    is promoted one level up. Rank error is about 1.7/k, using O(k) space
+    regardless of stream length.
+    """
+
+    def __init__(self, k: int = 200, c: float = 2 / 3, seed: Optional[int] = None):
+        self.k = k
+        self.c = c
+        self.compactors = [[]]
+        self.size = 0
+        self.max_size = 0
+        self._rng = random.Random(seed)
+        self._grow_budget()
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return int(math.ceil(self.k * self.c ** depth)) + 1
+
+    def _grow_budget(self) -> None:
+        self.max_size = sum(self._capacity(h) for h in range(len(self.compactors)))
+
+    def update(self, x: float) -> None:
+        self.compactors[0].append(x)
+        self.size += 1
+        if self.size >= self.max_size:
+            self._compress()
+
+    def _compress(self) -> None:
+        while self.size >= self.max_size:
+            for level, items in enumerate(self.compactors):
+                if len(items) >= self._capacity(level):
+                    if level + 1 == len(self.compactors):
+                        self.compactors.append([])
+                        self._grow_budget()
+                    items.sort()
+                    # An odd item out stays behind at this level
+                    keep = [items.pop()] if len(items) % 2 else []
+                    promoted = items[self._rng.randint(0, 1)::2]
+                    self.compactors[level + 1].extend(promoted)
+                    self.compactors[level] = keep
+                    self.size = sum(len(c) for c in self.compactors)
+                    break
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        self._grow_budget()
+        for level, items in enumerate(other.compactors):
+            self.compactors[level].extend(items)
+        self.size = sum(len(c) for c in self.compactors)
+        self._compress()
+        return self
+
+    @property
+    def count(self) -> int:
+        """Number of values the sketch stands for"""
+        return sum(len(items) << level for level, items in enumerate(self.compactors))
+
+    def quantile(self, q: float) -> Optional[float]:
+        weighted = sorted((x, 1 << level) for level, items in enumerate(self.compactors) for x in items)
+        if not weighted:
+            return None
+        target = q * sum(w for _, w in weighted)
+        cumulative = 0
+        for x, weight in weighted:
+            cumulative += weight
+            if cumulative >= target:
+                return x
+        return weighted[-1][0]
+
+    def to_dict(self) -> Dict:
+        return {"k": self.k, "c": self.c, "compactors": self.compactors}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "KLLSketch":
+        sketch = cls(data["k"], data["c"])
+        sketch.compactors = [list(items) for items in data["compactors"]]
+        sketch.size = sum(len(c) for c in sketch.compactors)
+        sketch._grow_budget()
+        return sketch
+
+
+class StreamingAggregate:
+    """Moments plus a quantile sketch for one metric"""
+
+    QUANTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+
+    def __init__(self, moments: Optional[Moments] = None, sketch: Optional[KLLSketch] = None):
+        self.moments = moments or Moments()
+        self.sketch = sketch or KLLSketch()
+
+    def update(self, x: float) -> None:
+        x = float(x)
+        if math.isnan(x):
+            return
+        self.moments.update(x)
+        self.sketch.update(x)
+
+    def merge(self, other: "StreamingAggregate") -> "StreamingAggregate":
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+        return self
+
+    def summary(self) -> Dict[str, float]:
+        m = self.moments
+        summary = {"count": m.count, "mean": m.mean, "std": m.std,
+                   "min": m.min if m.count else None, "max": m.max if m.count else None}
+        for name, q in self.QUANTILES.items():
+            summary[name] = self.sketch.quantile(q)
+        return summary
+
+    def to_dict(self) -> Dict:
+        return {"moments": self.moments.to_dict(), "sketch": self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "StreamingAggregate":
+        return cls(Moments.from_dict(data["moments"]), KLLSketch.from_dict(data["sketch"]))
+
+
+class AggregateSet:
+    """StreamingAggregates keyed by (model, noise_type, metric)"""
+
+    def __init__(self):
+        self.aggregates = {}
+
+    def get(self, model: str, noise_type: str, metric: str) -> StreamingAggregate:
+        key = (model, noise_type, metric)
+        if key not in self.aggregates:
+            self.aggregates[key] = StreamingAggregate()
+        return self.aggregates[key]
+
+    def update(self, model: str, noise_type: str, values: Dict[str, float]) -> None:
+        """Add one record's metrics"""
+        for metric, value in values.items():
+            if value is not None:
+                self.get(model, noise_type, metric).update(value)
+
+    def merge(self, other: "AggregateSet") -> "AggregateSet":
+        for key, aggregate in other.aggregates.items():
+            self.get(*key).merge(aggregate)
+        return self
+
+    def items(self) -> Iterable[Tuple[Tuple[str, str, str], StreamingAggregate]]:
+        return self.aggregates.items()
+
+    def summary(self, metric: str, model: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """{noise_type: summary} for one metric, merging models unless one is given"""
+        merged = {}
+        for (m, noise_type, name), aggregate in self.aggregates.items():
+            if name == metric and (model is None or m == model):
+                merged.setdefault(noise_type, StreamingAggregate()).merge(aggregate)
+        return {noise_type: aggregate.summary() for noise_type, aggregate in sorted(merged.items())}
+
+    def to_json(self) -> str:
+        return json.dumps([[list(key), aggregate.to_dict()] for key, aggregate in self.aggregates.items()])
+
+    @classmethod
+    def from_json(cls, text: str) -> "AggregateSet":
+        aggregates = cls()
+        for key, data in json.loads(text):
+            aggregates.aggregates[tuple(key)] = StreamingAggregate.from_dict(data)
+        return aggregates
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Lightweight per-response text features and mode markers
+Plain-string helpers with no model, corpus or network state, shared by the
+critic, the critic cascade and the excerpt selector
+"""
+
+import re
+from difflib import SequenceMatcher
+from typing import Dict, List
+
+EMPATHY_MARKERS = [
+    "i understand", "understandable", "it's okay", "it is okay", "don't worry",
+    "frustrat", "overwhelm", "struggl", "feel", "sorry", "you're not alone",
+    "take a breath", "completely normal", "totally normal", "be patient", "step by step"
+]
+URGENCY_MARKERS = [
+    "quick", "in short", "briefly", "tl;dr", "in a nutshell", "simply put", "summary"
+]
+CONNECTIVE_MARKERS = [
+    "furthermore", "additionally", "moreover", "relates to", "connected", "interplay",
+    "in relation", "on the other hand", "similarly", "in contrast", "together"
+]
+ALL_MARKERS = EMPATHY_MARKERS + URGENCY_MARKERS + CONNECTIVE_MARKERS
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English)"""
+    return len(text) // 4 + 1
+
+
+def marker_density(text: str, markers: List[str]) -> float:
+    """Marker hits per 100 words"""
+    lowered = text.lower()
+    hits = sum(len(re.findall(re.escape(m), lowered)) for m in markers)
+    return 100.0 * hits / max(len(text.split()), 1)
+
+
+def text_features(text: str) -> Dict[str, float]:
+    """The length and vocabulary features of ChaosExperiment.extract_features, for one text"""
+    words = text.split()
+    return {
+        "length": len(text),
+        "word_count": len(words),
+        "avg_word_length": sum(len(w) for w in words) / len(words) if words else 0,
+        "complexity_score": len(set(words)) / len(words) if words else 0,
+    }
+
+
+def edit_distance(a: str, b: str) -> float:
+    """Normalised edit distance, 1 - SequenceMatcher ratio"""
+    return 1 - SequenceMatcher(None, a, b).ratio()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Hashed n-gram TF-IDF cosine divergence
+Responses from a TokenCorpus become rows of one sparse TF-IDF matrix
+(word n-grams hashed into a fixed number of columns), so the divergence
+between any two responses, or every pair in a sweep, is 1 - cosine
+similarity from sparse matrix products instead of one SequenceMatcher call
+per pair
+"""
+
+import argparse
+import json
+import os
+import time
+import zlib
+import numpy as np
+from itertools import islice
+from scipy import sparse
+from typing import Iterable, List, Optional, Tuple
+
+from mode_classifier import TOKEN_PATTERN
+from token_corpus import TokenCorpus
+
+# Multiplier of the n-gram hash, as in TokenCorpus.ngrams
+NGRAM_PRIME = np.uint64(1000003)
+
+
+class TfidfCosine:
+    """
+    Incremental TF-IDF over the documents of a TokenCorpus.
+
+    Each vocabulary entry is normalised once (lowercased, split on
+    TOKEN_PATTERN like the mode classifier, crc32-hashed), so n-grams of a
+    whole batch of new documents are hashed in a few vectorised passes.
+    Raw term counts are kept per document (new batches are stacked lazily,
+    on the first read after them); IDF is over every document seen so far,
+    cached until documents are added and applied when rows are read, so
+    adding responses never rewrites the existing counts.
+    """
+
+    def __init__(self, corpus: Optional[TokenCorpus] = None, n_features: int = 2 ** 20,
+                 ngram_range: Tuple[int, int] = (1, 2), sublinear_tf: bool = True):
+        self.corpus = corpus if corpus is not None else TokenCorpus()
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.sublinear_tf = sublinear_tf
+        # Normalised sub-token hashes of vocabulary entry v:
+        # word_hashes[word_offsets[v]:word_offsets[v + 1]]
+        self.word_hashes = []
+        self.word_offsets = [0]
+        self._counts = sparse.csr_matrix((0, n_features), dtype=np.float32)
+        self._chunks = []
+        self._rows = 0
+        self.df = np.zeros(n_features, dtype=np.int64)
+        self._idf = None
+        self._matrix = None
+
+    def __len__(self) -> int:
+        return self._rows
+
+    @property
+    def counts(self) -> sparse.csr_matrix:
+        """Term counts of every document, one row each"""
+        if self._chunks:
+            self._counts = sparse.vstack([self._counts] + self._chunks, format="csr")
+            self._chunks = []
+        return self._counts
+
+    # ---- ingest --------------------------------------------------------
+
+    def fit(self, texts: Iterable[str]) -> List[int]:
+        """Add texts to the corpus and return their row indices"""
+        rows = self.corpus.add_many(texts)
+        self._sync()
+        return rows
+
+    def _sync(self) -> None:
+        """Count n-grams of the corpus documents added since the last call"""
+        corpus = self.corpus
+        start_doc, stop_doc = len(self), len(corpus)
+        if start_doc == stop_doc:
+            return
+
+        for word in islice(corpus.vocab, len(self.word_offsets) - 1, None):
+            self.word_hashes.extend(zlib.crc32(t.encode("utf-8")) for t in TOKEN_PATTERN.findall(word.lower()))
+            self.word_offsets.append(len(self.word_hashes))
+        hashes = np.asarray(self.word_hashes, dtype=np.uint64)
+        offsets = np.asarray(self.word_offsets, dtype=np.int64)
+
+        # Expand each token into its normalised sub-tokens ("well-known," -> well, known)
+        first, last = corpus.offsets[start_doc], corpus.offsets[stop_doc]
+        tokens = corpus.tokens[first:last]
+        word_counts = np.diff(np.asarray(corpus.offsets[start_doc:stop_doc + 1], dtype=np.int64))
+        token_doc = np.repeat(np.arange(stop_doc - start_doc), word_counts)
+        sub_counts = offsets[tokens + 1] - offsets[tokens]
+        ends = np.cumsum(sub_counts)
+        positions = np.arange(ends[-1] if len(ends) else 0) + np.repeat(offsets[tokens] - (ends - sub_counts), sub_counts)
+        words = hashes[positions]
+        doc = np.repeat(token_doc, sub_counts)
+
+        rows, cols = [], []
+        low, high = self.ngram_range
+        with np.errstate(over="ignore"):
+            for n in range(low, high + 1):
+                m = len(words) - n + 1
+                if m <= 0:
+                    continue
+                gram = words[:m].copy()
+                for k in range(1, n):
+                    gram = gram * NGRAM_PRIME ^ words[k:m + k]
+                inside = doc[:m] == doc[n - 1:]  # n-grams may not span two documents
+                rows.append(doc[:m][inside])
+                cols.append((gram[inside] % np.uint64(self.n_features)).astype(np.int64))
+
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+        counts = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)),
+                                   shape=(stop_doc - start_doc, self.n_features))
+        counts.sum_duplicates()
+        if self.sublinear_tf:
+            counts.data = 1 + np.log(counts.data)
+        self.df += np.bincount(counts.indices, minlength=self.n_features)
+        self._chunks.append(counts)
+        self._rows += counts.shape[0]
+        self._idf = None
+        self._matrix = None
+
+    # ---- weighting -----------------------------------------------------
+
+    @property
+    def idf(self) -> np.ndarray:
+        """Smoothed inverse document frequency, log((1 + N) / (1 + df)) + 1"""
+        self._sync()
+        if self._idf is None:
+            self._idf = (np.log((1 + len(self)) / (1 + self.df)) + 1).astype(np.float32)
+        return self._idf
+
+    def weighted(self, rows: Optional[np.ndarray] = None) -> sparse.csr_matrix:
+        """L2-normalised TF-IDF rows (all rows when None)"""
+        self._sync()
+        counts = self.counts if rows is None else self.counts[np.asarray(rows)]
+        X = counts.multiply(self.idf[None, :]).tocsr().astype(np.float32)
+        norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.diags(1.0 / norms).astype(np.float32) @ X
+
+    @property
+    def matrix(self) -> sparse.csr_matrix:
+        """Every row weighted with the current IDF (cached until documents are added)"""
+        self._sync()
+        if self._matrix is None:
+            self._matrix = self.weighted()
+        return self._matrix
+
+    def _empty(self, rows: np.ndarray) -> np.ndarray:
+        return np.diff(self.counts.indptr)[rows] == 0
+
+    # ---- divergences ---------------------------------------------------
+
+    def divergence(self, text1: str, text2: str) -> float:
+        """1 - cosine similarity of two responses (0 for two empty ones)"""
+        rows = [self.corpus.add(text1), self.corpus.add(text2)]
+        return float(self.paired(rows[:1], rows[1:])[0])
+
+    def paired(self, rows1: Iterable[int], rows2: Iterable[int]) -> np.ndarray:
+        """Divergence of each (rows1[i], rows2[i]) pair, one row-wise product for all"""
+        rows1, rows2 = np.asarray(list(rows1), dtype=np.int64), np.asarray(list(rows2), dtype=np.int64)
+        X = self.weighted(np.concatenate([rows1, rows2]))
+        A, B = X[:len(rows1)], X[len(rows1):]
+        similarity = np.asarray(A.multiply(B).sum(axis=1)).ravel()
+        divergence = np.clip(1 - similarity, 0, 1)
+        divergence[self._empty(rows1) & self._empty(rows2)] = 0
+        return divergence
+
+    def __call__(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """distance_block for TiledDistanceMatrix: 1 - X[rows] X[cols]ᵀ as float32"""
+        X = self.matrix
+        block = np.clip(1 - (X[rows] @ X[cols].T).toarray(), 0, 1).astype(np.float32)
+        block[np.outer(self._empty(rows), self._empty(cols))] = 0
+        return block
+
+    def pairwise(self, rows: Optional[Iterable[int]] = None) -> np.ndarray:
+        """Dense divergence matrix over rows (all documents when None)"""
+        rows = np.arange(len(self)) if rows is None else np.asarray(list(rows))
+        block = self(rows, rows)
+        np.fill_diagonal(block, 0)
+        return block
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TF-IDF cosine divergence over a results file's responses")
+    parser.add_argument("--results", help="results file (default: latest in the catalog)")
+    parser.add_argument("--results-dir", default="../results")
+    parser.add_argument("--n-features", type=int, default=2 ** 20)
+    args = parser.parse_args()
+
+    from blob_store import BlobStore
+    from phase_space import collect_responses
+    from run_catalog import resolve_latest
+
+    results_path = args.results or resolve_latest("results", args.results_dir)
+    with open(results_path) as f:
+        results = json.load(f)
+    blob_dir = os.path.join(args.results_dir, "blobs")
+    pairs = collect_responses(results, BlobStore(blob_dir) if os.path.isdir(blob_dir) else None)
+
+    start = time.time()
+    tfidf = TfidfCosine(n_features=args.n_features)
+    texts = [text for pair in pairs for role in ("baseline", "noisy") for text in pair[role]]
+    tfidf.fit(texts)
+    print(f"📚 {len(texts)} responses → {len(tfidf)} documents, {tfidf.matrix.nnz} non-zeros "
+          f"({time.time() - start:.2f}s)")
+
+    by_noise = {}
+    for pair in pairs:
+        n = min(len(pair["baseline"]), len(pair["noisy"]))
+        rows = tfidf.fit(pair["baseline"][:n] + pair["noisy"][:n])
+        by_noise.setdefault(pair["noise_type"], []).extend(tfidf.paired(rows[:n], rows[n:]))
+    for noise_type, values in sorted(by_noise.items()):
+        print(f"  {noise_type:25} mean TF-IDF divergence {np.mean(values):.4f} over {len(values)} pairs")
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Pre-tokenized response corpus
+Each response is split once, at ingest, into int32 token ids against an
+interned vocabulary and appended to one contiguous array with offsets; the
+character-level counts the metrics need are taken in the same pass, so
+word-level metrics are NumPy reductions and never touch the raw text again
+"""
+
+import re
+import numpy as np
+from typing import Dict, Iterable, List
+
+from blob_store import blob_id
+
+PUNCTUATION = set('.,!?;:')
+BRACKETED_PUNCTUATION = set('.,!?;:()[]{}')
+SENTENCE_BREAK = re.compile(r'[.!?]+')
+
+# Per-document counts taken at ingest, alongside the tokens
+CHAR_STATS = ["chars", "punctuation", "bracketed_punctuation", "uppercase", "sentences", "periods"]
+
+
+class TokenCorpus:
+    """
+    Append-only corpus: tokens[offsets[i]:offsets[i + 1]] are document i.
+
+    Identical texts are stored once (add() returns the existing id, looked up
+    by the text's blob id rather than the text itself), so the same response
+    measured against several others is tokenized only once.
+    Tokens are whitespace-split words, exactly what the metrics used to get
+    from str.split().
+    """
+
+    def __init__(self, capacity: int = 1 << 16):
+        self.vocab = {}
+        self.token_lengths = []
+        self.tokens = np.zeros(capacity, dtype=np.int32)
+        self.offsets = [0]
+        self.stats = {name: [] for name in CHAR_STATS}
+        self.doc_ids = {}
+        self._arrays = None
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def n_tokens(self) -> int:
+        return self.offsets[-1]
+
+    # ---- ingest --------------------------------------------------------
+
+    def add(self, text: str) -> int:
+        """Tokenize a response (once) and return its document id"""
+        key = blob_id(text)
+        doc = self.doc_ids.get(key)
+        if doc is not None:
+            return doc
+
+        vocab = self.vocab
+        ids = []
+        for word in text.split():
+            token = vocab.get(word)
+            if token is None:
+                token = vocab[word] = len(vocab)
+                self.token_lengths.append(len(word))
+            ids.append(token)
+
+        start = self.offsets[-1]
+        if start + len(ids) > len(self.tokens):
+            grown = np.zeros(max(2 * len(self.tokens), start + len(ids)), dtype=np.int32)
+            grown[:start] = self.tokens[:start]
+            self.tokens = grown
+        self.tokens[start:start + len(ids)] = ids
+        self.offsets.append(start + len(ids))
+
+        self.stats["chars"].append(len(text))
+        self.stats["punctuation"].append(sum(1 for c in text if c in PUNCTUATION))
+        self.stats["bracketed_punctuation"].append(sum(1 for c in text if c in BRACKETED_PUNCTUATION))
+        self.stats["uppercase"].append(sum(1 for c in text if c.isupper()))
+        self.stats["sentences"].append(len(SENTENCE_BREAK.split(text)))
+        self.stats["periods"].append(text.count('.'))
+
+        self._arrays = None
+        doc = self.doc_ids[key] = len(self) - 1
+        return doc
+
+    def add_many(self, texts: Iterable[str]) -> List[int]:
+        return [self.add(text) for text in texts]
+
+    # ---- array views ---------------------------------------------------
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Offsets, per-document counts and token lengths as arrays (cached until the next add)"""
+        if self._arrays is None:
+            offsets = np.asarray(self.offsets, dtype=np.int64)
+            self._arrays = {
+                "offsets": offsets,
+                "word_count": np.diff(offsets),
+                "token_lengths": np.asarray(self.token_lengths, dtype=np.int32),
+                **{name: np.asarray(values, dtype=np.int64) for name, values in self.stats.items()}
+            }
+        return self._arrays
+
+    def doc(self, i: int) -> np.ndarray:
+        return self.tokens[self.offsets[i]:self.offsets[i + 1]]
+
+    def doc_index(self) -> np.ndarray:
+        """Document id of every token position"""
+        a = self.arrays()
+        return np.repeat(np.arange(len(self)), a["word_count"])
+
+    def unique_counts(self) -> np.ndarray:
+        """Distinct tokens per document, for every document at once"""
+        if not self.n_tokens:
+            return np.zeros(len(self), dtype=np.int64)
+        keys = self.doc_index() * len(self.vocab) + self.tokens[:self.n_tokens]
+        distinct = np.unique(keys) // len(self.vocab)
+        return np.bincount(distinct, minlength=len(self))
+
+    def letter_counts(self) -> np.ndarray:
+        """Total characters in the words of every document"""
+        lengths = self.arrays()["token_lengths"][self.tokens[:self.n_tokens]]
+        return np.bincount(self.doc_index(), weights=lengths, minlength=len(self))
+
+    def ngrams(self, i: int, n: int = 2) -> np.ndarray:
+        """Hashed n-gram ids (uint64) of document i, computed on token ids"""
+        tokens = self.doc(i).astype(np.uint64)
+        if len(tokens) < n:
+            return np.zeros(0, dtype=np.uint64)
+        hashed = np.zeros(len(tokens) - n + 1, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for k in range(n):
+                hashed = hashed * np.uint64(1000003) ^ tokens[k:len(tokens) - n + 1 + k]
+        return hashed
+
+    # ---- metrics -------------------------------------------------------
+
+    # Per-document metrics read the counts straight from the ingest lists:
+    # going through arrays() would rebuild every column after each add()
+
+    def features(self, i: int) -> Dict[str, float]:
+        """ChaosExperiment.extract_features for document i"""
+        stats = self.stats
+        chars = stats["chars"][i]
+        words = self.doc(i)
+        letters = sum(self.token_lengths[token] for token in words.tolist())
+        return {
+            "length": int(chars),
+            "word_count": len(words),
+            "sentence_count": int(stats["sentences"][i]),
+            "avg_word_length": letters / len(words) if len(words) else 0,
+            "complexity_score": len(np.unique(words)) / len(words) if len(words) else 0,  # Vocabulary diversity
+            "punctuation_ratio": stats["punctuation"][i] / chars if chars else 0,
+            "uppercase_ratio": stats["uppercase"][i] / chars if chars else 0,
+        }
+
+    def complexity(self, i: int) -> Dict[str, float]:
+        """ChaosTheoryAnalyzer.measure_response_complexity for document i"""
+        stats = self.stats
+        chars = stats["chars"][i]
+        words = self.doc(i)
+        vocab_diversity = len(np.unique(words)) / len(words) if len(words) else 0
+        # str.split('.') always yields periods + 1 pieces
+        avg_sentence_length = len(words) / (stats["periods"][i] + 1)
+        return {
+            "vocab_diversity": vocab_diversity,
+            "avg_sentence_length": float(avg_sentence_length),
+            "avg_word_length": float(chars / len(words)) if len(words) else 0,
+            "punctuation_density": stats["bracketed_punctuation"][i] / chars if chars else 0,
+            "complexity_score": vocab_diversity * avg_sentence_length * 0.1
+        }
+
+    def feature_matrix(self) -> Dict[str, np.ndarray]:
+        """extract_features for every document at once, as columns"""
+        a = self.arrays()
+        words = a["word_count"]
+        chars = a["chars"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return {
+                "length": chars.astype(float),
+                "word_count": words.astype(float),
+                "sentence_count": a["sentences"].astype(float),
+                "avg_word_length": np.where(words > 0, self.letter_counts() / words, 0),
+                "complexity_score": np.where(words > 0, self.unique_counts() / words, 0),
+                "punctuation_ratio": np.where(chars > 0, a["punctuation"] / chars, 0),
+                "uppercase_ratio": np.where(chars > 0, a["uppercase"] / chars, 0),
+            }
+
+    # ---- persistence ---------------------------------------------------
+
+    def save(self, path: str) -> None:
+        words = [None] * len(self.vocab)
+        for word, token in self.vocab.items():
+            words[token] = word
+        a = self.arrays()
+        with open(path, "wb") as f:
+            np.savez_compressed(f, tokens=self.tokens[:self.n_tokens], vocab=np.asarray(words, dtype=np.str_),
+                                **{name: a[name] for name in ["offsets"] + CHAR_STATS})
+
+    @classmethod
+    def load(cls, path: str) -> "TokenCorpus":
+        """Reload for analysis; the blob id -> doc id dedup map is not persisted"""
+        with np.load(path) as data:
+            corpus = cls(capacity=max(len(data["tokens"]), 1))
+            corpus.tokens[:len(data["tokens"])] = data["tokens"]
+            corpus.offsets = data["offsets"].tolist()
+            corpus.stats = {name: data[name].tolist() for name in CHAR_STATS}
+            words = data["vocab"].tolist()
+        corpus.vocab = {word: token for token, word in enumerate(words)}
+        corpus.token_lengths = [len(word) for word in words]
+        return corpus
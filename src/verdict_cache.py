@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Persistent cache of critic verdicts
+Keyed by (critic model digest, prompt template hash, baseline hash, noisy
+hash, options) and stored next to the response blob store, so re-validating
+an unchanged sweep costs no critic calls
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from blob_store import blob_id
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    key TEXT PRIMARY KEY,
+    template_name TEXT,
+    template_hash TEXT,
+    model_digest TEXT,
+    baseline_hash TEXT,
+    noisy_hash TEXT,
+    options TEXT,
+    verdict TEXT,
+    created_at REAL
+);
+CREATE TABLE IF NOT EXISTS templates (
+    name TEXT PRIMARY KEY,
+    hash TEXT
+);
+CREATE INDEX IF NOT EXISTS verdicts_template ON verdicts(template_name, template_hash);
+"""
+
+
+def template_hash(template: str) -> str:
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+
+
+class VerdictCache:
+    """
+    SQLite-backed verdict cache.
+
+    register_template() records the current hash of each named template and
+    drops verdicts produced by an older version of it, so editing a prompt
+    invalidates exactly the verdicts that depended on it.
+    """
+
+    def __init__(self, path: str = "../results/blobs/verdicts.db"):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def register_template(self, name: str, template: str) -> str:
+        """Record a template's current hash, invalidating verdicts from older versions"""
+        current = template_hash(template)
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT hash FROM templates WHERE name = ?", (name,)).fetchone()
+            if row and row[0] != current:
+                self.conn.execute("DELETE FROM verdicts WHERE template_name = ? AND template_hash != ?",
+                                  (name, current))
+            self.conn.execute("INSERT OR REPLACE INTO templates VALUES (?, ?)", (name, current))
+        return current
+
+    @staticmethod
+    def make_key(model_digest: str, template_hash: str, baseline: str, noisy: str,
+                 options: Optional[Dict] = None) -> Dict[str, str]:
+        parts = {
+            "model_digest": model_digest,
+            "template_hash": template_hash,
+            "baseline_hash": blob_id(baseline),
+            "noisy_hash": blob_id(noisy),
+            "options": json.dumps(options or {}, sort_keys=True)
+        }
+        parts["key"] = hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+        return parts
+
+    def get(self, key: Dict[str, str]) -> Optional[Dict]:
+        with self._lock:
+            row = self.conn.execute("SELECT verdict FROM verdicts WHERE key = ?", (key["key"],)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: Dict[str, str], template_name: str, verdict: Dict) -> None:
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key["key"], template_name, key["template_hash"], key["model_digest"],
+                 key["baseline_hash"], key["noisy_hash"], key["options"],
+                 json.dumps(verdict), time.time())
+            )
+
+    def iter_verdicts(self, template_name: str):
+        """Yield (noisy_hash, verdict) for every cached verdict of one template"""
+        with self._lock:
+            rows = self.conn.execute("SELECT noisy_hash, verdict FROM verdicts WHERE template_name = ?",
+                                     (template_name,)).fetchall()
+        for noisy_hash, verdict in rows:
+            yield noisy_hash, json.loads(verdict)
+
+    def close(self) -> None:
+        self.conn.close()